@@ -1,5 +1,6 @@
-import xml.etree.ElementTree as ET
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, Union
+from xml.sax.saxutils import escape, quoteattr
 import datetime
 from app.entity.book import Book
 from app.utils.paginator import PaginatedBookList
@@ -11,6 +12,53 @@ DIR_MIME = "application/atom+xml;profile=opds-catalog;kind=navigation"
 DIR_REL = "subsection"
 FILE_REL = "http://opds-spec.org/acquisition"
 COVER_REL = "http://opds-spec.org/cover"
+CATALOG_MIME = "application/atom+xml;profile=opds-catalog"
+
+
+def _escape_text(text: str) -> str:
+    """转义XML文本内容；绝大多数值不含特殊字符，先检查再转义"""
+    if "&" in text or "<" in text or ">" in text:
+        return escape(text)
+    return text
+
+
+@lru_cache(maxsize=4096)
+def _xml_escape(text: str) -> str:
+    """转义XML文本内容，缓存重复出现的作者、标题等值"""
+    return _escape_text(text)
+
+
+@lru_cache(maxsize=4096)
+def _xml_quoteattr(value: str) -> str:
+    """转义并引用XML属性值，缓存重复出现的type/rel等值"""
+    return quoteattr(value)
+
+
+def format_atom_time(dt: datetime.datetime) -> str:
+    """
+    将时间格式化为ATOM_TIME_FORMAT
+
+    手工拼接比strftime更快。
+    
+    Args:
+        dt: 时间
+        
+    Returns:
+        str: ATOM格式的时间字符串
+    """
+    return (
+        f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d}"
+        f"T{dt.hour:02d}:{dt.minute:02d}:{dt.second:02d}Z"
+    )
+
+
+# 书籍更新时间在多次请求间重复出现，按时间值缓存格式化结果
+_cached_atom_time = lru_cache(maxsize=8192)(format_atom_time)
+
+
+# 每个Feed都相同的链接，预先渲染为XML片段
+_START_LINK_XML = f'<link href="/opds/" type="{DIR_MIME}" rel="start"/>'
+_SEARCH_LINK_XML = '<link href="/opds/search/{searchTerms}/" type="application/atom+xml" rel="search"/>'
 
 
 class Entry:
@@ -43,46 +91,29 @@ class Entry:
         self.summary = summary
         self.links = links or []
     
-    def to_element(self) -> ET.Element:
+    def write_to(self, parts: List[str]) -> None:
         """
-        转换为ElementTree元素
+        将条目XML片段直接写入输出列表
         
-        Returns:
-            ET.Element: ElementTree元素
+        Args:
+            parts: XML字符串片段列表
         """
-        entry = ET.Element("entry")
-        
-        # 添加ID
-        id_elem = ET.SubElement(entry, "id")
-        id_elem.text = self.id
-        
-        # 添加标题
-        title_elem = ET.SubElement(entry, "title")
-        title_elem.text = self.title
+        # 添加作者和摘要（如果有）
+        author = f"<author><name>{_xml_escape(self.author)}</name></author>" if self.author else ""
+        summary = f'<summary type="text">{_escape_text(self.summary)}</summary>' if self.summary else ""
         
-        # 添加更新时间
-        updated_elem = ET.SubElement(entry, "updated")
-        updated_elem.text = self.updated
-        
-        # 添加作者（如果有）
-        if self.author:
-            author_elem = ET.SubElement(entry, "author")
-            name_elem = ET.SubElement(author_elem, "name")
-            name_elem.text = self.author
-        
-        # 添加摘要（如果有）
-        if self.summary:
-            summary_elem = ET.SubElement(entry, "summary")
-            summary_elem.set("type", "text")
-            summary_elem.text = self.summary
+        # 条目的固定部分合并为一个片段写入
+        parts.append(
+            f"<entry><id>{_escape_text(self.id)}</id>"
+            f"<title>{_xml_escape(self.title)}</title>"
+            f"<updated>{_escape_text(self.updated)}</updated>"
+            f"{author}{summary}"
+        )
         
         # 添加链接
-        for link in self.links:
-            link_elem = ET.SubElement(entry, "link")
-            for key, value in link.items():
-                link_elem.set(key, value)
+        _write_links(parts, self.links)
         
-        return entry
+        parts.append("</entry>")
 
 
 class Feed:
@@ -93,8 +124,9 @@ class Feed:
         id: str,
         title: str,
         updated: str,
-        links: List[Dict[str, str]] = None,
-        entries: List[Entry] = None
+        links: List[Union[str, Dict[str, str]]] = None,
+        entries: List[Entry] = None,
+        books: List[Book] = None
     ):
         """
         初始化OPDS Feed
@@ -103,66 +135,71 @@ class Feed:
             id: Feed ID
             title: Feed标题
             updated: 更新时间，格式为ATOM_TIME_FORMAT
-            links: 链接列表
+            links: 链接列表，元素为属性字典或预先渲染的XML片段
             entries: 条目列表
+            books: 书籍列表，序列化时直接写为书籍条目
         """
         self.id = id
         self.title = title
         self.updated = updated
         self.links = links or []
         self.entries = entries or []
+        self.books = books or []
     
-    def to_element(self) -> ET.Element:
+    def to_xml(self) -> str:
         """
-        转换为ElementTree元素
+        转换为XML字符串
+        
+        直接拼接字符串片段，不构建ElementTree，避免每个节点的对象分配。
         
         Returns:
-            ET.Element: ElementTree元素
+            str: XML字符串
         """
-        feed = ET.Element("feed")
-        feed.set("xmlns", "http://www.w3.org/2005/Atom")
-        
-        # 添加ID
-        id_elem = ET.SubElement(feed, "id")
-        id_elem.text = self.id
-        
-        # 添加标题
-        title_elem = ET.SubElement(feed, "title")
-        title_elem.text = self.title
-        
-        # 添加更新时间
-        updated_elem = ET.SubElement(feed, "updated")
-        updated_elem.text = self.updated
+        parts = [
+            '<?xml version="1.0" encoding="UTF-8"?>\n',
+            '<feed xmlns="http://www.w3.org/2005/Atom">',
+            f"<id>{_escape_text(self.id)}</id>",
+            f"<title>{_escape_text(self.title)}</title>",
+            f"<updated>{_escape_text(self.updated)}</updated>",
+        ]
         
         # 添加链接
-        for link in self.links:
-            link_elem = ET.SubElement(feed, "link")
-            for key, value in link.items():
-                link_elem.set(key, value)
+        _write_links(parts, self.links)
         
         # 添加条目
         for entry in self.entries:
-            feed.append(entry.to_element())
+            entry.write_to(parts)
+        write_book_entries(parts, self.books)
         
-        return feed
+        parts.append("</feed>")
+        return "".join(parts)
     
-    def to_xml(self) -> str:
+    def to_bytes(self) -> bytes:
         """
-        转换为XML字符串
+        转换为UTF-8编码的XML字节串，可直接作为响应体
         
         Returns:
-            str: XML字符串
+            bytes: XML字节串
         """
-        root = self.to_element()
-        
-        # 创建ElementTree
-        tree = ET.ElementTree(root)
-        
-        # 转换为字符串
-        xml_str = '<?xml version="1.0" encoding="UTF-8"?>\n'
-        xml_str += ET.tostring(root, encoding="unicode")
-        
-        return xml_str
+        return self.to_xml().encode("utf-8")
+
+
+def _write_links(parts: List[str], links: List[Union[str, Dict[str, str]]]) -> None:
+    """
+    将链接列表写入XML片段列表
+    
+    Args:
+        parts: XML字符串片段列表
+        links: 链接列表，字符串元素视为已渲染的XML片段原样写入
+    """
+    for link in links:
+        if isinstance(link, str):
+            parts.append(link)
+            continue
+        parts.append("<link")
+        for key, value in link.items():
+            parts.append(f" {key}={_xml_quoteattr(value)}")
+        parts.append("/>")
 
 
 def build_feed(
@@ -170,7 +207,9 @@ def build_feed(
     title: str,
     href: str,
     entries: List[Entry],
-    additional_links: List[Dict[str, str]] = None
+    additional_links: List[Dict[str, str]] = None,
+    now: str = None,
+    books: List[Book] = None
 ) -> Feed:
     """
     构建OPDS Feed
@@ -181,85 +220,62 @@ def build_feed(
         href: Feed链接
         entries: 条目列表
         additional_links: 附加链接列表
+        now: 本次请求的更新时间，格式为ATOM_TIME_FORMAT，为空时取当前时间
+        books: 书籍列表，直接写为书籍条目
         
     Returns:
         Feed: OPDS Feed
     """
-    # 基本链接
+    # 基本链接（仅self链接随请求变化）和附加链接一次性构建
     links = [
-        {
-            "href": "/opds/",
-            "type": DIR_MIME,
-            "rel": "start"
-        },
+        _START_LINK_XML,
         {
             "href": href,
             "type": DIR_MIME,
             "rel": "self"
         },
-        {
-            "href": "/opds/search/{searchTerms}/",
-            "type": "application/atom+xml",
-            "rel": "search"
-        }
+        _SEARCH_LINK_XML,
+        *(additional_links or ())
     ]
     
-    # 添加附加链接
-    if additional_links:
-        links.extend(additional_links)
-    
     # 构建Feed
     return Feed(
         id=id,
         title=title,
-        updated=datetime.datetime.now().strftime(ATOM_TIME_FORMAT),
+        updated=now or format_atom_time(datetime.datetime.now()),
         links=links,
-        entries=entries
+        entries=entries,
+        books=books
     )
 
 
-def books_to_entries(books: List[Book]) -> List[Entry]:
+def write_book_entries(parts: List[str], books: List[Book]) -> None:
     """
-    将书籍列表转换为OPDS条目列表
+    将书籍直接写为OPDS条目XML片段，不创建中间的Entry对象和链接字典
     
     Args:
+        parts: XML字符串片段列表
         books: 书籍列表
-        
-    Returns:
-        List[Entry]: OPDS条目列表
     """
-    entries = []
-    
     for book in books:
-        # 创建链接
-        links = [
-            {
-                "href": f"/opds/book/{book.id}/download",
-                "type": book.mime_type(),
-                "rel": FILE_REL
-            }
-        ]
+        # ID同时用于文本和href属性，需要额外转义双引号
+        book_id = escape(book.id, {'"': "&quot;"})
+        author = f"<author><name>{_xml_escape(book.author)}</name></author>" if book.author else ""
         
         # 如果有封面，添加封面链接
-        if book.cover_path:
-            links.append({
-                "href": f"/opds/book/{book.id}/cover",
-                "type": "image/jpeg",
-                "rel": COVER_REL
-            })
-        
-        # 创建条目
-        entry = Entry(
-            id=book.id,
-            title=book.title,
-            updated=book.updated_at.strftime(ATOM_TIME_FORMAT),
-            author=book.author,
-            links=links
+        cover = (
+            f'<link href="/opds/book/{book_id}/cover" type="image/jpeg" rel="{COVER_REL}"/>'
+            if book.cover_path else ""
         )
         
-        entries.append(entry)
-    
-    return entries
+        parts.append(
+            f"<entry><id>{book_id}</id>"
+            f"<title>{_xml_escape(book.title)}</title>"
+            f"<updated>{_cached_atom_time(book.updated_at)}</updated>"
+            f"{author}"
+            f'<link href="/opds/book/{book_id}/download" type={_xml_quoteattr(book.mime_type())} rel="{FILE_REL}"/>'
+            f"{cover}</entry>"
+        )
 
 
 def form_navigation_links(base_url: str, books: PaginatedBookList) -> List[Dict[str, str]]:
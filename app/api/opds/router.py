@@ -1,15 +1,22 @@
 import logging
 from fastapi import APIRouter, Depends, Request, Response, HTTPException, status
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
 from typing import Annotated, List, Optional
-import base64
+import hashlib
 from datetime import datetime
 import os
 
-from app.dependencies import get_auth_service
+from app.dependencies import get_auth_service, get_book_shelf
 from app.service import AuthService
+from app.service.book_shelf import BookShelf
+from app.entity.user import UserNotFoundError
+from app.utils.paginator import PaginatedBookList
+from app.utils.cache import TTLCache
+from app.utils.http import IMMUTABLE_CACHE_CONTROL, content_etag, not_modified, parse_basic_auth
 from app.api.opds.opds import (
-    Entry, build_feed, books_to_entries, form_navigation_links,
-    ATOM_TIME_FORMAT, DIR_MIME
+    Entry, build_feed, form_navigation_links,
+    Feed, format_atom_time, CATALOG_MIME, DIR_MIME
 )
 
 
@@ -17,6 +24,44 @@ from app.api.opds.opds import (
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# 根目录的书架列表固定不变，使用静态ETag
+_SHELVES_ETAG = 'W/"kompanion-shelves-1"'
+
+
+# 条目数超过该值时在线程池中序列化Feed，避免阻塞事件循环
+_THREADPOOL_MIN_ENTRIES = 50
+
+# 书籍列表Feed缓存：ETag -> 编码后的Feed
+# ETag由本页内容计算，内容变化时ETag随之变化，因此缓存无需主动失效
+_feed_cache: TTLCache[bytes] = TTLCache(maxsize=256, ttl=300)
+
+
+async def _feed_body(feed: Feed) -> bytes:
+    """将Feed编码为字节串，条目较多时在线程池中序列化"""
+    if len(feed.entries) + len(feed.books) >= _THREADPOOL_MIN_ENTRIES:
+        return await run_in_threadpool(feed.to_bytes)
+    return feed.to_bytes()
+
+
+def _feed_response(body: bytes, etag: Optional[str] = None) -> Response:
+    """将编码后的Feed作为响应返回，直接传入字节串并预设Content-Length"""
+    headers = {"Content-Length": str(len(body))}
+    if etag:
+        headers["ETag"] = etag
+    return Response(
+        content=body,
+        media_type=CATALOG_MIME,
+        headers=headers
+    )
+
+
+def _newest_etag(page: int, books: PaginatedBookList) -> str:
+    """根据页码、书籍总数以及本页书籍的ID和更新时间计算弱ETag"""
+    digest = hashlib.blake2b(f"{page}:{books.total_count}".encode(), digest_size=8)
+    for book in books.items:
+        digest.update(f":{book.id}:{book.updated_at.timestamp()}".encode())
+    return f'W/"{digest.hexdigest()}"'
+
 
 # OPDS基本认证中间件
 async def basic_auth(
@@ -33,50 +78,36 @@ async def basic_auth(
     Returns:
         str: 设备名称或用户名，如果认证失败则抛出HTTPException
     """
-    # 获取Authorization头
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Basic "):
-        # 如果没有Authorization头，返回401
+    # 解析Basic认证头，缺失或格式无效时返回401
+    credentials = parse_basic_auth(request.headers.get("Authorization"))
+    if credentials is None:
         logger.debug("OPDS Basic Auth: Missing or invalid Authorization header.")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="未认证",
             headers={"WWW-Authenticate": "Basic realm=\"KOmpanion OPDS\""}
         )
-    
-    # 解码Basic认证
-    identifier: str = ""
-    password: str = ""
-    try:
-        auth_decoded = base64.b64decode(auth_header[6:]).decode("utf-8")
-        identifier, password = auth_decoded.split(":", 1)
-    except Exception as e:
-        logger.error(f"解码Basic认证失败: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="认证格式无效",
-            headers={"WWW-Authenticate": "Basic realm=\"KOmpanion OPDS\""}
-        )
+    identifier, password = credentials
     
     # 尝试设备认证 (KOReader OPDS often uses device credentials, sends plain password)
-    logger.debug(f"OPDS Basic Auth: Attempting device auth for identifier: {identifier}")
+    logger.debug("OPDS Basic Auth: Attempting device auth for identifier: %s", identifier)
     if await auth_service.check_device_password(identifier, password, plain=False):
-        logger.info(f"OPDS authentication successful for device: {identifier}")
+        logger.info("OPDS authentication successful for device: %s", identifier)
         return identifier
     
     # 尝试用户认证 (if device auth fails)
-    logger.debug(f"OPDS Basic Auth: Device auth failed for {identifier}, attempting user auth.")
+    logger.debug("OPDS Basic Auth: Device auth failed for %s, attempting user auth.", identifier)
     try:
         user = await auth_service.user_repo.get_user_by_username(identifier)
-        if user and auth_service._verify_password(password, user.hashed_password):
-            logger.info(f"OPDS authentication successful for user: {identifier}")
-            return identifier
-    except Exception as e: # Catch potential errors from user_repo.get_user_by_username if user not found etc.
-        logger.debug(f"OPDS Basic Auth: User repo lookup or password verification failed for user {identifier}: {str(e)}")
-        pass # Continue to final failure if this path doesn't succeed
+    except UserNotFoundError:
+        logger.debug("OPDS Basic Auth: User %s not found.", identifier)
+        user = None
+    if user and await auth_service._verify_password(password, user.hashed_password):
+        logger.info("OPDS authentication successful for user: %s", identifier)
+        return identifier
     
     # 如果都认证失败，返回401
-    logger.warning(f"OPDS authentication failed for identifier: {identifier}")
+    logger.warning("OPDS authentication failed for identifier: %s", identifier)
     raise HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="用户名或密码不正确",
@@ -94,14 +125,22 @@ async def list_shelves(
     
     这是OPDS的根目录，列出可用的书架。
     """
-    logger.info(f"OPDS列出书架请求: 设备={device_name}")
+    logger.info("OPDS列出书架请求: 设备=%s", device_name)
+    
+    # 客户端缓存仍然有效时直接返回304
+    cached = not_modified(request, _SHELVES_ETAG)
+    if cached:
+        return cached
+    
+    # 整个Feed共用同一个更新时间
+    now = format_atom_time(datetime.now())
     
     # 创建书架条目
     shelves = [
         Entry(
             id="urn:kompanion:newest",
             title="最新添加",
-            updated=datetime.now().strftime(ATOM_TIME_FORMAT),
+            updated=now,
             links=[
                 {
                     "href": "/opds/newest/",
@@ -117,14 +156,12 @@ async def list_shelves(
         id="urn:kompanion:main",
         title="KOmpanion书库",
         href="/opds",
-        entries=shelves
+        entries=shelves,
+        now=now
     )
     
     # 返回XML响应
-    return Response(
-        content=feed.to_xml(),
-        media_type="application/atom+xml;profile=opds-catalog"
-    )
+    return _feed_response(await _feed_body(feed), _SHELVES_ETAG)
 
 
 @router.get("/newest/")
@@ -139,39 +176,46 @@ async def list_newest(
     
     这是OPDS的书籍列表，按添加时间排序。
     """
-    logger.info(f"OPDS列出最新书籍请求: 设备={device_name}, 页码={page}")
+    logger.info("OPDS列出最新书籍请求: 设备=%s, 页码=%s", device_name, page)
     
     # 获取书籍列表
     books = await book_shelf.list_books(None, "created_at", "desc", page, 10)
     
-    # 构建基础URL
-    base_url = "/opds/newest/"
+    # 本页内容未变化时跳过Feed构建，直接返回304
+    etag = _newest_etag(page, books)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
     
-    # 将书籍转换为条目
-    entries = books_to_entries(books.items)
-    
-    # 构建导航链接
-    nav_links = form_navigation_links(base_url, books)
-    
-    # 构建Feed
-    feed = build_feed(
-        id="urn:kompanion:newest",
-        title="最新添加的书籍",
-        href=base_url,
-        entries=entries,
-        additional_links=nav_links
-    )
+    # 其他客户端已请求过相同内容时直接返回缓存的Feed
+    body = _feed_cache.get(etag)
+    if body is None:
+        # 构建基础URL
+        base_url = "/opds/newest/"
+        
+        # 构建导航链接
+        nav_links = form_navigation_links(base_url, books)
+        
+        # 构建Feed
+        feed = build_feed(
+            id="urn:kompanion:newest",
+            title="最新添加的书籍",
+            href=base_url,
+            entries=[],
+            additional_links=nav_links,
+            books=books.items
+        )
+        body = await _feed_body(feed)
+        _feed_cache.set(etag, body)
     
     # 返回XML响应
-    return Response(
-        content=feed.to_xml(),
-        media_type="application/atom+xml;profile=opds-catalog"
-    )
+    return _feed_response(body, etag)
 
 
 @router.get("/book/{book_id}/download")
 async def download_book(
     book_id: str,
+    request: Request,
     book_shelf: Annotated[BookShelf, Depends(get_book_shelf)],
     device_name: str = Depends(basic_auth)
 ):
@@ -180,20 +224,27 @@ async def download_book(
     
     通过OPDS下载书籍文件。
     """
-    logger.info(f"OPDS下载书籍请求: 设备={device_name}, 书籍ID={book_id}")
+    logger.info("OPDS下载书籍请求: 设备=%s, 书籍ID=%s", device_name, book_id)
     
     try:
-        # 获取书籍
-        book, temp_file_path = await book_shelf.download_book(None, book_id)
+        # 获取书籍，文件未变化时返回304
+        book = await book_shelf.view_book(None, book_id)
+        etag = content_etag(book.id, book.document_id)
+        cache_headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+        cached = not_modified(request, etag, cache_headers)
+        if cached:
+            return cached
+        temp_file_path = await book_shelf.read_book_file(book)
         
         # 返回文件
-        return Response(
-            content=open(temp_file_path, "rb").read(),
+        return FileResponse(
+            path=temp_file_path,
+            filename=book.filename(),
             media_type=book.mime_type(),
-            headers={"Content-Disposition": f"attachment; filename={book.filename()}"}
+            headers={**cache_headers, "ETag": etag}
         )
     except Exception as e:
-        logger.error(f"下载书籍失败: {str(e)}")
+        logger.error("下载书籍失败: %s", e)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"未找到书籍: {book_id}"
@@ -203,6 +254,7 @@ async def download_book(
 @router.get("/book/{book_id}/cover")
 async def view_book_cover(
     book_id: str,
+    request: Request,
     book_shelf: Annotated[BookShelf, Depends(get_book_shelf)],
     device_name: str = Depends(basic_auth)
 ):
@@ -211,19 +263,26 @@ async def view_book_cover(
     
     通过OPDS查看书籍封面。
     """
-    logger.info(f"OPDS查看书籍封面请求: 设备={device_name}, 书籍ID={book_id}")
+    logger.info("OPDS查看书籍封面请求: 设备=%s, 书籍ID=%s", device_name, book_id)
     
     try:
-        # 获取封面
-        cover_path = await book_shelf.view_cover(None, book_id)
+        # 获取书籍，封面未变化时返回304
+        book = await book_shelf.view_book(None, book_id)
+        etag = content_etag(book.id, book.cover_path)
+        cache_headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+        cached = not_modified(request, etag, cache_headers)
+        if cached:
+            return cached
+        cover_path = await book_shelf.read_cover(book)
         
         # 返回文件
-        return Response(
-            content=open(cover_path, "rb").read(),
-            media_type="image/jpeg"
+        return FileResponse(
+            path=cover_path,
+            media_type="image/jpeg",
+            headers={**cache_headers, "ETag": etag}
         )
     except Exception as e:
-        logger.error(f"查看书籍封面失败: {str(e)}")
+        logger.error("查看书籍封面失败: %s", e)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"未找到书籍封面: {book_id}"
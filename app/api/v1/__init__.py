@@ -8,32 +8,15 @@ from app.api.v1.stats import router as stats_router
 # 创建API v1版本路由器
 api_router = APIRouter(prefix="/api/v1")
 
-# 添加认证路由
-api_router.include_router(
-    auth_router,
-    prefix="/auth",
-    tags=["认证"]
+# 子路由表：(路由器, 前缀, 标签)
+_ROUTES = (
+    (auth_router, "/auth", "认证"),
+    (books_router, "/books", "书籍管理"),
+    (progress_router, "/progress", "进度同步"),
+    (stats_router, "/stats", "阅读统计"),
 )
 
-# 添加书籍路由
-api_router.include_router(
-    books_router,
-    prefix="/books",
-    tags=["书籍管理"]
-)
-
-# 添加进度同步路由
-api_router.include_router(
-    progress_router,
-    prefix="/progress",
-    tags=["进度同步"]
-)
-
-# 添加阅读统计路由
-api_router.include_router(
-    stats_router,
-    prefix="/stats",
-    tags=["阅读统计"]
-)
+for router, prefix, tag in _ROUTES:
+    api_router.include_router(router, prefix=prefix, tags=[tag])
 
 __all__ = ["api_router"]
@@ -1,12 +1,12 @@
 import logging
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Form
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from typing import Annotated, Optional
-from pydantic import BaseModel, EmailStr
+from typing import Annotated
+from pydantic import BaseModel
 
 from app.service.auth import AuthService
 from app.dependencies import get_auth_service
-from app.service import get_current_user
+from app.service import get_current_user, invalidate_session_cache
 from app.entity.user import User, UserCreate, UserResponse, Token, UserSessionInfo
 from app.utils.security import create_access_token, verify_password
 
@@ -23,14 +23,6 @@ class TokenResponse(BaseModel):
     token_type: str
     expires_in: int
     
-class UserCreate(BaseModel):
-    username: str
-    password: str
-    
-class UserResponse(BaseModel):
-    id: str
-    username: str
-    
 class DeviceCreate(BaseModel):
     name: str
 
@@ -39,14 +31,6 @@ class WebLoginRequest(BaseModel):
     username: str
     password: str
 
-# This is an example, actual User model might be different
-class CurrentUserResponse(BaseModel):
-    id: Optional[str] = None
-    username: str
-    email: Optional[EmailStr] = None
-    is_active: Optional[bool] = None
-    is_superuser: Optional[bool] = None
-
 
 @router.post("/token")
 async def login_for_access_token(
@@ -83,7 +67,7 @@ async def login_for_access_token(
             expires_in=auth_service.ACCESS_TOKEN_EXPIRE_MINUTES * 60
         )
     except Exception as e:
-        logger.error(f"登录失败: {str(e)}")
+        logger.error("登录失败: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="认证失败",
@@ -122,7 +106,7 @@ async def register_user(
             detail=str(e)
         )
     except Exception as e:
-        logger.error(f"用户注册失败: {str(e)}")
+        logger.error("用户注册失败: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="用户注册失败"
@@ -136,7 +120,7 @@ async def logout(
     auth_service: Annotated[AuthService, Depends(get_auth_service)]
 ):
     """
-    用户登出
+    用户登出，同时适用于网页登录和会话密钥认证
     
     Args:
         request: 请求对象
@@ -146,7 +130,14 @@ async def logout(
     Returns:
         dict: 登出成功信息
     """
+    user_session = request.session.get("user")
+    if user_session and "username" in user_session:
+        logger.info("用户 %s 正在登出。", user_session['username'])
+    
     # 清除会话
+    session_key = request.session.get("session_key")
+    if session_key:
+        invalidate_session_cache(session_key)
     request.session.clear()
     
     # 返回成功信息
@@ -187,7 +178,7 @@ async def register_device(
             detail=str(e)
         )
     except Exception as e:
-        logger.error(f"设备注册失败: {str(e)}")
+        logger.error("设备注册失败: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="设备注册失败"
@@ -216,7 +207,7 @@ async def list_devices(
         # 返回设备列表
         return devices
     except Exception as e:
-        logger.error(f"获取设备列表失败: {str(e)}")
+        logger.error("获取设备列表失败: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="获取设备列表失败"
@@ -253,48 +244,38 @@ async def delete_device(
             detail=str(e)
         )
     except Exception as e:
-        logger.error(f"删除设备失败: {str(e)}")
+        logger.error("删除设备失败: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="删除设备失败"
         )
 
 
-@router.get("/me")
+@router.get("/me", response_model=UserResponse, summary="获取当前登录用户信息")
 async def read_users_me(
-    auth_service: Annotated[AuthService, Depends(get_auth_service)],
-    user_id: str = Depends(get_current_user)
+    request: Request,
+    auth_service: Annotated[AuthService, Depends(get_auth_service)]
 ):
     """
     获取当前用户信息
     
+    网页登录的用户信息直接从会话中读取，否则通过会话密钥认证。
+    
     Args:
+        request: 请求对象
         auth_service: 认证服务
-        user_id: 用户ID
         
     Returns:
         UserResponse: 用户信息
     """
-    try:
-        # 获取用户信息
-        user = await auth_service.get_user(user_id)
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="用户不存在"
-            )
-        
-        # 返回用户信息
-        return UserResponse(
-            id=user.id,
-            username=user.username
-        )
-    except Exception as e:
-        logger.error(f"获取用户信息失败: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="获取用户信息失败"
-        )
+    user_session = request.session.get("user")
+    if user_session and "username" in user_session:
+        logger.debug("获取到当前登录用户信息: %s", user_session['username'])
+        return UserResponse.model_validate(user_session)
+    
+    # 未认证时抛出401
+    username = await get_current_user(request, auth_service)
+    return UserResponse(username=username)
 
 # Web Login/Logout Endpoints
 @router.post("/login", summary="用户网页登录")
@@ -308,13 +289,13 @@ async def web_login(
     处理用户通过Web界面的登录请求。
     验证成功后，在Session中存储用户信息。
     """
-    logger.info(f"网页登录尝试: 用户名={form_data.username}")
+    logger.info("网页登录尝试: 用户名=%s", form_data.username)
     # 这里假设AuthService有方法来验证管理员账户
     # 注意：README 中 KOMPANION_AUTH_USERNAME 和 KOMPANION_AUTH_PASSWORD 是环境变量
     # AuthService 需要能访问这些配置来验证管理员
     user = await auth_service.authenticate_admin_via_config(form_data.username, form_data.password)
     if not user:
-        logger.warning(f"网页登录失败: 用户名 {form_data.username} 认证失败")
+        logger.warning("网页登录失败: 用户名 %s 认证失败", form_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码不正确",
@@ -324,46 +305,9 @@ async def web_login(
     # 将用户信息存储在会话中
     # SessionMiddleware 必须在 main.py 中正确配置
     request.session["user"] = {"username": user.username, "id": str(user.id), "is_superuser": user.is_superuser} # Store what's needed
-    logger.info(f"用户 {user.username} 登录成功，会话已创建。")
+    logger.info("用户 %s 登录成功，会话已创建。", user.username)
     return {"message": "登录成功"}
 
-@router.post("/logout", summary="用户网页登出")
-async def web_logout(request: Request, response: Response):
-    """
-    处理用户通过Web界面的登出请求。
-    清除Session中的用户信息。
-    """
-    user_session = request.session.get("user")
-    if user_session and "username" in user_session:
-        logger.info(f"用户 {user_session['username']} 正在登出。")
-    else:
-        logger.info("匿名用户尝试登出或会话已过期。")
-        
-    request.session.clear()
-    logger.info("会话已清除。")
-    return {"message": "登出成功"}
-
-@router.get("/me", response_model=CurrentUserResponse, summary="获取当前登录用户信息")
-async def web_get_current_user(request: Request):
-    """
-    从会话中获取当前登录用户的信息。
-    如果用户未登录，则返回401错误。
-    """
-    user_session = request.session.get("user")
-    if not user_session or "username" not in user_session:
-        logger.debug("尝试获取当前用户信息，但用户未登录或会cha话无效。")
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="用户未认证")
-    
-    # 假设UserService或AuthService有一个方法可以根据用户名或ID获取用户详情
-    # For now, returning session data directly or a subset of it.
-    # In a real app, you'd fetch the full user object from DB via user_service.get_user_by_username(user_session["username"])
-    logger.debug(f"获取到当前登录用户信息: {user_session['username']}")
-    return CurrentUserResponse(**user_session)
-
-# The /users/me endpoint might be for API token users, /me for web session users.
-# Consolidate or keep separate based on auth flow design.
-# For now, keeping /me for web session based auth.
-
 # Ensure AuthService has authenticate_admin method
 # Example (to be implemented in AuthService):
 # async def authenticate_admin(self, username: str, password: str) -> Optional[UserSchema]:
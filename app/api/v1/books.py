@@ -1,36 +1,25 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status, Response, Request
-from fastapi.responses import FileResponse, JSONResponse
-from typing import Annotated, Optional, List, Dict, Any
-import tempfile
+from fastapi.responses import FileResponse
+from typing import Annotated, Optional, List, Dict, Any, Literal
 import os
 import logging
-from contextlib import asynccontextmanager
-import shutil
+import aiofiles.os
+import aiofiles.tempfile
 
 from app.dependencies import get_book_shelf, get_auth_service
 from app.service.book_shelf import BookShelf
-from app.entity.book import BookResponse, BookUpdate, BookAlreadyExistsError, Book
+from app.entity.book import BookResponse, BookListResponse, BookUpdate, BookAlreadyExistsError, Book
 from app.service import get_current_user
+from app.utils.utils import PartialMD5
+from app.utils.http import IMMUTABLE_CACHE_CONTROL, content_etag, not_modified
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-@asynccontextmanager
-async def save_upload_file(upload_file: UploadFile):
-    """临时保存上传的文件"""
-    try:
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            # 读取上传的文件并写入临时文件
-            content = await upload_file.read()
-            temp_file.write(content)
-            temp_path = temp_file.name
-        yield temp_path
-    finally:
-        # 清理临时文件
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
+# 上传文件分块写入的大小（字节）
+UPLOAD_CHUNK_SIZE = 64 * 1024
 
-@router.post("/")
+@router.post("/", status_code=status.HTTP_201_CREATED)
 async def upload_book(
     file: UploadFile = File(...),
     request: Request = None,
@@ -40,53 +29,65 @@ async def upload_book(
     """
     上传一本书
     
+    书籍已存在时由全局异常处理器返回409。
+    
     Args:
         file: 电子书文件
         user_id: 用户ID
         book_shelf: 书架服务
         
     Returns:
-        JSONResponse: 上传成功信息
+        dict: 上传成功信息
     """
+    # 分块写入临时文件，保留原扩展名以便识别书籍格式
+    # 写入的同时计算部分MD5，存储时无需再读一遍文件
+    suffix = os.path.splitext(file.filename or "")[1]
+    file_hash = PartialMD5()
+    temp_file_path = None
     try:
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            # 复制上传的文件内容到临时文件
-            shutil.copyfileobj(file.file, temp_file)
-            temp_file_path = temp_file.name
-        
         try:
-            # 存储书籍
-            book = await book_shelf.store_book(user_id, temp_file_path, file.filename)
-            
-            # 返回成功信息
-            return JSONResponse(
-                status_code=status.HTTP_201_CREATED,
-                content={
-                    "message": "书籍上传成功",
-                    "book_id": book.id,
-                    "title": book.title,
-                    "author": book.author,
-                    "file_name": book.file_name
-                }
-            )
-        except Exception as e:
-            logger.error(f"存储书籍失败: {str(e)}")
+            async with aiofiles.tempfile.NamedTemporaryFile("wb", suffix=suffix, delete=False) as temp_file:
+                # 先记录路径，复制中途失败（如客户端断开）时也能删除不完整的临时文件
+                temp_file_path = temp_file.name
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    file_hash.update(chunk)
+                    await temp_file.write(chunk)
+        except OSError as e:
+            logger.error("处理上传文件失败: %s", e)
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"存储书籍失败: {str(e)}"
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"处理上传文件失败: {str(e)}"
             )
-        finally:
-            # 删除临时文件
-            os.unlink(temp_file_path)
-    except Exception as e:
-        logger.error(f"处理上传文件失败: {str(e)}")
+        
+        # 存储书籍
+        book = await book_shelf.store_book(
+            user_id, temp_file_path, file.filename, file_hash.hexdigest()
+        )
+    except ValueError as e:
+        # 未知格式或写入存储失败
+        logger.error("存储书籍失败: %s", e)
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"处理上传文件失败: {str(e)}"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"存储书籍失败: {str(e)}"
         )
+    finally:
+        # 删除临时文件
+        if temp_file_path:
+            try:
+                await aiofiles.os.remove(temp_file_path)
+            except FileNotFoundError:
+                pass
+    
+    # 返回成功信息
+    return {
+        "message": "书籍上传成功",
+        "book_id": book.id,
+        "title": book.title,
+        "author": book.author,
+        "file_name": book.filename()
+    }
 
-@router.get("/")
+@router.get("/", response_model=BookListResponse)
 async def list_books(
     request: Request = None,
     book_shelf: Annotated[BookShelf, Depends(get_book_shelf)] = None,
@@ -94,45 +95,55 @@ async def list_books(
     page: int = 1,
     page_size: int = 10,
     sort_by: str = "created_at",
-    sort_order: str = "desc"
+    sort_order: Literal["asc", "desc"] = "desc",
+    cursor: Optional[str] = None
 ):
     """
     获取书籍列表
     
+    传入cursor时按游标分页（键集分页），不统计总数；否则按页码分页。
+    
     Args:
         page: 页码
         page_size: 每页数量
         sort_by: 排序字段
         sort_order: 排序顺序
+        cursor: 上一页返回的next_cursor
         user_id: 用户ID
         book_shelf: 书架服务
         
     Returns:
-        JSONResponse: 书籍列表
+        BookListResponse: 书籍列表
     """
-    try:
-        # 获取书籍列表
-        books = await book_shelf.list_books(user_id, sort_by, sort_order, page, page_size)
-        
-        # 构造返回数据
-        result = {
-            "items": [book.to_dict() for book in books.items],
-            "total": books.total,
-            "page": books.page,
-            "page_size": books.page_size,
-            "pages": (books.total + books.page_size - 1) // books.page_size
-        }
-        
-        # 返回书籍列表
-        return JSONResponse(content=result)
-    except Exception as e:
-        logger.error(f"获取书籍列表失败: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"获取书籍列表失败: {str(e)}"
+    if cursor:
+        try:
+            items, next_cursor, page_size = await book_shelf.list_books_after(
+                user_id, sort_by, sort_order, cursor, page_size
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"无效的游标: {str(e)}"
+            )
+        return BookListResponse(
+            items=[BookResponse.model_validate(book) for book in items],
+            page_size=page_size,
+            next_cursor=next_cursor
         )
+    
+    # 获取书籍列表
+    books = await book_shelf.list_books(user_id, sort_by, sort_order, page, page_size)
+    
+    # 返回书籍列表，由Pydantic校验后交给ORJSONResponse序列化
+    return BookListResponse(
+        items=[BookResponse.model_validate(book) for book in books.items],
+        total=books.total_count,
+        page=books.current_page,
+        page_size=books.per_page,
+        next_cursor=book_shelf.next_cursor(books, sort_by)
+    )
 
-@router.get("/{book_id}")
+@router.get("/{book_id}", response_model=BookResponse)
 async def get_book(
     book_id: str,
     book_shelf: Annotated[BookShelf, Depends(get_book_shelf)] = None,
@@ -147,25 +158,18 @@ async def get_book(
         book_shelf: 书架服务
         
     Returns:
-        JSONResponse: 书籍详情
+        BookResponse: 书籍详情
     """
-    try:
-        # 获取书籍详情
-        book = await book_shelf.view_book(user_id, book_id)
-        
-        # 返回书籍详情
-        return JSONResponse(content=book.to_dict())
-    except Exception as e:
-        logger.error(f"获取书籍详情失败: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"未找到书籍: {book_id}"
-        )
+    # 获取书籍详情，不存在时由全局异常处理器返回404
+    book = await book_shelf.view_book(user_id, book_id)
+    
+    # 返回书籍详情
+    return BookResponse.model_validate(book)
 
 @router.put("/{book_id}")
 async def update_book(
     book_id: str,
-    request: Request,
+    metadata: BookUpdate,
     book_shelf: Annotated[BookShelf, Depends(get_book_shelf)] = None,
     user_id: str = Depends(get_current_user)
 ):
@@ -174,138 +178,133 @@ async def update_book(
     
     Args:
         book_id: 书籍ID
-        request: 请求对象
+        metadata: 要更新的元数据，包含未知字段时返回422
         user_id: 用户ID
         book_shelf: 书架服务
         
     Returns:
-        JSONResponse: 更新成功信息
+        dict: 更新成功信息
     """
-    try:
-        # 获取请求体数据
-        data = await request.json()
-        
-        # 提取元数据
-        metadata = {}
-        for key in ["title", "author", "description", "publisher", "language", "tags"]:
-            if key in data:
-                metadata[key] = data[key]
-        
-        # 更新书籍元数据
-        book = await book_shelf.update_book_metadata(user_id, book_id, metadata)
-        
-        # 返回更新成功信息
-        return JSONResponse(
-            content={
-                "message": "书籍元数据更新成功",
-                "book": book.to_dict()
-            }
-        )
-    except Exception as e:
-        logger.error(f"更新书籍元数据失败: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"未找到书籍或更新失败: {book_id}"
-        )
+    # 更新书籍元数据，不存在时由全局异常处理器返回404
+    book = await book_shelf.update_book_metadata(user_id, book_id, metadata)
+    
+    # 返回更新成功信息
+    return {
+        "message": "书籍元数据更新成功",
+        "book": BookResponse.model_validate(book)
+    }
 
 @router.get("/{book_id}/download")
 async def download_book(
     book_id: str,
+    request: Request,
     book_shelf: Annotated[BookShelf, Depends(get_book_shelf)] = None,
     user_id: str = Depends(get_current_user)
 ):
     """
     下载书籍
     
+    书籍文件写入后不再改变，客户端缓存的ETag匹配时返回304。
+    
     Args:
         book_id: 书籍ID
+        request: 请求对象
         user_id: 用户ID
         book_shelf: 书架服务
         
     Returns:
         FileResponse: 书籍文件
     """
+    # 获取书籍，ETag由书籍ID和文件哈希决定
+    book = await book_shelf.view_book(user_id, book_id)
+    etag = content_etag(book.id, book.document_id)
+    cache_headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    cached = not_modified(request, etag, cache_headers)
+    if cached:
+        return cached
+    
+    # 读取书籍文件
     try:
-        # 下载书籍
-        book, file_path = await book_shelf.download_book(user_id, book_id)
-        
-        # 返回文件
-        return FileResponse(
-            path=file_path,
-            filename=book.filename(),
-            media_type=book.mime_type()
-        )
-    except Exception as e:
-        logger.error(f"下载书籍失败: {str(e)}")
+        file_path = await book_shelf.read_book_file(book)
+    except ValueError as e:
+        logger.error("下载书籍失败: %s", e)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"未找到书籍: {book_id}"
         )
+    
+    # 返回文件
+    return FileResponse(
+        path=file_path,
+        filename=book.filename(),
+        media_type=book.mime_type(),
+        headers={**cache_headers, "ETag": etag}
+    )
 
 @router.get("/{book_id}/cover")
 async def view_book_cover(
     book_id: str,
+    request: Request,
     book_shelf: Annotated[BookShelf, Depends(get_book_shelf)] = None,
     user_id: str = Depends(get_current_user)
 ):
     """
     查看书籍封面
     
+    封面在入库时生成后不再改变，客户端缓存的ETag匹配时返回304。
+    
     Args:
         book_id: 书籍ID
+        request: 请求对象
         user_id: 用户ID
         book_shelf: 书架服务
         
     Returns:
         FileResponse: 书籍封面图片
     """
+    # 获取书籍，ETag由书籍ID和封面路径决定
+    book = await book_shelf.view_book(user_id, book_id)
+    etag = content_etag(book.id, book.cover_path)
+    cache_headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    cached = not_modified(request, etag, cache_headers)
+    if cached:
+        return cached
+    
+    # 获取封面，没有封面或读取失败时返回404
     try:
-        # 获取封面
-        cover_path = await book_shelf.view_cover(user_id, book_id)
-        
-        # 返回封面图片
-        return FileResponse(
-            path=cover_path,
-            media_type="image/jpeg"
-        )
-    except Exception as e:
-        logger.error(f"查看书籍封面失败: {str(e)}")
+        cover_path = await book_shelf.read_cover(book)
+    except ValueError as e:
+        logger.error("查看书籍封面失败: %s", e)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"未找到书籍封面: {book_id}"
         )
+    
+    # 返回封面图片
+    return FileResponse(
+        path=cover_path,
+        media_type="image/jpeg",
+        headers={**cache_headers, "ETag": etag}
+    )
 
 @router.delete("/{book_id}")
 async def delete_book(
     book_id: str,
-    book_shelf: Annotated[BookShelf, Depends(get_book_shelf)] = None,
     user_id: str = Depends(get_current_user)
 ):
     """
     删除书籍
     
+    书架服务尚未实现删除书籍，固定返回501。
+    
     Args:
         book_id: 书籍ID
         user_id: 用户ID
-        book_shelf: 书架服务
         
-    Returns:
-        JSONResponse: 删除成功信息
+    Raises:
+        HTTPException: 总是抛出501
     """
-    try:
-        # 删除书籍
-        await book_shelf.delete_book(user_id, book_id)
-        
-        # 返回删除成功信息
-        return JSONResponse(
-            content={
-                "message": "书籍删除成功",
-                "book_id": book_id
-            }
-        )
-    except Exception as e:
-        logger.error(f"删除书籍失败: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"未找到书籍或删除失败: {book_id}"
-        ) 
\ No newline at end of file
+    raise HTTPException(
+        status_code=status.HTTP_501_NOT_IMPLEMENTED,
+        detail=f"暂不支持删除书籍: {book_id}"
+    )
@@ -3,10 +3,23 @@ from typing import Annotated
 
 from app.dependencies import get_progress_sync, get_auth_service
 from app.service import ProgressSync
-from app.entity.progress import ProgressRequest, ProgressResponse
+from app.entity.progress import Progress, ProgressRequest, ProgressResponse
 
 router = APIRouter()
 
+# 依赖函数，用于从请求中获取设备名称
+async def get_device_name(
+    auth_service = Depends(get_auth_service)
+):
+    """
+    从请求中获取设备名称
+    
+    此函数应该与认证中间件配合使用，获取已认证的设备名称。
+    暂时返回一个默认值，后续实现完整的认证中间件后会更新。
+    """
+    # 暂时返回默认值，后续会通过认证中间件设置
+    return "default_device"
+
 @router.put("/progress", response_model=ProgressResponse)
 async def update_progress(
     progress: ProgressRequest,
@@ -18,10 +31,10 @@ async def update_progress(
     
     此端点用于KOReader同步阅读进度。设备通过基本认证发送进度数据，
     服务器根据时间戳决定是否更新进度，并返回最新的进度数据。
+    新进度进入合并队列后立即返回，由后台任务批量写入数据库。
     """
     # 添加设备名称
-    progress_data = progress.model_dump()
-    progress_data["auth_device_name"] = device_name
+    progress_data = Progress(**progress.model_dump(), auth_device_name=device_name)
     
     # 同步进度
     result = await progress_sync.sync(None, progress_data)
@@ -47,16 +60,3 @@ async def fetch_progress(
         )
     
     return result
-
-# 依赖函数，用于从请求中获取设备名称
-async def get_device_name(
-    auth_service = Depends(get_auth_service)
-):
-    """
-    从请求中获取设备名称
-    
-    此函数应该与认证中间件配合使用，获取已认证的设备名称。
-    暂时返回一个默认值，后续实现完整的认证中间件后会更新。
-    """
-    # 暂时返回默认值，后续会通过认证中间件设置
-    return "default_device" 
\ No newline at end of file
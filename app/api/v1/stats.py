@@ -1,6 +1,6 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import Annotated, Optional, List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import Annotated, Optional, List, Dict, Any, Literal
 
 from app.service.reading_stats import ReadingStats
 from app.dependencies import get_reading_stats
@@ -10,6 +10,10 @@ from app.service import get_current_user
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# 查询参数的可选值，由FastAPI校验，无效值直接返回422
+StatsPeriod = Literal["day", "week", "month", "year"]
+StatsMetric = Literal["reading_time", "pages_read", "completion_percentage"]
+
 
 @router.get("/")
 async def get_reading_stats(
@@ -39,7 +43,7 @@ async def get_reading_stats(
         # 返回统计数据
         return stats
     except Exception as e:
-        logger.error(f"获取阅读统计失败: {str(e)}")
+        logger.error("获取阅读统计失败: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"获取阅读统计失败: {str(e)}"
@@ -48,7 +52,7 @@ async def get_reading_stats(
 
 @router.get("/summary")
 async def get_reading_summary(
-    period: str = "month",
+    period: StatsPeriod = "month",
     reading_stats: Annotated[ReadingStats, Depends(get_reading_stats)] = None,
     user_id: str = Depends(get_current_user)
 ):
@@ -64,10 +68,6 @@ async def get_reading_summary(
         dict: 阅读摘要数据
     """
     try:
-        # 验证周期
-        if period not in ["day", "week", "month", "year"]:
-            raise ValueError("无效的统计周期")
-        
         # 获取摘要数据
         summary = await reading_stats.get_summary(user_id, period)
         
@@ -79,7 +79,7 @@ async def get_reading_summary(
             detail=str(e)
         )
     except Exception as e:
-        logger.error(f"获取阅读摘要失败: {str(e)}")
+        logger.error("获取阅读摘要失败: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"获取阅读摘要失败: {str(e)}"
@@ -110,7 +110,7 @@ async def get_book_stats(
         # 返回统计数据
         return stats
     except Exception as e:
-        logger.error(f"获取书籍统计失败: {str(e)}")
+        logger.error("获取书籍统计失败: %s", e)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"未找到书籍或统计数据: {book_id}"
@@ -119,9 +119,9 @@ async def get_book_stats(
 
 @router.get("/trends")
 async def get_reading_trends(
-    metric: str = "reading_time",
-    period: str = "week",
-    last_n: int = 4,
+    metric: StatsMetric = "reading_time",
+    period: StatsPeriod = "week",
+    last_n: Annotated[int, Query(ge=1, le=52)] = 4,
     reading_stats: Annotated[ReadingStats, Depends(get_reading_stats)] = None,
     user_id: str = Depends(get_current_user)
 ):
@@ -139,18 +139,6 @@ async def get_reading_trends(
         dict: 阅读趋势数据
     """
     try:
-        # 验证参数
-        valid_metrics = ["reading_time", "pages_read", "completion_percentage"]
-        if metric not in valid_metrics:
-            raise ValueError(f"无效的统计指标，可选值: {', '.join(valid_metrics)}")
-        
-        valid_periods = ["day", "week", "month", "year"]
-        if period not in valid_periods:
-            raise ValueError(f"无效的统计周期，可选值: {', '.join(valid_periods)}")
-        
-        if last_n < 1 or last_n > 52:
-            raise ValueError("last_n参数必须在1到52之间")
-        
         # 获取趋势数据
         trends = await reading_stats.get_trends(user_id, metric, period, last_n)
         
@@ -162,7 +150,7 @@ async def get_reading_trends(
             detail=str(e)
         )
     except Exception as e:
-        logger.error(f"获取阅读趋势失败: {str(e)}")
+        logger.error("获取阅读趋势失败: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"获取阅读趋势失败: {str(e)}"
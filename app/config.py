@@ -1,7 +1,8 @@
-from pydantic import PostgresDsn
-from pydantic_settings import BaseSettings
+from pydantic import PostgresDsn, model_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from functools import lru_cache
 from typing import Optional, Literal
-import os
+import logging
 import secrets
 
 
@@ -10,6 +11,12 @@ class Settings(BaseSettings):
     应用程序配置设置。
     使用环境变量进行配置，环境变量前缀为KOMPANION_。
     """
+    model_config = SettingsConfigDict(
+        env_prefix="KOMPANION_",
+        env_file=".env",
+        case_sensitive=True,
+    )
+    
     # 应用设置
     APP_NAME: str = "kompanion"
     VERSION: str = "dev"
@@ -27,25 +34,35 @@ class Settings(BaseSettings):
     
     # PostgreSQL设置
     PG_URL: PostgresDsn
-    PG_POOL_MAX: int = 2
+    PG_POOL_MAX: int = 10
+    PG_POOL_OVERFLOW: int = 40  # 连接池满时允许额外创建的连接数
+    PG_POOL_RECYCLE: int = -1  # 连接最长复用时间（秒），-1表示不回收
+    PG_POOL_PRE_PING: bool = False  # 取出连接前是否先检测连接可用，会增加一次往返
+    PG_POOL_WARMUP: int = 2  # 启动时预先建立的连接数，不超过PG_POOL_MAX
+    PG_COMMAND_TIMEOUT: float = 60  # 单条语句的超时时间（秒）
     
     # 书籍存储设置
     BSTORAGE_TYPE: Literal["postgres", "memory", "filesystem"] = "postgres"
     BSTORAGE_PATH: Optional[str] = None
     
     # JWT认证设置
-    SECRET_KEY: str = os.environ.get("KOMPANION_SECRET_KEY", secrets.token_urlsafe(32))
+    SECRET_KEY: str = ""
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 24小时
     
-    class Config:
-        """配置元数据"""
-        env_prefix = "KOMPANION_"
-        env_file = ".env"
-        case_sensitive = True
+    @model_validator(mode="after")
+    def _ensure_secret_key(self) -> "Settings":
+        """未配置密钥时生成随机密钥；每个进程的密钥不同，多worker部署必须显式配置"""
+        if not self.SECRET_KEY:
+            logging.getLogger(__name__).warning(
+                "KOMPANION_SECRET_KEY未设置，已生成随机密钥，重启后会话和令牌将失效"
+            )
+            self.SECRET_KEY = secrets.token_urlsafe(32)
+        return self
 
 
 # 创建全局配置实例
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
-    """获取应用配置实例"""
+    """获取应用配置实例，进程内只解析一次环境变量和.env文件"""
     return Settings() 
\ No newline at end of file
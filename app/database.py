@@ -1,33 +1,53 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+import asyncio
+from typing import AsyncIterator
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import DeclarativeBase
 
 from app.config import get_settings
 
 settings = get_settings()
 
-# 创建异步引擎，将PostgreSQL URL转换为异步版本
+# 使用asyncpg驱动的PostgreSQL连接URL，只在导入时计算一次
+ASYNC_PG_DSN = str(settings.PG_URL).replace("postgresql://", "postgresql+asyncpg://", 1)
+
+# 创建异步引擎
 engine = create_async_engine(
-    str(settings.PG_URL).replace("postgresql://", "postgresql+asyncpg://"),
+    ASYNC_PG_DSN,
     pool_size=settings.PG_POOL_MAX,
+    max_overflow=settings.PG_POOL_OVERFLOW,
+    pool_recycle=settings.PG_POOL_RECYCLE,
+    pool_pre_ping=settings.PG_POOL_PRE_PING,
     echo=settings.LOG_LEVEL == "debug",
+    connect_args={
+        "command_timeout": settings.PG_COMMAND_TIMEOUT,
+        # 查询都是短小的索引查找，JIT编译的开销大于收益
+        "server_settings": {"jit": "off"},
+    },
 )
 
+async def warm_up_pool(connections: int) -> None:
+    """
+    并发建立连接并放回连接池，避免启动后的首批请求等待建立连接和认证
+    
+    Args:
+        connections: 预先建立的连接数，超过连接池大小的部分会被忽略
+    """
+    async def _connect() -> None:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    
+    await asyncio.gather(*(_connect() for _ in range(min(connections, settings.PG_POOL_MAX))))
+
 # 创建异步会话工厂
-SessionLocal = sessionmaker(
-    engine, 
-    class_=AsyncSession, 
-    expire_on_commit=False
-)
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
-# 创建基类用于ORM模型
-Base = declarative_base()
+# ORM模型的基类
+class Base(DeclarativeBase):
+    pass
 
 # 提供异步数据库会话的依赖
-async def get_db() -> AsyncSession:
-    """获取数据库会话的异步上下文管理器"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        await db.close() 
\ No newline at end of file
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """获取数据库会话，请求结束时自动关闭"""
+    async with SessionLocal() as db:
+        yield db 
\ No newline at end of file
@@ -1,92 +1,104 @@
-from fastapi import Depends
+import logging
+from fastapi import Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from functools import lru_cache
-from typing import Annotated, TypeAlias
+from starlette.datastructures import State
+from typing import Annotated, Optional, TypeAlias
 
 from app.config import Settings, get_settings
 from app.database import get_db
-from app.storage import Storage, FilesystemStorage, MemoryStorage
+from app.storage import Storage, FilesystemStorage, MemoryStorage, PostgresStorage
 from app.repository import (
-    UserRepo, UserDatabaseRepo, MemoryUserRepo,
-    BookRepo, BookDatabaseRepo, MemoryBookRepo,
-    ProgressRepo, ProgressDatabaseRepo, MemoryProgressRepo
+    UserDatabaseRepo, MemoryUserRepo,
+    BookDatabaseRepo, MemoryBookRepo,
+    ProgressDatabaseRepo, MemoryProgressRepo
 )
 from app.service import AuthService, ProgressSync, ReadingStats
 from app.service.book_shelf import BookShelf
+from app.service.progress_batcher import progress_batcher
 
 # 类型别名以增强可读性
+# FastAPI在同一请求内缓存依赖结果，所有仓库共享同一个从连接池获取的会话
 DBSession: TypeAlias = Annotated[AsyncSession, Depends(get_db)]
 AppSettings: TypeAlias = Annotated[Settings, Depends(get_settings)]
 
-# 存储依赖
-@lru_cache()
-async def get_storage(
-    db: DBSession = Depends(),
-    settings: AppSettings = Depends()
-) -> Storage:
-    """根据配置获取适当的存储实现。"""
-    if settings.BSTORAGE_TYPE == "fs":
-        return FilesystemStorage(settings.BSTORAGE_PATH)
-    return MemoryStorage()
+_book_shelf_logger = logging.getLogger("app.service.book_shelf")
 
-@lru_cache()
-async def get_user_repo(
-    db: DBSession = Depends(),
-    settings: AppSettings = Depends()
-) -> UserRepo:
-    """根据配置获取用户仓库实例。"""
-    if settings.AUTH_STORAGE == "pg":
-        return UserDatabaseRepo(db)
-    return MemoryUserRepo()
 
-@lru_cache()
-async def get_auth_service(
-    user_repo: UserRepo = Depends(get_user_repo),
-    settings: AppSettings = Depends(get_settings)
-) -> AuthService:
-    """获取认证服务实例。"""
-    return AuthService(user_repo, settings)
+def init_services(state: State, settings: Settings) -> None:
+    """
+    在应用启动时创建与请求无关的单例，保存到app.state
 
-@lru_cache()
-async def get_book_repo(
-    db: DBSession = Depends(),
-    settings: AppSettings = Depends()
-) -> BookRepo:
-    """根据配置获取书籍仓库实例。"""
-    if settings.BSTORAGE_TYPE == "pg":
-        return BookDatabaseRepo(db)
-    return MemoryBookRepo()
+    使用内存或文件系统存储时，仓库和服务不依赖数据库会话，整个进程共享同一实例；
+    使用PostgreSQL时仓库绑定请求的会话，对应的属性为None，由依赖函数按请求创建。
 
-@lru_cache()
-async def get_book_shelf(
-    db: DBSession = Depends(), 
-    settings: AppSettings = Depends(),
-    storage: Storage = Depends(get_storage),
-    book_repo: BookRepo = Depends(get_book_repo)
-) -> BookShelf:
-    """获取书架服务实例。"""
-    return BookShelf(book_repo=book_repo, storage=storage)
+    Args:
+        state: 应用状态对象
+        settings: 应用配置
+    """
+    storage: Optional[Storage] = None
+    if settings.BSTORAGE_TYPE == "filesystem":
+        if not settings.BSTORAGE_PATH:
+            raise ValueError("Path must be specified for filesystem storage")
+        storage = FilesystemStorage(settings.BSTORAGE_PATH)
+    elif settings.BSTORAGE_TYPE == "memory":
+        storage = MemoryStorage()
+
+    state.storage = storage
+    state.reading_stats = ReadingStats(storage) if storage else None
+    state.auth_service = (
+        AuthService(MemoryUserRepo(), settings) if settings.AUTH_STORAGE == "memory" else None
+    )
+    if storage:
+        # 书籍和进度的元数据与文件存储保持一致，不使用数据库时放在内存中
+        state.book_shelf = BookShelf(storage=storage, repo=MemoryBookRepo(), logger=_book_shelf_logger)
+        state.progress_sync = ProgressSync(MemoryProgressRepo())
+    else:
+        state.book_shelf = None
+        state.progress_sync = None
+
+
+# 以下依赖函数内部没有await，声明为async def可直接在事件循环中执行，
+# 避免FastAPI把同步依赖放到线程池中运行。
+# 数据库会话在首次执行查询时才获取连接，单例命中时不会占用连接池。
+# 依赖函数都在模块级定义，函数对象唯一，FastAPI的请求内依赖缓存才能命中；
+# 不要在工厂函数或functools.partial中动态创建。
 
-@lru_cache()
-async def get_progress_repo(
-    db: DBSession = Depends(),
-    settings: AppSettings = Depends()
-) -> ProgressRepo:
-    """根据配置获取进度仓库实例。"""
-    if settings.BSTORAGE_TYPE == "pg":
-        return ProgressDatabaseRepo(db)
-    return MemoryProgressRepo()
+async def require_user(request: Request) -> dict:
+    """
+    页面登录检查依赖，未登录时重定向到登录页面
+    
+    Returns:
+        dict: 会话中的用户信息
+    """
+    user = request.session.get("user")
+    if not user or "username" not in user:
+        raise HTTPException(status_code=status.HTTP_302_FOUND, headers={"Location": "/login"})
+    return user
+
+async def get_auth_service(request: Request, db: DBSession, settings: AppSettings) -> AuthService:
+    """获取认证服务实例。"""
+    service = request.app.state.auth_service
+    if service is None:
+        service = AuthService(UserDatabaseRepo(db), settings)
+    return service
+
+async def get_book_shelf(request: Request, db: DBSession) -> BookShelf:
+    """获取书架服务实例。"""
+    shelf = request.app.state.book_shelf
+    if shelf is None:
+        shelf = BookShelf(storage=PostgresStorage(db), repo=BookDatabaseRepo(db), logger=_book_shelf_logger)
+    return shelf
 
-@lru_cache()
-async def get_progress_sync(
-    progress_repo: ProgressRepo = Depends(get_progress_repo)
-) -> ProgressSync:
-    """获取进度同步服务实例。"""
-    return ProgressSync(progress_repo)
+async def get_progress_sync(request: Request, db: DBSession) -> ProgressSync:
+    """获取进度同步服务实例，使用数据库存储时通过合并队列批量写入。"""
+    sync = request.app.state.progress_sync
+    if sync is None:
+        sync = ProgressSync(ProgressDatabaseRepo(db), progress_batcher)
+    return sync
 
-@lru_cache()
-async def get_reading_stats(
-    storage: Storage = Depends(get_storage)
-) -> ReadingStats:
+async def get_reading_stats(request: Request, db: DBSession) -> ReadingStats:
     """获取阅读统计服务实例。"""
-    return ReadingStats(storage) 
\ No newline at end of file
+    stats = request.app.state.reading_stats
+    if stats is None:
+        stats = ReadingStats(PostgresStorage(db))
+    return stats
@@ -1,7 +1,10 @@
 import datetime
-from typing import Optional
-from sqlalchemy import Column, String, Integer, DateTime, func
-from pydantic import BaseModel, Field
+import enum
+import types
+from typing import Any, List, Optional, Sequence
+from sqlalchemy import String, Integer, DateTime, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+from pydantic import BaseModel, ConfigDict, Field, computed_field
 
 from app.database import Base
 
@@ -12,11 +15,42 @@ class BookAlreadyExistsError(Exception):
     pass
 
 
+class BookNotFoundError(ValueError):
+    """当书籍不存在时抛出；继承ValueError以兼容已有的捕获逻辑"""
+    pass
+
+
+class BookFormat(str, enum.Enum):
+    """支持提取元数据和在线阅读的书籍格式，值与文件扩展名（小写）一致"""
+    EPUB = "epub"
+    PDF = "pdf"
+    MOBI = "mobi"
+    FB2 = "fb2"
+
+
+# 书籍格式到MIME类型的只读映射；BookFormat是str子类，可直接用扩展名字符串查找
+_MIME_TYPES = types.MappingProxyType({
+    BookFormat.EPUB: "application/epub+zip",
+    BookFormat.PDF: "application/pdf",
+    BookFormat.MOBI: "application/x-mobipocket-ebook",
+    BookFormat.FB2: "application/fb2",
+})
+
+
+# 书籍实体的数据字段，与构造函数参数和BOOK_ROW_COLUMNS的顺序一致
+_BOOK_FIELDS = (
+    "id", "title", "author", "publisher", "year", "created_at", "updated_at",
+    "isbn", "document_id", "file_path", "format", "cover_path",
+)
+
+
 class Book:
     """
     书籍实体，表示系统中的一本书。
     这是一个领域模型类，独立于ORM或数据库实现。
     """
+    __slots__ = _BOOK_FIELDS + ("_extension", "_mime_type", "_filename")
+    
     def __init__(
         self,
         id: str,
@@ -44,49 +78,101 @@ class Book:
         self.file_path = file_path
         self.format = format
         self.cover_path = cover_path
+        self._init_derived()
+    
+    @classmethod
+    def from_row(cls, row: Sequence[Any]) -> "Book":
+        """
+        由按BOOK_ROW_COLUMNS顺序查询得到的数据库行构建书籍
+        
+        跳过ORM对象和关键字参数处理，批量列出书籍时每行只需一次元组解包。
+        
+        Args:
+            row: 数据库行
+            
+        Returns:
+            Book: 书籍实体
+        """
+        book = cls.__new__(cls)
+        (
+            book.id, book.title, book.author, book.publisher, book.year,
+            book.created_at, book.updated_at, book.isbn, book.document_id,
+            book.file_path, book.format, book.cover_path,
+        ) = row
+        book._init_derived()
+        return book
+    
+    def replace(self, **changes: Any) -> "Book":
+        """
+        复制书籍并替换指定字段，未指定的字段沿用当前值
+        
+        Args:
+            changes: 要替换的字段及新值
+            
+        Returns:
+            Book: 新的书籍实体
+            
+        Raises:
+            TypeError: 包含未知字段时抛出
+        """
+        book = Book.__new__(Book)
+        for name in _BOOK_FIELDS:
+            setattr(book, name, changes.pop(name) if name in changes else getattr(self, name))
+        if changes:
+            raise TypeError(f"Unknown book fields: {', '.join(changes)}")
+        book._init_derived()
+        return book
+    
+    def _init_derived(self) -> None:
+        """计算派生值；书籍实体创建后不再修改（更新元数据时会创建新实例）"""
+        file_path = self.file_path
+        self._extension = file_path.rpartition(".")[2] if file_path else ""
+        self._mime_type = _MIME_TYPES.get(self._extension.lower(), "")
+        self._filename: Optional[str] = None
     
     def extension(self) -> str:
         """获取文件扩展名"""
-        if not self.file_path:
-            return ""
-        return self.file_path.split(".")[-1]
+        return self._extension
     
     def filename(self) -> str:
-        """生成下载文件名"""
-        basename = f"{self.id}.{self.extension()}"
-        if not self.author:
-            return f"{self.title} -- {basename}"
-        return f"{self.title} - {self.author} -- {basename}"
+        """生成下载文件名，首次调用时计算并缓存"""
+        if self._filename is None:
+            basename = f"{self.id}.{self._extension}"
+            if not self.author:
+                self._filename = f"{self.title} -- {basename}"
+            else:
+                self._filename = f"{self.title} - {self.author} -- {basename}"
+        return self._filename
     
     def mime_type(self) -> str:
         """根据文件扩展名确定MIME类型"""
-        ext = self.extension()
-        mime_types = {
-            "epub": "application/epub+zip",
-            "pdf": "application/pdf",
-            "mobi": "application/x-mobipocket-ebook",
-            "fb2": "application/fb2",
-        }
-        return mime_types.get(ext, "")
+        return self._mime_type
 
 
 # SQLAlchemy ORM模型
 class BookModel(Base):
     """书籍的SQLAlchemy ORM模型"""
     __tablename__ = "books"
+    __table_args__ = (
+        # 支持按(created_at, id)键集分页
+        Index("ix_books_created_at_id", "created_at", "id"),
+        # 支持按(title, id)排序和键集分页
+        Index("ix_books_title_id", "title", "id"),
+    )
     
-    id = Column(String, primary_key=True)
-    title = Column(String, nullable=False)
-    author = Column(String)
-    publisher = Column(String)
-    year = Column(Integer)
-    created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
-    isbn = Column(String)
-    document_id = Column(String, index=True)
-    file_path = Column(String)
-    format = Column(String)
-    cover_path = Column(String)
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    title: Mapped[str] = mapped_column(String, nullable=False)
+    author: Mapped[Optional[str]] = mapped_column(String)
+    publisher: Mapped[Optional[str]] = mapped_column(String)
+    year: Mapped[Optional[int]] = mapped_column(Integer)
+    created_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, server_default=func.now())
+    updated_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+    isbn: Mapped[Optional[str]] = mapped_column(String)
+    # 同一文件只能入库一次，唯一索引同时支撑按文件哈希查询
+    document_id: Mapped[Optional[str]] = mapped_column(String, index=True, unique=True)
+    file_path: Mapped[Optional[str]] = mapped_column(String)
+    format: Mapped[Optional[str]] = mapped_column(String)
+    cover_path: Mapped[Optional[str]] = mapped_column(String)
     
     def to_entity(self) -> Book:
         """将ORM模型转换为领域实体"""
@@ -106,6 +192,14 @@ class BookModel(Base):
         )
 
 
+# 与Book.from_row字段顺序一致的列，批量查询时直接取行而不加载ORM对象
+BOOK_ROW_COLUMNS = (
+    BookModel.id, BookModel.title, BookModel.author, BookModel.publisher, BookModel.year,
+    BookModel.created_at, BookModel.updated_at, BookModel.isbn, BookModel.document_id,
+    BookModel.file_path, BookModel.format, BookModel.cover_path,
+)
+
+
 # Pydantic模型，用于API请求和响应
 class BookCreate(BaseModel):
     """用于创建新书籍的Pydantic模型"""
@@ -117,7 +211,9 @@ class BookCreate(BaseModel):
 
 
 class BookUpdate(BaseModel):
-    """用于更新书籍的Pydantic模型"""
+    """用于更新书籍的Pydantic模型，未提供的字段保持不变"""
+    model_config = ConfigDict(extra="forbid")
+    
     title: Optional[str] = None
     author: Optional[str] = None
     publisher: Optional[str] = None
@@ -127,16 +223,32 @@ class BookUpdate(BaseModel):
 
 class BookResponse(BaseModel):
     """用于API响应的书籍Pydantic模型"""
+    model_config = ConfigDict(from_attributes=True)
+    
     id: str
     title: str
-    author: str
-    publisher: str
-    year: int
+    author: Optional[str] = ""
+    publisher: Optional[str] = ""
+    year: Optional[int] = 0
     created_at: datetime.datetime
     updated_at: datetime.datetime
-    isbn: str
-    document_id: str
-    format: str
+    isbn: Optional[str] = ""
+    document_id: Optional[str] = ""
+    format: Optional[str] = ""
+
+
+class BookListResponse(BaseModel):
+    """书籍分页列表的API响应模型；按游标分页时不返回总数和页码"""
+    items: List[BookResponse]
+    total: Optional[int] = None
+    page: Optional[int] = None
+    page_size: int
+    next_cursor: Optional[str] = None
     
-    class Config:
-        orm_mode = True 
\ No newline at end of file
+    @computed_field
+    @property
+    def pages(self) -> Optional[int]:
+        """总页数，由总数和每页数量得出；按游标分页时为None"""
+        if self.total is None:
+            return None
+        return (self.total + self.page_size - 1) // self.page_size
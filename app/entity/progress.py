@@ -1,6 +1,8 @@
+import datetime
 from typing import Optional
-from sqlalchemy import Column, String, Float, BigInteger, DateTime, func
-from pydantic import BaseModel
+from sqlalchemy import String, Float, BigInteger, DateTime, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+from pydantic import BaseModel, ConfigDict
 
 from app.database import Base
 
@@ -10,6 +12,10 @@ class Progress:
     阅读进度实体，表示KOReader同步的阅读进度数据。
     这是一个领域模型类，独立于ORM或数据库实现。
     """
+    __slots__ = (
+        "document", "percentage", "progress", "device", "device_id", "timestamp", "auth_device_name",
+    )
+    
     def __init__(
         self, 
         document: str,
@@ -33,16 +39,20 @@ class Progress:
 class ProgressModel(Base):
     """阅读进度的SQLAlchemy ORM模型"""
     __tablename__ = "progress"
+    __table_args__ = (
+        # 按文档查询最新进度（ORDER BY timestamp DESC），索引直接给出有序结果，无需排序
+        Index("ix_progress_document_timestamp", "document", "timestamp"),
+    )
     
-    id = Column(String, primary_key=True)
-    document = Column(String, index=True)
-    percentage = Column(Float)
-    progress = Column(String)
-    device = Column(String)
-    device_id = Column(String)
-    timestamp = Column(BigInteger)
-    auth_device_name = Column(String)
-    created_at = Column(DateTime, server_default=func.now())
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    document: Mapped[Optional[str]] = mapped_column(String)
+    percentage: Mapped[Optional[float]] = mapped_column(Float)
+    progress: Mapped[Optional[str]] = mapped_column(String)
+    device: Mapped[Optional[str]] = mapped_column(String)
+    device_id: Mapped[Optional[str]] = mapped_column(String)
+    timestamp: Mapped[Optional[int]] = mapped_column(BigInteger)
+    auth_device_name: Mapped[Optional[str]] = mapped_column(String)
+    created_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, server_default=func.now())
     
     def to_entity(self) -> Progress:
         """将ORM模型转换为领域实体"""
@@ -70,12 +80,11 @@ class ProgressRequest(BaseModel):
 
 class ProgressResponse(BaseModel):
     """用于同步进度API响应的Pydantic模型"""
+    model_config = ConfigDict(from_attributes=True)
+    
     document: str
     percentage: float
     progress: str
     device: str
     device_id: str
-    timestamp: int
-    
-    class Config:
-        orm_mode = True 
\ No newline at end of file
+    timestamp: int
\ No newline at end of file
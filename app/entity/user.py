@@ -1,9 +1,10 @@
 import datetime
 import ipaddress
 from typing import Optional, List
-from sqlalchemy import Column, String, DateTime, func, ForeignKey
-from sqlalchemy.orm import relationship
-from pydantic import BaseModel, Field
+from sqlalchemy import String, DateTime, func, ForeignKey
+from sqlalchemy.dialects.postgresql import INET
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from pydantic import BaseModel, ConfigDict, Field
 
 from app.database import Base
 
@@ -44,6 +45,8 @@ class User:
     用户实体，表示系统的用户账户。
     这是一个领域模型类，独立于ORM或数据库实现。
     """
+    __slots__ = ("username", "hashed_password")
+    
     def __init__(self, username: str, hashed_password: str):
         self.username = username
         self.hashed_password = hashed_password
@@ -54,6 +57,8 @@ class Device:
     设备实体，表示KOReader设备。
     这是一个领域模型类，独立于ORM或数据库实现。
     """
+    __slots__ = ("name", "hashed_password")
+    
     def __init__(self, name: str, hashed_password: str):
         self.name = name
         self.hashed_password = hashed_password
@@ -64,6 +69,8 @@ class Session:
     会话实体，表示用户认证会话。
     这是一个领域模型类，独立于ORM或数据库实现。
     """
+    __slots__ = ("session_key", "username", "user_agent", "client_ip", "created_at")
+    
     def __init__(
         self,
         session_key: str,
@@ -84,12 +91,12 @@ class UserModel(Base):
     """用户的SQLAlchemy ORM模型"""
     __tablename__ = "users"
     
-    username = Column(String, primary_key=True)
-    hashed_password = Column(String, nullable=False)
-    created_at = Column(DateTime, server_default=func.now())
+    username: Mapped[str] = mapped_column(String, primary_key=True)
+    hashed_password: Mapped[str] = mapped_column(String, nullable=False)
+    created_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, server_default=func.now())
     
-    sessions = relationship("SessionModel", back_populates="user", cascade="all, delete-orphan")
-    devices = relationship("DeviceModel", back_populates="user", cascade="all, delete-orphan")
+    sessions: Mapped[List["SessionModel"]] = relationship(back_populates="user", cascade="all, delete-orphan")
+    devices: Mapped[List["DeviceModel"]] = relationship(back_populates="user", cascade="all, delete-orphan")
     
     def to_entity(self) -> User:
         """将ORM模型转换为领域实体"""
@@ -103,13 +110,13 @@ class SessionModel(Base):
     """会话的SQLAlchemy ORM模型"""
     __tablename__ = "sessions"
     
-    session_key = Column(String, primary_key=True)
-    username = Column(String, ForeignKey("users.username"), nullable=False)
-    user_agent = Column(String)
-    client_ip = Column(String)
-    created_at = Column(DateTime, server_default=func.now())
+    session_key: Mapped[str] = mapped_column(String, primary_key=True)
+    username: Mapped[str] = mapped_column(String, ForeignKey("users.username"), nullable=False)
+    user_agent: Mapped[Optional[str]] = mapped_column(String)
+    client_ip: Mapped[Optional[ipaddress.IPv4Address]] = mapped_column(INET)  # asyncpg直接解码为ipaddress对象
+    created_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, server_default=func.now())
     
-    user = relationship("UserModel", back_populates="sessions")
+    user: Mapped["UserModel"] = relationship(back_populates="sessions")
     
     def to_entity(self) -> Session:
         """将ORM模型转换为领域实体"""
@@ -117,7 +124,7 @@ class SessionModel(Base):
             session_key=self.session_key,
             username=self.username,
             user_agent=self.user_agent,
-            client_ip=ipaddress.ip_address(self.client_ip),
+            client_ip=self.client_ip,
             created_at=self.created_at,
         )
 
@@ -126,12 +133,12 @@ class DeviceModel(Base):
     """设备的SQLAlchemy ORM模型"""
     __tablename__ = "devices"
     
-    name = Column(String, primary_key=True)
-    hashed_password = Column(String, nullable=False)
-    username = Column(String, ForeignKey("users.username"), nullable=False)
-    created_at = Column(DateTime, server_default=func.now())
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    hashed_password: Mapped[str] = mapped_column(String, nullable=False)
+    username: Mapped[str] = mapped_column(String, ForeignKey("users.username"), nullable=False)
+    created_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, server_default=func.now())
     
-    user = relationship("UserModel", back_populates="devices")
+    user: Mapped["UserModel"] = relationship(back_populates="devices")
     
     def to_entity(self) -> Device:
         """将ORM模型转换为领域实体"""
@@ -148,6 +155,15 @@ class UserCreate(BaseModel):
     password: str
 
 
+class UserResponse(BaseModel):
+    """用于API响应的用户Pydantic模型，可由用户实体或网页会话中的用户信息构建"""
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: Optional[str] = None
+    username: str
+    is_superuser: bool = False
+
+
 class UserLogin(BaseModel):
     """用于用户登录的Pydantic模型"""
     username: str
@@ -162,36 +178,32 @@ class DeviceCreate(BaseModel):
 
 class DeviceResponse(BaseModel):
     """用于API响应的设备Pydantic模型"""
-    name: str
+    model_config = ConfigDict(from_attributes=True)
     
-    class Config:
-        orm_mode = True
+    name: str
 
 
 class SessionResponse(BaseModel):
     """用于API响应的会话Pydantic模型"""
-    session_key: str
+    model_config = ConfigDict(from_attributes=True)
     
-    class Config:
-        orm_mode = True
+    session_key: str
 
 
 # 添加新的Pydantic模型用于Web会话和Token认证
 class UserSessionInfo(BaseModel):
     """用于Web会话中存储的用户信息"""
+    model_config = ConfigDict(from_attributes=True)
+    
     id: str
     username: str
     is_superuser: bool = False
-    
-    class Config:
-        orm_mode = True
 
 
 class Token(BaseModel):
     """用于OAuth2 Token响应"""
+    model_config = ConfigDict(from_attributes=True)
+    
     access_token: str
     token_type: str
-    expires_in: int
-    
-    class Config:
-        orm_mode = True 
\ No newline at end of file
+    expires_in: int
\ No newline at end of file
@@ -1,28 +1,59 @@
-import asyncio
 import os
+import tempfile
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, HTTPException, Request, Response, status
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, ORJSONResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
-from starlette.middleware.sessions import SessionMiddleware
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
 
 from app.config import Settings, get_settings
-from app.database import Base, engine
-from app.dependencies import (
-    get_auth_service, 
-    get_book_shelf, 
-    get_progress_sync,
-    get_reading_stats
-)
+from app.database import Base, engine, warm_up_pool
+from app.dependencies import init_services, require_user
 from app.api.v1 import api_router
 from app.api.webdav import router as webdav_router
 from app.api.opds import router as opds_router
+from app.utils.session import SessionMiddleware
+from app.utils.static import CachedStaticFiles
+from app.service.progress_batcher import progress_batcher
+from app.entity.book import BookAlreadyExistsError, BookNotFoundError
 
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时建表并创建单例服务，关闭时释放资源"""
+    # Create database tables if they don't exist
+    async with engine.begin() as conn:
+        # This would be handled by Alembic in production
+        await conn.run_sync(Base.metadata.create_all)
+    
+    # 预先建立连接，首批请求无需等待连接握手
+    await warm_up_pool(settings.PG_POOL_WARMUP)
+    
+    # Admin user authentication is handled via configuration (.env) when AUTH_STORAGE is 'memory'.
+    init_services(app.state, settings)
+    
+    # 预编译所有模板，首次访问页面时无需解析
+    for template_name in jinja_env.list_templates(extensions=["html"]):
+        jinja_env.get_template(template_name)
+    
+    # 启动进度合并队列的后台刷新任务
+    progress_batcher.start()
+    try:
+        yield
+    finally:
+        # 写入尚未刷新的进度，再关闭连接池
+        await progress_batcher.stop()
+        await engine.dispose()
+
+
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.VERSION,
+    lifespan=lifespan,
+    # 使用orjson序列化JSON响应，datetime等类型在C扩展中直接编码
+    default_response_class=ORJSONResponse,
 )
 
 # Add session middleware for authentication
@@ -33,30 +64,37 @@ app.add_middleware(
 )
 
 # Mount static files
-app.mount("/static", StaticFiles(directory=os.path.join("app", "web", "static")), name="static")
+app.mount(
+    "/static",
+    CachedStaticFiles(directory=os.path.join("app", "web", "static"), cache_lookups=settings.LOG_LEVEL != "debug"),
+    name="static"
+)
 
 # Initialize template engine
-templates = Jinja2Templates(directory=os.path.join("app", "web", "templates"))
+# 编译后的模板字节码缓存到临时目录，进程重启后无需重新编译；仅调试时检查模板文件变化
+_jinja_cache_dir = os.path.join(tempfile.gettempdir(), "kompanion-jinja")
+os.makedirs(_jinja_cache_dir, exist_ok=True)
+jinja_env = Environment(
+    loader=FileSystemLoader(os.path.join("app", "web", "templates")),
+    autoescape=select_autoescape(),
+    bytecode_cache=FileSystemBytecodeCache(_jinja_cache_dir),
+    auto_reload=settings.LOG_LEVEL == "debug",
+)
+templates = Jinja2Templates(env=jinja_env)
+
+# 全局异常处理：服务层抛出的领域异常统一转换为HTTP响应，路由中无需逐个捕获
+@app.exception_handler(BookNotFoundError)
+async def book_not_found_handler(request: Request, exc: BookNotFoundError):
+    return ORJSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"detail": str(exc)})
+
+@app.exception_handler(BookAlreadyExistsError)
+async def book_already_exists_handler(request: Request, exc: BookAlreadyExistsError):
+    return ORJSONResponse(status_code=status.HTTP_409_CONFLICT, content={"detail": str(exc)})
 
 # Include API routes
 app.include_router(api_router)
 app.include_router(webdav_router)
-app.include_router(opds_router)
-
-@app.on_event("startup")
-async def startup():
-    # Create database tables if they don't exist
-    async with engine.begin() as conn:
-        # This would be handled by Alembic in production
-        # await conn.run_sync(Base.metadata.drop_all)
-        await conn.run_sync(Base.metadata.create_all)
-    
-    # Admin user authentication is handled via configuration (.env) when AUTH_STORAGE is 'memory'.
-
-@app.on_event("shutdown")
-async def shutdown():
-    # Close any resources
-    pass
+app.include_router(opds_router, include_in_schema=False)
 
 # 检查用户是否已登录
 def is_user_logged_in(request: Request) -> bool:
@@ -78,28 +116,22 @@ async def login_page(request: Request):
         return RedirectResponse(url="/dashboard", status_code=status.HTTP_302_FOUND)
     return templates.TemplateResponse("login.html", {"request": request})
 
+# 控制台页面 - 需要用户登录
 @app.get("/dashboard", response_class=HTMLResponse)
-async def dashboard(request: Request):
-    """控制台页面 - 需要用户登录"""
-    if not is_user_logged_in(request):
-        return RedirectResponse(url="/login", status_code=status.HTTP_302_FOUND)
-    user = request.session.get("user", {})
+async def dashboard(request: Request, user: dict = Depends(require_user)):
+    """控制台页面"""
     return templates.TemplateResponse("dashboard.html", {"request": request, "user": user})
 
+# 书籍管理页面 - 需要用户登录
 @app.get("/books", response_class=HTMLResponse)
-async def books_page(request: Request):
-    """书籍管理页面 - 需要用户登录"""
-    if not is_user_logged_in(request):
-        return RedirectResponse(url="/login", status_code=status.HTTP_302_FOUND)
-    user = request.session.get("user", {})
+async def books_page(request: Request, user: dict = Depends(require_user)):
+    """书籍管理页面"""
     return templates.TemplateResponse("books.html", {"request": request, "user": user})
 
+# 设备管理页面 - 需要用户登录
 @app.get("/devices", response_class=HTMLResponse)
-async def devices_page(request: Request):
-    """设备管理页面 - 需要用户登录"""
-    if not is_user_logged_in(request):
-        return RedirectResponse(url="/login", status_code=status.HTTP_302_FOUND)
-    user = request.session.get("user", {})
+async def devices_page(request: Request, user: dict = Depends(require_user)):
+    """设备管理页面"""
     return templates.TemplateResponse("devices.html", {"request": request, "user": user})
 
 @app.get("/healthcheck")
@@ -0,0 +1,34 @@
+from app.entity.book import Book
+from app.entity.user import User
+from app.utils.cache import TTLCache, single_process
+
+# 数据库存储库的进程内查询缓存
+# 这些查询以不变的标识为键、读多写少，并且位于认证和同步等高频请求路径上；
+# 写入方法负责删除对应的键，但只能删除本进程的缓存，
+# 因此只在明确声明单进程运行时（WEB_CONCURRENCY=1，run.py会设置）启用，
+# 其他情况下容量为0，每次都查询数据库。
+# 只缓存查询到的结果，不缓存不存在的记录，新写入的记录无需失效即可查到。
+_MAXSIZE = 10000 if single_process() else 0
+
+# 书籍ID -> 书籍
+book_by_id: TTLCache[Book] = TTLCache(maxsize=_MAXSIZE, ttl=60)
+
+# 文件哈希（document_id） -> 书籍
+book_by_hash: TTLCache[Book] = TTLCache(maxsize=_MAXSIZE, ttl=60)
+
+# 用户名 -> 用户
+user_by_name: TTLCache[User] = TTLCache(maxsize=_MAXSIZE, ttl=60)
+
+
+def invalidate_book(book: Book) -> None:
+    """
+    删除书籍在ID和文件哈希两个缓存中的条目
+
+    Args:
+        book: 被修改的书籍
+    """
+    cached = book_by_id.pop(book.id)
+    book_by_hash.pop(book.document_id)
+    if cached is not None:
+        # 调用方传入的实体可能不是缓存中的同一对象，按缓存中的文件哈希再删除一次
+        book_by_hash.pop(cached.document_id)
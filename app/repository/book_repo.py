@@ -1,12 +1,69 @@
 from abc import ABC, abstractmethod
-import datetime
-from typing import List, Optional, Tuple
+import bisect
+from typing import Any, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import desc, asc, func
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import bindparam, desc, asc, func, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-from app.entity.book import Book, BookModel, BookAlreadyExistsError
+from app.entity.book import Book, BookModel, BOOK_ROW_COLUMNS, BookAlreadyExistsError, BookNotFoundError
+from app.repository import _cache
+
+
+# 支持键集分页的排序字段（均不为空，可与ID组成稳定的排序键）
+KEYSET_SORT_FIELDS = {"created_at", "updated_at", "title"}
+
+
+# 直接使用SQL统计，避免ORM把查询包装为子查询
+_EXACT_COUNT_SQL = text("SELECT count(*) FROM books")
+_ESTIMATED_COUNT_SQL = text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'books'")
+
+# 按ID或文件哈希查询书籍的语句在模块加载时构建一次，调用时只传入绑定参数
+_GET_BOOK_BY_ID = select(*BOOK_ROW_COLUMNS).where(BookModel.id == bindparam("book_id"))
+_GET_BOOK_BY_HASH = select(*BOOK_ROW_COLUMNS).where(BookModel.document_id == bindparam("file_hash"))
+
+# 支持偏移分页的排序字段
+SORT_FIELDS = frozenset({"title", "author", "publisher", "year", "created_at", "updated_at", "isbn"})
+
+# (排序字段, 排序顺序) -> ORDER BY子句，以ID作为次要排序键保证分页顺序稳定
+# 在模块加载时构建，查询时只需一次字典查找
+_ORDER_BY = {
+    (name, order): (direction(getattr(BookModel, name)), direction(BookModel.id))
+    for name in SORT_FIELDS
+    for order, direction in (("asc", asc), ("desc", desc))
+}
+
+
+def normalize_per_page(per_page: int) -> int:
+    """
+    校正每页数量
+    
+    Args:
+        per_page: 每页数量，超出1~100时使用默认值25
+        
+    Returns:
+        int: 实际使用的每页数量
+    """
+    if per_page <= 0 or per_page > 100:
+        return 25
+    return per_page
+
+
+def _normalize_pagination(page: int, per_page: int) -> Tuple[int, int]:
+    """
+    校正分页参数并换算为偏移量
+    
+    Args:
+        page: 页码，小于1时视为1
+        per_page: 每页数量，超出1~100时使用默认值25
+        
+    Returns:
+        Tuple[int, int]: 偏移量和每页数量
+    """
+    if page <= 0:
+        page = 1
+    per_page = normalize_per_page(per_page)
+    return (page - 1) * per_page, per_page
 
 
 class BookRepo(ABC):
@@ -38,7 +95,7 @@ class BookRepo(ABC):
             book: 书籍实体
             
         Raises:
-            ValueError: 书籍不存在时抛出
+            BookNotFoundError: 书籍不存在时抛出
         """
         pass
     
@@ -66,6 +123,30 @@ class BookRepo(ABC):
         """
         pass
     
+    @abstractmethod
+    async def list_after(
+        self, 
+        ctx, 
+        sort_by: str = "created_at", 
+        sort_order: str = "desc", 
+        after: Optional[Tuple[Any, str]] = None, 
+        per_page: int = 25
+    ) -> List[Book]:
+        """
+        按键集分页列出书籍，不统计总数
+        
+        Args:
+            ctx: 上下文
+            sort_by: 排序字段，必须属于KEYSET_SORT_FIELDS
+            sort_order: 排序顺序 ("asc" 或 "desc")
+            after: 上一页最后一项的(排序字段值, ID)，为空时从头开始
+            per_page: 每页数量
+            
+        Returns:
+            List[Book]: 书籍列表
+        """
+        pass
+    
     @abstractmethod
     async def get_by_id(self, ctx, book_id: str) -> Book:
         """
@@ -79,7 +160,7 @@ class BookRepo(ABC):
             Book: 书籍实体
             
         Raises:
-            ValueError: 书籍不存在时抛出
+            BookNotFoundError: 书籍不存在时抛出
         """
         pass
     
@@ -96,17 +177,18 @@ class BookRepo(ABC):
             Book: 书籍实体
             
         Raises:
-            ValueError: 书籍不存在时抛出
+            BookNotFoundError: 书籍不存在时抛出
         """
         pass
     
     @abstractmethod
-    async def count(self, ctx) -> int:
+    async def count(self, ctx, approximate: bool = False) -> int:
         """
         获取书籍总数
         
         Args:
             ctx: 上下文
+            approximate: 是否允许返回估算值；估算值不需要扫描整张表，但可能与实际数量有偏差
             
         Returns:
             int: 书籍总数
@@ -122,8 +204,10 @@ class BookDatabaseRepo(BookRepo):
     
     async def store(self, ctx, book: Book) -> None:
         """存储书籍到PostgreSQL数据库"""
-        try:
-            db_book = BookModel(
+        # INSERT ... ON CONFLICT DO NOTHING一次完成插入和重复检查，没有返回行说明ID或文件哈希已存在
+        stmt = (
+            pg_insert(BookModel)
+            .values(
                 id=book.id,
                 title=book.title,
                 author=book.author,
@@ -137,31 +221,42 @@ class BookDatabaseRepo(BookRepo):
                 format=book.format,
                 cover_path=book.cover_path,
             )
-            
-            self.db.add(db_book)
-            await self.db.commit()
-        except IntegrityError:
-            await self.db.rollback()
-            raise BookAlreadyExistsError(f"Book with ID {book.id} already exists")
+            .on_conflict_do_nothing()
+            .returning(BookModel.id)
+        )
+        result = await self.db.execute(stmt)
+        inserted = result.scalar_one_or_none()
+        await self.db.commit()
+        
+        if inserted is None:
+            raise BookAlreadyExistsError(f"Book with ID {book.id} or file hash {book.document_id} already exists")
     
     async def update(self, ctx, book: Book) -> None:
         """更新PostgreSQL数据库中的书籍"""
-        stmt = select(BookModel).where(BookModel.id == book.id)
+        # 单条UPDATE ... RETURNING同时完成更新和存在性检查；
+        # 更新时间由数据库的NOW()生成并随结果返回，与库中的值保持一致
+        stmt = (
+            update(BookModel)
+            .where(BookModel.id == book.id)
+            .values(
+                title=book.title,
+                author=book.author,
+                publisher=book.publisher,
+                year=book.year,
+                updated_at=func.now(),
+                isbn=book.isbn,
+            )
+            .returning(BookModel.updated_at)
+        )
         result = await self.db.execute(stmt)
-        db_book = result.scalar_one_or_none()
-        
-        if not db_book:
-            raise ValueError(f"Book with ID {book.id} not found")
-        
-        # 更新字段
-        db_book.title = book.title
-        db_book.author = book.author
-        db_book.publisher = book.publisher
-        db_book.year = book.year
-        db_book.updated_at = datetime.datetime.now()
-        db_book.isbn = book.isbn
+        row = result.first()
+        if row is None:
+            await self.db.rollback()
+            raise BookNotFoundError(f"Book with ID {book.id} not found")
         
         await self.db.commit()
+        book.updated_at = row.updated_at
+        _cache.invalidate_book(book)
     
     async def list(
         self, 
@@ -172,79 +267,120 @@ class BookDatabaseRepo(BookRepo):
         per_page: int = 25
     ) -> Tuple[List[Book], int]:
         """列出PostgreSQL数据库中的书籍"""
-        # 验证排序参数
-        valid_sort_fields = {
-            "title", "author", "publisher", "year", 
-            "created_at", "updated_at", "isbn"
-        }
-        
-        if sort_by not in valid_sort_fields:
-            sort_by = "created_at"
-            
-        if sort_order not in {"asc", "desc"}:
-            sort_order = "desc"
-            
-        if page <= 0:
-            page = 1
-            
-        if per_page <= 0 or per_page > 100:
-            per_page = 25
-        
-        # 计算分页
-        offset = (page - 1) * per_page
-        
-        # 构建查询
-        stmt = select(BookModel)
-        
-        # 添加排序
-        if sort_order == "desc":
-            stmt = stmt.order_by(desc(getattr(BookModel, sort_by)))
-        else:
-            stmt = stmt.order_by(asc(getattr(BookModel, sort_by)))
-        
-        # 添加分页
-        stmt = stmt.offset(offset).limit(per_page)
+        # 验证排序参数，无效的字段按创建时间、无效的顺序按降序处理
+        order_by = _ORDER_BY.get((sort_by, sort_order))
+        if order_by is None:
+            order_by = _ORDER_BY[(
+                sort_by if sort_by in SORT_FIELDS else "created_at",
+                sort_order if sort_order == "asc" else "desc"
+            )]
+        offset, per_page = _normalize_pagination(page, per_page)
+        
+        # 构建查询，用窗口函数在同一次查询中取得总数
+        stmt = (
+            select(*BOOK_ROW_COLUMNS, func.count().over().label("total"))
+            .order_by(*order_by)
+            .offset(offset)
+            .limit(per_page)
+        )
         
         # 执行查询
         result = await self.db.execute(stmt)
-        db_books = result.scalars().all()
-        
-        # 统计总数
-        count_stmt = select(func.count()).select_from(BookModel)
-        count_result = await self.db.execute(count_stmt)
-        total_count = count_result.scalar_one()
+        rows = result.all()
+        
+        # 总数取自第一行；页码超出范围时没有行，需要单独统计
+        if rows:
+            total_count = rows[0].total
+        elif offset > 0:
+            # 请求的页码超出范围，总数仅供参考，使用估算值
+            total_count = await self.count(ctx, approximate=True)
+        else:
+            total_count = 0
         
-        # 转换为实体
-        books = [db_book.to_entity() for db_book in db_books]
+        # 转换为实体，最后一列为总数
+        books = [Book.from_row(row[:-1]) for row in rows]
         
         return books, total_count
     
-    async def get_by_id(self, ctx, book_id: str) -> Book:
-        """通过ID获取PostgreSQL数据库中的书籍"""
-        stmt = select(BookModel).where(BookModel.id == book_id)
+    async def list_after(
+        self, 
+        ctx, 
+        sort_by: str = "created_at", 
+        sort_order: str = "desc", 
+        after: Optional[Tuple[Any, str]] = None, 
+        per_page: int = 25
+    ) -> List[Book]:
+        """按键集分页列出PostgreSQL数据库中的书籍"""
+        if sort_by not in KEYSET_SORT_FIELDS:
+            sort_by = "created_at"
+            
+        per_page = normalize_per_page(per_page)
+        
+        # (排序字段, ID)组成唯一的排序键，从上一页最后一项之后继续读取，无需OFFSET跳过前面的行
+        sort_key = tuple_(getattr(BookModel, sort_by), BookModel.id)
+        stmt = select(*BOOK_ROW_COLUMNS)
+        if sort_order == "asc":
+            if after:
+                stmt = stmt.where(sort_key > tuple_(*after))
+            stmt = stmt.order_by(*_ORDER_BY[(sort_by, "asc")])
+        else:
+            if after:
+                stmt = stmt.where(sort_key < tuple_(*after))
+            stmt = stmt.order_by(*_ORDER_BY[(sort_by, "desc")])
+        stmt = stmt.limit(per_page)
+        
         result = await self.db.execute(stmt)
-        db_book = result.scalar_one_or_none()
+        return [Book.from_row(row) for row in result]
+    
+    async def get_by_id(self, ctx, book_id: str) -> Book:
+        """通过ID获取PostgreSQL数据库中的书籍，命中进程内缓存时不查询数据库"""
+        book = _cache.book_by_id.get(book_id)
+        if book is not None:
+            return book
+        
+        result = await self.db.execute(_GET_BOOK_BY_ID, {"book_id": book_id})
+        row = result.first()
         
-        if not db_book:
-            raise ValueError(f"Book with ID {book_id} not found")
+        if row is None:
+            raise BookNotFoundError(f"Book with ID {book_id} not found")
         
-        return db_book.to_entity()
+        book = Book.from_row(row)
+        _cache.book_by_id.set(book_id, book)
+        return book
     
     async def get_by_file_hash(self, ctx, file_hash: str) -> Book:
-        """通过文件哈希获取PostgreSQL数据库中的书籍"""
-        stmt = select(BookModel).where(BookModel.document_id == file_hash)
-        result = await self.db.execute(stmt)
-        db_book = result.scalar_one_or_none()
+        """通过文件哈希获取PostgreSQL数据库中的书籍，命中进程内缓存时不查询数据库"""
+        book = _cache.book_by_hash.get(file_hash)
+        if book is not None:
+            return book
+        
+        result = await self.db.execute(_GET_BOOK_BY_HASH, {"file_hash": file_hash})
+        row = result.first()
         
-        if not db_book:
-            raise ValueError(f"Book with file hash {file_hash} not found")
+        if row is None:
+            raise BookNotFoundError(f"Book with file hash {file_hash} not found")
         
-        return db_book.to_entity()
+        book = Book.from_row(row)
+        _cache.book_by_hash.set(file_hash, book)
+        return book
     
-    async def count(self, ctx) -> int:
+    async def count(self, ctx, approximate: bool = False) -> int:
         """获取PostgreSQL数据库中的书籍总数"""
-        stmt = select(func.count()).select_from(BookModel)
-        result = await self.db.execute(stmt)
+        return await self._fast_count(approximate)
+    
+    async def _fast_count(self, approximate: bool) -> int:
+        """
+        统计书籍总数
+        
+        估算值取自pg_class.reltuples（由VACUUM/ANALYZE更新），无需扫描表；
+        表从未分析过时reltuples为-1（旧版本为0），此时退回精确统计。
+        """
+        if approximate:
+            result = await self.db.execute(_ESTIMATED_COUNT_SQL)
+            estimate = result.scalar_one_or_none()
+            if estimate is not None and estimate > 0:
+                return estimate
+        result = await self.db.execute(_EXACT_COUNT_SQL)
         return result.scalar_one()
 
 
@@ -254,6 +390,26 @@ class MemoryBookRepo(BookRepo):
     def __init__(self):
         self._books = {}  # id -> Book
         self._hash_index = {}  # file_hash -> id
+        # 排序字段 -> (升序排列的(字段值, ID)键列表, 对应的书籍列表)
+        # 首次按某字段排序时建立，写入时清空，未修改时翻页只需切片
+        self._sorted = {}
+    
+    def _sorted_view(self, sort_by: str) -> Tuple[List[Tuple[Any, str]], List[Book]]:
+        """
+        获取按字段升序排列的书籍及对应的排序键
+        
+        Args:
+            sort_by: 排序字段
+            
+        Returns:
+            Tuple[List[Tuple[Any, str]], List[Book]]: 排序键列表和书籍列表，两者一一对应
+        """
+        view = self._sorted.get(sort_by)
+        if view is None:
+            books = sorted(self._books.values(), key=lambda book: (getattr(book, sort_by), book.id))
+            view = ([(getattr(book, sort_by), book.id) for book in books], books)
+            self._sorted[sort_by] = view
+        return view
     
     async def store(self, ctx, book: Book) -> None:
         """存储书籍到内存"""
@@ -263,31 +419,29 @@ class MemoryBookRepo(BookRepo):
         self._books[book.id] = book
         if book.document_id:
             self._hash_index[book.document_id] = book.id
+        self._sorted.clear()
     
     async def update(self, ctx, book: Book) -> None:
         """更新内存中的书籍"""
         if book.id not in self._books:
-            raise ValueError(f"Book with ID {book.id} not found")
-        
-        old_book = self._books[book.id]
-        
-        # 创建更新后的书籍对象
-        updated_book = Book(
-            id=old_book.id,
-            title=book.title if book.title else old_book.title,
-            author=book.author if book.author else old_book.author,
-            publisher=book.publisher if book.publisher else old_book.publisher,
-            year=book.year if book.year else old_book.year,
-            created_at=old_book.created_at,
-            updated_at=datetime.datetime.now(),
-            isbn=book.isbn if book.isbn else old_book.isbn,
-            document_id=old_book.document_id,
-            file_path=old_book.file_path,
-            format=old_book.format,
-            cover_path=old_book.cover_path,
+            raise BookNotFoundError(f"Book with ID {book.id} not found")
+        
+        # 只替换有值的元数据字段，其余字段沿用原书籍；
+        # 使用调用方创建实体时的时间，不再重复读取时钟
+        changes = {
+            "title": book.title,
+            "author": book.author,
+            "publisher": book.publisher,
+            "year": book.year,
+            "isbn": book.isbn,
+        }
+        updated_book = self._books[book.id].replace(
+            updated_at=book.updated_at,
+            **{name: value for name, value in changes.items() if value}
         )
         
         self._books[book.id] = updated_book
+        self._sorted.clear()
     
     async def list(
         self, 
@@ -299,52 +453,60 @@ class MemoryBookRepo(BookRepo):
     ) -> Tuple[List[Book], int]:
         """列出内存中的书籍"""
         # 验证排序参数
-        valid_sort_fields = {
-            "title", "author", "publisher", "year", 
-            "created_at", "updated_at", "isbn"
-        }
-        
-        if sort_by not in valid_sort_fields:
+        if sort_by not in SORT_FIELDS:
             sort_by = "created_at"
-            
-        if sort_order not in {"asc", "desc"}:
-            sort_order = "desc"
-            
-        if page <= 0:
-            page = 1
-            
-        if per_page <= 0 or per_page > 100:
-            per_page = 25
+        start_idx, per_page = _normalize_pagination(page, per_page)
         
-        # 获取所有书籍并排序
-        books = list(self._books.values())
+        # 获取按字段升序排列的书籍
+        _, books = self._sorted_view(sort_by)
         
-        # 排序
-        reverse = sort_order == "desc"
-        books.sort(key=lambda book: getattr(book, sort_by), reverse=reverse)
-        
-        # 分页
+        # 分页，降序时从列表末尾向前取；无效的排序顺序按降序处理
         total_count = len(books)
-        start_idx = (page - 1) * per_page
         end_idx = start_idx + per_page
+        if sort_order != "asc":
+            return books[max(total_count - end_idx, 0):max(total_count - start_idx, 0)][::-1], total_count
         
         return books[start_idx:end_idx], total_count
     
+    async def list_after(
+        self, 
+        ctx, 
+        sort_by: str = "created_at", 
+        sort_order: str = "desc", 
+        after: Optional[Tuple[Any, str]] = None, 
+        per_page: int = 25
+    ) -> List[Book]:
+        """按键集分页列出内存中的书籍"""
+        if sort_by not in KEYSET_SORT_FIELDS:
+            sort_by = "created_at"
+            
+        per_page = normalize_per_page(per_page)
+        
+        keys, books = self._sorted_view(sort_by)
+        
+        # 二分查找游标位置，降序时取游标之前的部分并倒序
+        if sort_order != "asc":
+            end = bisect.bisect_left(keys, tuple(after)) if after else len(books)
+            return books[max(end - per_page, 0):end][::-1]
+        
+        start = bisect.bisect_right(keys, tuple(after)) if after else 0
+        return books[start:start + per_page]
+    
     async def get_by_id(self, ctx, book_id: str) -> Book:
         """通过ID获取内存中的书籍"""
         if book_id not in self._books:
-            raise ValueError(f"Book with ID {book_id} not found")
+            raise BookNotFoundError(f"Book with ID {book_id} not found")
         
         return self._books[book_id]
     
     async def get_by_file_hash(self, ctx, file_hash: str) -> Book:
         """通过文件哈希获取内存中的书籍"""
         if file_hash not in self._hash_index:
-            raise ValueError(f"Book with file hash {file_hash} not found")
+            raise BookNotFoundError(f"Book with file hash {file_hash} not found")
         
         book_id = self._hash_index[file_hash]
         return self._books[book_id]
     
-    async def count(self, ctx) -> int:
-        """获取内存中的书籍总数"""
+    async def count(self, ctx, approximate: bool = False) -> int:
+        """获取内存中的书籍总数，总是精确值"""
         return len(self._books) 
\ No newline at end of file
@@ -1,14 +1,32 @@
 from abc import ABC, abstractmethod
+import bisect
 import datetime
-import uuid
-from typing import List, Optional
+import secrets
+from collections import defaultdict
+from typing import DefaultDict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import desc
+from sqlalchemy import bindparam, desc, insert
 
 from app.entity.progress import Progress, ProgressModel
 
 
+# 每次同步都要查询最新进度，语句在模块加载时构建一次，调用时只传入绑定参数；
+# SQL文本固定，asyncpg在每个连接上缓存其预编译语句，重复查询无需再次解析和规划
+_BOOK_HISTORY = (
+    select(ProgressModel)
+    .where(ProgressModel.document == bindparam("document"))
+    .order_by(desc(ProgressModel.timestamp))
+    .limit(bindparam("limit"))
+)
+_BOOK_HISTORY_BEFORE = (
+    select(ProgressModel)
+    .where(ProgressModel.document == bindparam("document"), ProgressModel.timestamp < bindparam("before"))
+    .order_by(desc(ProgressModel.timestamp))
+    .limit(bindparam("limit"))
+)
+
+
 class ProgressRepo(ABC):
     """
     进度存储库接口，定义对阅读进度数据的访问操作。
@@ -26,14 +44,32 @@ class ProgressRepo(ABC):
         pass
     
     @abstractmethod
-    async def get_book_history(self, ctx, book_id: str, limit: int = 10) -> List[Progress]:
+    async def store_many(self, ctx, progress_list: List[Progress]) -> None:
+        """
+        批量存储阅读进度
+        
+        Args:
+            ctx: 上下文
+            progress_list: 阅读进度实体列表
+        """
+        pass
+    
+    @abstractmethod
+    async def get_book_history(
+        self, 
+        ctx, 
+        book_id: str, 
+        limit: int = 10, 
+        before: Optional[int] = None
+    ) -> List[Progress]:
         """
-        获取书籍的阅读历史
+        获取书籍的阅读历史，按时间戳倒序
         
         Args:
             ctx: 上下文
             book_id: 书籍ID（文档哈希）
             limit: 返回的历史记录数量
+            before: 只返回时间戳早于该值的记录，传入上一页最后一条的时间戳即可继续翻页
             
         Returns:
             List[Progress]: 阅读进度历史列表
@@ -50,7 +86,7 @@ class ProgressDatabaseRepo(ProgressRepo):
     async def store(self, ctx, progress: Progress) -> None:
         """存储阅读进度到PostgreSQL数据库"""
         # 生成唯一ID
-        progress_id = str(uuid.uuid4())
+        progress_id = secrets.token_hex(16)
         
         # 创建ORM模型
         db_progress = ProgressModel(
@@ -68,18 +104,43 @@ class ProgressDatabaseRepo(ProgressRepo):
         self.db.add(db_progress)
         await self.db.commit()
     
-    async def get_book_history(self, ctx, book_id: str, limit: int = 10) -> List[Progress]:
-        """获取PostgreSQL数据库中书籍的阅读历史"""
-        # 构建查询
-        stmt = (
-            select(ProgressModel)
-            .where(ProgressModel.document == book_id)
-            .order_by(desc(ProgressModel.timestamp))
-            .limit(limit)
-        )
+    async def store_many(self, ctx, progress_list: List[Progress]) -> None:
+        """在一个事务中批量存储阅读进度到PostgreSQL数据库"""
+        if not progress_list:
+            return
         
-        # 执行查询
-        result = await self.db.execute(stmt)
+        # 使用Core INSERT传入参数列表，由驱动一次发送所有行，不经过ORM的工作单元
+        rows = [
+            {
+                "id": secrets.token_hex(16),
+                "document": progress.document,
+                "percentage": progress.percentage,
+                "progress": progress.progress,
+                "device": progress.device,
+                "device_id": progress.device_id,
+                "timestamp": progress.timestamp,
+                "auth_device_name": progress.auth_device_name,
+            }
+            for progress in progress_list
+        ]
+        await self.db.execute(insert(ProgressModel), rows)
+        await self.db.commit()
+    
+    async def get_book_history(
+        self, 
+        ctx, 
+        book_id: str, 
+        limit: int = 10, 
+        before: Optional[int] = None
+    ) -> List[Progress]:
+        """获取PostgreSQL数据库中书籍的阅读历史"""
+        # (document, timestamp)索引上直接定位到before之前的位置，无需OFFSET
+        if before is None:
+            result = await self.db.execute(_BOOK_HISTORY, {"document": book_id, "limit": limit})
+        else:
+            result = await self.db.execute(
+                _BOOK_HISTORY_BEFORE, {"document": book_id, "before": before, "limit": limit}
+            )
         db_progress_list = result.scalars().all()
         
         # 转换为实体
@@ -94,8 +155,9 @@ class MemoryProgressRepo(ProgressRepo):
     def __init__(self):
         # 使用字典存储进度，键是(document, timestamp)元组
         self._progress = {}
-        # 文档索引，键是document，值是按timestamp排序的进度列表
-        self._document_index = {}
+        # 文档索引，键是document，值是(时间戳列表, 进度列表)，两者一一对应并按timestamp升序排列；
+        # 时间戳列表用于二分查找插入位置，defaultdict使每次写入只需一次字典查找
+        self._document_index: DefaultDict[str, Tuple[List[int], List[Progress]]] = defaultdict(lambda: ([], []))
     
     async def store(self, ctx, progress: Progress) -> None:
         """存储阅读进度到内存"""
@@ -105,21 +167,31 @@ class MemoryProgressRepo(ProgressRepo):
         # 存储进度
         self._progress[key] = progress
         
-        # 更新文档索引
-        if progress.document not in self._document_index:
-            self._document_index[progress.document] = []
-        self._document_index[progress.document].append(progress)
-        
-        # 按时间戳排序
-        self._document_index[progress.document].sort(
-            key=lambda p: p.timestamp, 
-            reverse=True
-        )
+        # 更新文档索引，二分查找插入位置保持升序，无需每次重新排序
+        keys, history = self._document_index[progress.document]
+        idx = bisect.bisect_left(keys, progress.timestamp)
+        keys.insert(idx, progress.timestamp)
+        history.insert(idx, progress)
+    
+    async def store_many(self, ctx, progress_list: List[Progress]) -> None:
+        """批量存储阅读进度到内存"""
+        for progress in progress_list:
+            await self.store(ctx, progress)
     
-    async def get_book_history(self, ctx, book_id: str, limit: int = 10) -> List[Progress]:
+    async def get_book_history(
+        self, 
+        ctx, 
+        book_id: str, 
+        limit: int = 10, 
+        before: Optional[int] = None
+    ) -> List[Progress]:
         """获取内存中书籍的阅读历史"""
-        if book_id not in self._document_index:
+        # 使用get查询，避免为不存在的文档创建空索引
+        entry = self._document_index.get(book_id)
+        if entry is None:
             return []
         
-        # 获取并限制结果数量
-        return self._document_index[book_id][:limit] 
\ No newline at end of file
+        keys, history = entry
+        # 列表按时间戳升序排列，取截止位置之前的最后limit条并倒序返回
+        end = len(keys) if before is None else bisect.bisect_left(keys, before)
+        return history[max(end - limit, 0):end][::-1]
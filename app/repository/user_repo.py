@@ -1,10 +1,12 @@
 import ipaddress
 import uuid
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update, delete
+from sqlalchemy import bindparam, insert, update, delete, literal
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.entity.user import (
     User, Device, Session, 
@@ -12,6 +14,33 @@ from app.entity.user import (
     UserNotFoundError, UserAlreadyExistsError,
     SessionNotFoundError, DeviceNotFoundError, DeviceAlreadyExistsError
 )
+from app.repository import _cache
+
+
+# 高频查询在模块加载时构建一次，调用时只传入绑定参数，
+# 省去每次调用构建语句对象的开销，也能稳定命中SQLAlchemy的编译缓存
+_GET_USER_BY_USERNAME = select(UserModel).where(UserModel.username == bindparam("username"))
+_GET_USER_BY_SESSION = (
+    select(UserModel)
+    .join(SessionModel, SessionModel.username == UserModel.username)
+    .where(SessionModel.session_key == bindparam("session_key"))
+)
+_GET_SESSION_USERNAME = select(SessionModel.username).where(SessionModel.session_key == bindparam("session_key"))
+_GET_DEVICE_BY_NAME = select(DeviceModel).where(DeviceModel.name == bindparam("device_name"))
+# 设备列表只需要实体用到的列，直接由行构造实体，不创建ORM对象
+_LIST_DEVICES = select(DeviceModel.name, DeviceModel.hashed_password)
+
+# 流式读取设备时每批从服务端游标获取的行数
+_DEVICE_STREAM_BATCH = 500
+
+
+# PostgreSQL外键约束冲突的SQLSTATE
+_FOREIGN_KEY_VIOLATION = "23503"
+
+
+def _is_foreign_key_violation(error: IntegrityError) -> bool:
+    """判断完整性错误是否由外键约束引起"""
+    return getattr(error.orig, "sqlstate", None) == _FOREIGN_KEY_VIOLATION
 
 
 class UserRepo(ABC):
@@ -46,6 +75,20 @@ class UserRepo(ABC):
         """
         pass
     
+    @abstractmethod
+    async def update_password(self, username: str, hashed_password: str) -> None:
+        """
+        更新用户的密码哈希
+        
+        Args:
+            username: 用户名
+            hashed_password: 新的密码哈希
+            
+        Raises:
+            UserNotFoundError: 用户不存在时抛出
+        """
+        pass
+    
     @abstractmethod
     async def get_user_by_session(self, session_key: str) -> User:
         """
@@ -99,15 +142,31 @@ class UserRepo(ABC):
         pass
     
     @abstractmethod
-    async def create_device(self, device: Device) -> None:
+    async def create_device(self, device: Device, owner_username: Optional[str] = None) -> None:
         """
         创建设备
         
         Args:
             device: 设备实体
+            owner_username: 设备所属用户名，为空时关联到第一个用户
             
         Raises:
             DeviceAlreadyExistsError: 设备已存在时抛出
+            UserNotFoundError: 未指定所属用户且没有可关联的用户时抛出
+        """
+        pass
+    
+    @abstractmethod
+    async def update_device_password(self, device_name: str, hashed_password: str) -> None:
+        """
+        更新设备的密码哈希
+        
+        Args:
+            device_name: 设备名称
+            hashed_password: 新的密码哈希
+            
+        Raises:
+            DeviceNotFoundError: 设备不存在时抛出
         """
         pass
     
@@ -149,6 +208,16 @@ class UserRepo(ABC):
             设备列表
         """
         pass
+    
+    @abstractmethod
+    def iter_devices(self) -> AsyncIterator[Device]:
+        """
+        逐个迭代所有设备，设备较多时内存占用不随设备数量增长
+        
+        Returns:
+            设备的异步迭代器
+        """
+        pass
 
 
 class UserDatabaseRepo(UserRepo):
@@ -159,53 +228,68 @@ class UserDatabaseRepo(UserRepo):
     
     async def create_user(self, user: User) -> None:
         """创建新用户"""
-        # 检查用户是否已存在
-        stmt = select(UserModel).where(UserModel.username == user.username)
+        # INSERT ... ON CONFLICT DO NOTHING一次完成插入和重复检查，没有返回行说明用户已存在
+        stmt = (
+            pg_insert(UserModel)
+            .values(username=user.username, hashed_password=user.hashed_password)
+            .on_conflict_do_nothing(index_elements=[UserModel.username])
+            .returning(UserModel.username)
+        )
         result = await self.db.execute(stmt)
-        existing_user = result.scalar_one_or_none()
+        inserted = result.scalar_one_or_none()
+        await self.db.commit()
+        _cache.user_by_name.pop(user.username)
         
-        if existing_user:
+        if inserted is None:
             raise UserAlreadyExistsError(f"User {user.username} already exists")
-        
-        # 创建新用户
-        db_user = UserModel(
-            username=user.username,
-            hashed_password=user.hashed_password
-        )
-        
-        self.db.add(db_user)
-        await self.db.commit()
     
     async def get_user_by_username(self, username: str) -> User:
-        """通过用户名获取用户"""
-        stmt = select(UserModel).where(UserModel.username == username)
-        result = await self.db.execute(stmt)
+        """通过用户名获取用户，命中进程内缓存时不查询数据库"""
+        cached = _cache.user_by_name.get(username)
+        if cached is not None:
+            return cached
+        
+        result = await self.db.execute(_GET_USER_BY_USERNAME, {"username": username})
         user = result.scalar_one_or_none()
         
         if not user:
             raise UserNotFoundError(f"User {username} not found")
         
-        return user.to_entity()
+        entity = user.to_entity()
+        _cache.user_by_name.set(username, entity)
+        return entity
     
-    async def get_user_by_session(self, session_key: str) -> User:
-        """通过会话密钥获取用户"""
-        # 查找会话
-        stmt = select(SessionModel).where(SessionModel.session_key == session_key)
+    async def update_password(self, username: str, hashed_password: str) -> None:
+        """更新用户的密码哈希"""
+        stmt = (
+            update(UserModel)
+            .where(UserModel.username == username)
+            .values(hashed_password=hashed_password)
+            .returning(UserModel.username)
+        )
         result = await self.db.execute(stmt)
-        session = result.scalar_one_or_none()
-        
-        if not session:
-            raise SessionNotFoundError(f"Session {session_key} not found")
+        if result.scalar_one_or_none() is None:
+            await self.db.rollback()
+            raise UserNotFoundError(f"User {username} not found")
         
-        # 查找用户
-        stmt = select(UserModel).where(UserModel.username == session.username)
-        result = await self.db.execute(stmt)
+        await self.db.commit()
+        _cache.user_by_name.pop(username)
+    
+    async def get_user_by_session(self, session_key: str) -> User:
+        """通过会话密钥获取用户"""
+        # 通过JOIN一次查询会话对应的用户
+        result = await self.db.execute(_GET_USER_BY_SESSION, {"session_key": session_key})
         user = result.scalar_one_or_none()
         
-        if not user:
-            raise UserNotFoundError(f"User {session.username} not found")
+        if user:
+            return user.to_entity()
         
-        return user.to_entity()
+        # 仅在失败时区分原因：会话不存在，或者会话对应的用户不存在
+        result = await self.db.execute(_GET_SESSION_USERNAME, {"session_key": session_key})
+        username = result.scalar_one_or_none()
+        if username is None:
+            raise SessionNotFoundError(f"Session {session_key} not found")
+        raise UserNotFoundError(f"User {username} not found")
     
     async def store_session(
         self, 
@@ -215,72 +299,91 @@ class UserDatabaseRepo(UserRepo):
         client_ip: ipaddress.IPv4Address
     ) -> None:
         """存储用户会话"""
-        # 检查用户是否存在
-        stmt = select(UserModel).where(UserModel.username == username)
-        result = await self.db.execute(stmt)
-        user = result.scalar_one_or_none()
-        
-        if not user:
-            raise UserNotFoundError(f"User {username} not found")
-        
-        # 创建会话
-        session = SessionModel(
+        # 直接插入会话，由sessions.username的外键检查用户是否存在，省去一次查询
+        stmt = insert(SessionModel).values(
             session_key=session_key,
             username=username,
             user_agent=user_agent,
             client_ip=str(client_ip)
         )
+        try:
+            await self.db.execute(stmt)
+        except IntegrityError as e:
+            await self.db.rollback()
+            if _is_foreign_key_violation(e):
+                raise UserNotFoundError(f"User {username} not found") from e
+            raise
         
-        self.db.add(session)
         await self.db.commit()
     
     async def delete_session(self, session_key: str) -> None:
         """删除会话"""
-        # 检查会话是否存在
-        stmt = select(SessionModel).where(SessionModel.session_key == session_key)
+        # 单条DELETE ... RETURNING同时完成删除和存在性检查
+        stmt = (
+            delete(SessionModel)
+            .where(SessionModel.session_key == session_key)
+            .returning(SessionModel.session_key)
+        )
         result = await self.db.execute(stmt)
-        session = result.scalar_one_or_none()
-        
-        if not session:
+        if result.scalar_one_or_none() is None:
+            await self.db.rollback()
             raise SessionNotFoundError(f"Session {session_key} not found")
         
-        # 删除会话
-        stmt = delete(SessionModel).where(SessionModel.session_key == session_key)
-        await self.db.execute(stmt)
         await self.db.commit()
     
-    async def create_device(self, device: Device) -> None:
+    async def create_device(self, device: Device, owner_username: Optional[str] = None) -> None:
         """创建设备"""
-        # 检查设备是否已存在
-        stmt = select(DeviceModel).where(DeviceModel.name == device.name)
-        result = await self.db.execute(stmt)
-        existing_device = result.scalar_one_or_none()
-        
-        if existing_device:
-            raise DeviceAlreadyExistsError(f"Device {device.name} already exists")
-        
-        # 创建设备（默认关联到第一个用户）
-        stmt = select(UserModel)
-        result = await self.db.execute(stmt)
-        user = result.scalar_one_or_none()
+        if owner_username is not None:
+            # 调用方已知所属用户（来自已登录的会话），直接插入，无需查找用户
+            stmt = pg_insert(DeviceModel).values(
+                name=device.name, hashed_password=device.hashed_password, username=owner_username
+            )
+        else:
+            # 设备默认关联到第一个用户；INSERT ... SELECT一次完成用户查找和插入
+            owner = select(
+                literal(device.name), literal(device.hashed_password), UserModel.username
+            ).limit(1)
+            stmt = pg_insert(DeviceModel).from_select(
+                [DeviceModel.name, DeviceModel.hashed_password, DeviceModel.username], owner
+            )
+        # ON CONFLICT DO NOTHING同时完成重复检查；指定的用户不存在时由外键拒绝插入
+        stmt = stmt.on_conflict_do_nothing(index_elements=[DeviceModel.name]).returning(DeviceModel.name)
+        try:
+            result = await self.db.execute(stmt)
+        except IntegrityError as e:
+            await self.db.rollback()
+            if _is_foreign_key_violation(e):
+                raise UserNotFoundError(f"User {owner_username} not found") from e
+            raise
+        inserted = result.scalar_one_or_none()
+        await self.db.commit()
         
-        if not user:
+        if inserted is None:
+            # 仅在失败时区分原因：设备已存在，或者没有可关联的用户
+            stmt = select(DeviceModel.name).where(DeviceModel.name == device.name)
+            result = await self.db.execute(stmt)
+            if result.scalar_one_or_none() is not None:
+                raise DeviceAlreadyExistsError(f"Device {device.name} already exists")
             raise UserNotFoundError("No user found to associate device with")
-        
-        # 创建设备
-        db_device = DeviceModel(
-            name=device.name,
-            hashed_password=device.hashed_password,
-            username=user.username
+    
+    async def update_device_password(self, device_name: str, hashed_password: str) -> None:
+        """更新设备的密码哈希"""
+        stmt = (
+            update(DeviceModel)
+            .where(DeviceModel.name == device_name)
+            .values(hashed_password=hashed_password)
+            .returning(DeviceModel.name)
         )
+        result = await self.db.execute(stmt)
+        if result.scalar_one_or_none() is None:
+            await self.db.rollback()
+            raise DeviceNotFoundError(f"Device {device_name} not found")
         
-        self.db.add(db_device)
         await self.db.commit()
     
     async def get_device_by_name(self, device_name: str) -> Device:
         """通过名称获取设备"""
-        stmt = select(DeviceModel).where(DeviceModel.name == device_name)
-        result = await self.db.execute(stmt)
+        result = await self.db.execute(_GET_DEVICE_BY_NAME, {"device_name": device_name})
         device = result.scalar_one_or_none()
         
         if not device:
@@ -290,26 +393,25 @@ class UserDatabaseRepo(UserRepo):
     
     async def delete_device(self, device_name: str) -> None:
         """删除设备"""
-        # 检查设备是否存在
-        stmt = select(DeviceModel).where(DeviceModel.name == device_name)
+        # 单条DELETE ... RETURNING同时完成删除和存在性检查
+        stmt = delete(DeviceModel).where(DeviceModel.name == device_name).returning(DeviceModel.name)
         result = await self.db.execute(stmt)
-        device = result.scalar_one_or_none()
-        
-        if not device:
+        if result.scalar_one_or_none() is None:
+            await self.db.rollback()
             raise DeviceNotFoundError(f"Device {device_name} not found")
         
-        # 删除设备
-        stmt = delete(DeviceModel).where(DeviceModel.name == device_name)
-        await self.db.execute(stmt)
         await self.db.commit()
     
     async def list_devices(self) -> List[Device]:
         """列出所有设备"""
-        stmt = select(DeviceModel)
-        result = await self.db.execute(stmt)
-        devices = result.scalars().all()
-        
-        return [device.to_entity() for device in devices]
+        result = await self.db.execute(_LIST_DEVICES)
+        return [Device(name, hashed_password) for name, hashed_password in result]
+    
+    async def iter_devices(self) -> AsyncIterator[Device]:
+        """通过服务端游标分批流式读取所有设备"""
+        result = await self.db.stream(_LIST_DEVICES.execution_options(yield_per=_DEVICE_STREAM_BATCH))
+        async for name, hashed_password in result:
+            yield Device(name, hashed_password)
 
 
 class MemoryUserRepo(UserRepo):
@@ -334,6 +436,13 @@ class MemoryUserRepo(UserRepo):
         
         return self._users[username]
     
+    async def update_password(self, username: str, hashed_password: str) -> None:
+        """更新内存中用户的密码哈希"""
+        if username not in self._users:
+            raise UserNotFoundError(f"User {username} not found")
+        
+        self._users[username] = User(username=username, hashed_password=hashed_password)
+    
     async def get_user_by_session(self, session_key: str) -> User:
         """通过会话密钥获取用户"""
         if session_key not in self._sessions:
@@ -373,13 +482,20 @@ class MemoryUserRepo(UserRepo):
         
         del self._sessions[session_key]
     
-    async def create_device(self, device: Device) -> None:
-        """创建设备"""
+    async def create_device(self, device: Device, owner_username: Optional[str] = None) -> None:
+        """创建设备，内存实现不记录所属用户"""
         if device.name in self._devices:
             raise DeviceAlreadyExistsError(f"Device {device.name} already exists")
         
         self._devices[device.name] = device
     
+    async def update_device_password(self, device_name: str, hashed_password: str) -> None:
+        """更新内存中设备的密码哈希"""
+        if device_name not in self._devices:
+            raise DeviceNotFoundError(f"Device {device_name} not found")
+        
+        self._devices[device_name] = Device(name=device_name, hashed_password=hashed_password)
+    
     async def get_device_by_name(self, device_name: str) -> Device:
         """通过名称获取设备"""
         if device_name not in self._devices:
@@ -396,4 +512,9 @@ class MemoryUserRepo(UserRepo):
     
     async def list_devices(self) -> List[Device]:
         """列出所有设备"""
-        return list(self._devices.values()) 
\ No newline at end of file
+        return list(self._devices.values())
+    
+    async def iter_devices(self) -> AsyncIterator[Device]:
+        """逐个迭代内存中的设备"""
+        for device in list(self._devices.values()):
+            yield device 
@@ -1,5 +1,5 @@
-from app.service.auth import AuthService, get_current_user
+from app.service.auth import AuthService, get_current_user, invalidate_session_cache
 from app.service.progress_sync import ProgressSync
 from app.service.reading_stats import ReadingStats
 
-__all__ = ["AuthService", "get_current_user", "ProgressSync", "ReadingStats"]
+__all__ = ["AuthService", "get_current_user", "invalidate_session_cache", "ProgressSync", "ReadingStats"]
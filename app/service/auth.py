@@ -1,32 +1,69 @@
 import hashlib
+import hmac
 import ipaddress
-import uuid
+import secrets
 import logging
 from datetime import datetime, timedelta
 from typing import Optional
 
-import bcrypt
-from passlib.context import CryptContext
 from fastapi import Request, HTTPException, status
 
 from app.entity.user import (
     User, Device, 
     IncorrectPasswordError, 
     UserAlreadyExistsError,
+    DeviceNotFoundError,
+    SessionNotFoundError,
+    UserNotFoundError,
     UserSessionInfo
 )
 from app.repository.user_repo import UserRepo
 from app.config import Settings
+from app.utils.cache import TTLCache
+from app.utils.security import (
+    get_password_hash_async, password_needs_rehash, verify_password_async,
+    hash_device_key, verify_device_key, device_key_needs_rehash
+)
+
+
+# 设备不存在时用于比较的占位哈希，使未知设备与密码错误的耗时一致
+_DUMMY_DEVICE_HASH = hash_device_key(hashlib.md5(b"kompanion-unknown-device", usedforsecurity=False).hexdigest())
+
+# 以下凭据缓存都只在当前进程内有效：登出、停用设备和修改密码只能清除本进程的条目，
+# 多进程部署时其他工作进程要等条目过期，因此有效期只取几秒，
+# 只用于合并KOReader同步时短时间内的连续请求。
+_CREDENTIAL_CACHE_TTL = 5
+
+# 会话密钥 -> 用户名缓存，已认证的请求在有效期内无需再查询会话存储
+_session_cache: TTLCache[str] = TTLCache(maxsize=10_000, ttl=_CREDENTIAL_CACHE_TTL)
+
+# 设备名称 -> 设备密码哈希缓存，KOReader同步时每个WebDAV/OPDS请求都要校验设备密码
+_device_hash_cache: TTLCache[str] = TTLCache(maxsize=1000, ttl=_CREDENTIAL_CACHE_TTL)
+
+# 密码校验结果缓存：HMAC(密钥, 明文密码|密码哈希) -> 是否匹配
+# 同一凭据连续认证时跳过哈希计算；键中不含明文密码，密码哈希变化后键随之变化
+_verify_cache: TTLCache[bool] = TTLCache(maxsize=10_000, ttl=_CREDENTIAL_CACHE_TTL)
+
+
+def invalidate_session_cache(session_key: str) -> None:
+    """
+    使会话缓存失效，登出时调用
+    
+    Args:
+        session_key: 会话密钥
+    """
+    _session_cache.pop(session_key)
 
 
 class AuthService:
     """认证服务，处理用户认证和会话管理"""
     
+    # 日志记录器在类上共享，按请求创建服务实例时无需重复获取
+    logger = logging.getLogger(__name__)
+    
     def __init__(self, user_repo: UserRepo, settings: Settings):
         self.user_repo = user_repo
         self.settings = settings
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-        self.logger = logging.getLogger(__name__)
     
     async def register_user(self, username: str, password: str) -> None:
         """
@@ -39,18 +76,27 @@ class AuthService:
         Raises:
             UserAlreadyExistsError: 用户已存在时抛出
         """
-        hashed_password = self._hash_password(password)
-        user = User(username=username, hashed_password=hashed_password)
-        
+        # 先查询用户是否已存在（通常命中用户缓存），已存在时只需验证密码，
+        # 不必先计算一次注定用不上的新密码哈希
         try:
-            await self.user_repo.create_user(user)
-            self.logger.info(f"User {username} registered successfully")
-        except UserAlreadyExistsError:
-            self.logger.warning(f"Attempted to register existing user: {username}")
-            # 已存在的情况下，尝试验证密码
             existing_user = await self.user_repo.get_user_by_username(username)
-            if not self._verify_password(password, existing_user.hashed_password):
-                raise IncorrectPasswordError(f"Incorrect password for user {username}")
+        except UserNotFoundError:
+            existing_user = None
+        
+        if existing_user is None:
+            hashed_password = await self._hash_password(password)
+            try:
+                await self.user_repo.create_user(User(username=username, hashed_password=hashed_password))
+                self.logger.info("User %s registered successfully", username)
+                return
+            except UserAlreadyExistsError:
+                # 并发注册了同名用户，按已存在处理
+                existing_user = await self.user_repo.get_user_by_username(username)
+        
+        self.logger.warning("Attempted to register existing user: %s", username)
+        # 已存在的情况下，尝试验证密码
+        if not await self._verify_password(password, existing_user.hashed_password):
+            raise IncorrectPasswordError(f"Incorrect password for user {username}")
     
     async def check_password(self, username: str, password: str) -> bool:
         """
@@ -65,9 +111,9 @@ class AuthService:
         """
         try:
             user = await self.user_repo.get_user_by_username(username)
-            return self._verify_password(password, user.hashed_password)
+            return await self._verify_password(password, user.hashed_password)
         except Exception as e:
-            self.logger.error(f"Error checking password for user {username}: {str(e)}")
+            self.logger.error("Error checking password for user %s: %s", username, e)
             return False
     
     async def login(
@@ -94,14 +140,20 @@ class AuthService:
         """
         user = await self.user_repo.get_user_by_username(username)
         
-        if not self._verify_password(password, user.hashed_password):
-            self.logger.warning(f"Failed login attempt for user {username}")
+        if not await self._verify_password(password, user.hashed_password):
+            self.logger.warning("Failed login attempt for user %s", username)
             raise IncorrectPasswordError(f"Incorrect password for user {username}")
         
+        # 登录成功时顺带把旧格式的密码哈希升级为当前方案
+        if password_needs_rehash(user.hashed_password):
+            await self._upgrade_password_hash(username, password)
+        
         # 创建会话
-        session_key = str(uuid.uuid4())
+        session_key = secrets.token_hex(16)
         await self.user_repo.store_session(username, session_key, user_agent, client_ip)
-        self.logger.info(f"User {username} logged in successfully")
+        # 预先写入会话缓存，登录后的首个请求也无需查询会话
+        _session_cache.set(session_key, username)
+        self.logger.info("User %s logged in successfully", username)
         
         return session_key
     
@@ -112,11 +164,12 @@ class AuthService:
         Args:
             session_key: 会话密钥
         """
+        invalidate_session_cache(session_key)
         try:
             await self.user_repo.delete_session(session_key)
-            self.logger.info(f"Session {session_key} deleted successfully")
+            self.logger.info("Session %s deleted successfully", session_key)
         except Exception as e:
-            self.logger.error(f"Error logging out session {session_key}: {str(e)}")
+            self.logger.error("Error logging out session %s: %s", session_key, e)
     
     async def is_authenticated(self, session_key: str) -> bool:
         """
@@ -132,23 +185,25 @@ class AuthService:
             await self.user_repo.get_user_by_session(session_key)
             return True
         except Exception as e:
-            self.logger.debug(f"Session authentication check failed: {str(e)}")
+            self.logger.debug("Session authentication check failed: %s", e)
             return False
     
-    async def add_user_device(self, device_name: str, password: str) -> None:
+    async def add_user_device(self, device_name: str, password: str, owner_username: Optional[str] = None) -> None:
         """
         添加用户设备
         
         Args:
             device_name: 设备名称
             password: 设备密码
+            owner_username: 设备所属用户名，通常为当前登录用户；为空时关联到第一个用户
         """
-        # KOReader使用MD5哈希密码
-        hashed_password = self._hash_sync_password(password)
+        # KOReader发送密码的MD5，保存时再做加盐BLAKE2b哈希
+        hashed_password = hash_device_key(self._hash_sync_password(password))
         device = Device(name=device_name, hashed_password=hashed_password)
         
-        await self.user_repo.create_device(device)
-        self.logger.info(f"Device {device_name} added successfully")
+        await self.user_repo.create_device(device, owner_username)
+        _device_hash_cache.pop(device_name)
+        self.logger.info("Device %s added successfully", device_name)
     
     async def deactivate_user_device(self, device_name: str) -> None:
         """
@@ -158,7 +213,8 @@ class AuthService:
             device_name: 设备名称
         """
         await self.user_repo.delete_device(device_name)
-        self.logger.info(f"Device {device_name} deactivated successfully")
+        _device_hash_cache.pop(device_name)
+        self.logger.info("Device %s deactivated successfully", device_name)
     
     async def check_device_password(
         self, 
@@ -178,16 +234,35 @@ class AuthService:
             如果密码正确则返回True，否则返回False
         """
         try:
-            device = await self.user_repo.get_device_by_name(device_name)
+            # 优先使用缓存的密码哈希，避免每次请求都查询设备
+            stored = _device_hash_cache.get(device_name)
+            found = stored is not None
+            if not found:
+                try:
+                    device = await self.user_repo.get_device_by_name(device_name)
+                except DeviceNotFoundError:
+                    stored = _DUMMY_DEVICE_HASH
+                else:
+                    stored = device.hashed_password
+                    found = True
+                    _device_hash_cache.set(device_name, stored)
             
             if plain:
                 to_check = password
             else:
                 to_check = self._hash_sync_password(password)
             
-            return device.hashed_password == to_check
+            # 无论设备是否存在都执行相同的哈希和常量时间比较
+            matched = verify_device_key(to_check, stored)
+            if not (found and matched):
+                return False
+            
+            # 旧版直接保存的MD5在认证成功后升级为加盐哈希
+            if device_key_needs_rehash(stored):
+                await self._upgrade_device_hash(device_name, to_check)
+            return True
         except Exception as e:
-            self.logger.error(f"Error checking device password: {str(e)}")
+            self.logger.error("Error checking device password: %s", e)
             return False
     
     async def list_devices(self):
@@ -199,19 +274,46 @@ class AuthService:
         """
         return await self.user_repo.list_devices()
     
-    def _hash_password(self, password: str) -> str:
-        """使用bcrypt哈希密码"""
-        return self.pwd_context.hash(password)
+    async def _hash_password(self, password: str) -> str:
+        """在密码哈希线程池中哈希密码"""
+        return await get_password_hash_async(password)
     
-    def _verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        """验证密码"""
-        return self.pwd_context.verify(plain_password, hashed_password)
+    async def _upgrade_device_hash(self, device_name: str, md5_key: str) -> None:
+        """将旧版MD5设备密码升级为加盐哈希并保存，失败时只记录日志，不影响认证"""
+        try:
+            hashed = hash_device_key(md5_key)
+            await self.user_repo.update_device_password(device_name, hashed)
+            _device_hash_cache.set(device_name, hashed)
+            self.logger.info("Upgraded password hash for device %s", device_name)
+        except Exception as e:
+            self.logger.warning("Failed to upgrade password hash for device %s: %s", device_name, e)
+    
+    async def _upgrade_password_hash(self, username: str, password: str) -> None:
+        """用当前方案重新哈希已验证的密码并保存，失败时只记录日志，不影响登录"""
+        try:
+            await self.user_repo.update_password(username, await self._hash_password(password))
+            self.logger.info("Upgraded password hash for user %s", username)
+        except Exception as e:
+            self.logger.warning("Failed to upgrade password hash for user %s: %s", username, e)
+    
+    async def _verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        """在密码哈希线程池中验证密码，近期校验过的凭据直接返回缓存结果"""
+        key = hmac.new(
+            self.settings.SECRET_KEY.encode(),
+            plain_password.encode() + b"|" + hashed_password.encode(),
+            hashlib.sha256
+        ).digest()
+        matched = _verify_cache.get(key)
+        if matched is None:
+            matched = await verify_password_async(plain_password, hashed_password)
+            _verify_cache.set(key, matched)
+        return matched
     
     def _hash_sync_password(self, password: str) -> str:
         """
         使用MD5哈希密码（KOReader同步兼容）
         """
-        return hashlib.md5(password.encode()).hexdigest()
+        return hashlib.md5(password.encode(), usedforsecurity=False).hexdigest()
 
     async def authenticate_admin_via_config(self, username: str, password: str) -> Optional[UserSessionInfo]:
         """
@@ -220,12 +322,15 @@ class AuthService:
         admin_username = self.settings.AUTH_USERNAME
         admin_password = self.settings.AUTH_PASSWORD
 
-        self.logger.debug(f"Attempting admin authentication for user: {username} via config.")
-        if username == admin_username and password == admin_password:
-            self.logger.info(f"Admin user {username} authenticated successfully via config.")
+        self.logger.debug("Attempting admin authentication for user: %s via config.", username)
+        # 用户名和密码都做常量时间比较，避免通过耗时推测凭据
+        username_ok = hmac.compare_digest(username.encode(), admin_username.encode())
+        password_ok = hmac.compare_digest(password.encode(), admin_password.encode())
+        if username_ok and password_ok:
+            self.logger.info("Admin user %s authenticated successfully via config.", username)
             return UserSessionInfo(id="config_admin_001", username=username, is_superuser=True)
         else:
-            self.logger.warning(f"Admin authentication failed for user: {username} via config. Credentials did not match.")
+            self.logger.warning("Admin authentication failed for user: %s via config. Credentials did not match.", username)
             return None
 
 
@@ -246,12 +351,22 @@ async def get_current_user(request: Request, auth_service: AuthService):
     """
     session_key = request.session.get("session_key")
     
-    if not session_key or not await auth_service.is_authenticated(session_key):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authenticated",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    if session_key:
+        # 命中缓存时跳过会话查询
+        username = _session_cache.get(session_key)
+        if username is not None:
+            return username
+        
+        try:
+            user = await auth_service.user_repo.get_user_by_session(session_key)
+        except (SessionNotFoundError, UserNotFoundError) as e:
+            auth_service.logger.debug("Session authentication check failed: %s", e)
+        else:
+            _session_cache.set(session_key, user.username)
+            return user.username
     
-    user = await auth_service.user_repo.get_user_by_session(session_key)
-    return user.username 
\ No newline at end of file
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated",
+        headers={"WWW-Authenticate": "Bearer"},
+    ) 
\ No newline at end of file
@@ -1,14 +1,13 @@
-import os
-import tempfile
+import asyncio
 import logging
 import datetime
-import uuid
+import secrets
 from typing import Tuple, Optional, List
 
-from app.entity.book import Book, BookAlreadyExistsError
-from app.repository.book_repo import BookRepo
+from app.entity.book import Book, BookUpdate, BookAlreadyExistsError
+from app.repository.book_repo import BookRepo, KEYSET_SORT_FIELDS, normalize_per_page
 from app.storage.base import Storage
-from app.utils.paginator import PaginatedBookList
+from app.utils.paginator import PaginatedBookList, encode_cursor, decode_cursor
 from app.utils.metadata import extract_book_metadata, resize_cover
 from app.utils.utils import partial_md5, safe_filename, ensure_dir
 
@@ -31,7 +30,13 @@ class BookShelf:
         self.repo = repo
         self.logger = logger
     
-    async def store_book(self, ctx, temp_file: str, uploaded_filename: str) -> Book:
+    async def store_book(
+        self, 
+        ctx, 
+        temp_file: str, 
+        uploaded_filename: str, 
+        file_hash: Optional[str] = None
+    ) -> Book:
         """
         存储书籍
         
@@ -39,6 +44,7 @@ class BookShelf:
             ctx: 上下文
             temp_file: 临时文件路径
             uploaded_filename: 上传的文件名
+            file_hash: 上传时已计算的部分MD5哈希，为空时从临时文件读取计算
             
         Returns:
             Book: 存储的书籍
@@ -47,60 +53,56 @@ class BookShelf:
             BookAlreadyExistsError: 书籍已存在时抛出
             ValueError: 未知文件格式或其他错误
         """
-        # 计算KOReader部分MD5哈希
-        file_hash = partial_md5(temp_file)
+        # 计算KOReader部分MD5哈希；需要读取最多5MB文件，在线程中执行以免阻塞事件循环
+        file_hash = file_hash or await asyncio.to_thread(partial_md5, temp_file)
         if not file_hash:
             raise ValueError("Failed to calculate file hash")
         
         # 检查是否已存在
         try:
             existing_book = await self.repo.get_by_file_hash(ctx, file_hash)
-            self.logger.info(f"Book with hash {file_hash} already exists")
+            self.logger.info("Book with hash %s already exists", file_hash)
             raise BookAlreadyExistsError(f"Book with hash {file_hash} already exists")
         except ValueError:
             # 书籍不存在，继续处理
             pass
         
-        # 提取元数据
-        metadata = extract_book_metadata(temp_file)
+        # 提取元数据；解析EPUB/PDF是阻塞的文件操作，同样在线程中执行
+        metadata = await asyncio.to_thread(extract_book_metadata, temp_file)
         if not metadata.format:
             raise ValueError("Unknown file format")
         
         # 生成唯一ID和创建日期
-        book_id = str(uuid.uuid4())
+        book_id = secrets.token_hex(16)
         create_date = datetime.datetime.now()
         
         # 构建存储路径
         year_month_day = create_date.strftime("%Y/%m/%d")
         storage_path = f"{year_month_day}/{book_id}.{metadata.format}"
         
-        # 存储文件
-        try:
-            await self.storage.write(temp_file, storage_path)
-        except Exception as e:
-            self.logger.error(f"Failed to store book: {str(e)}")
-            raise ValueError(f"Failed to store book: {str(e)}")
+        # 存储文件，同时在线程中调整封面大小；封面处理失败不影响书籍入库
+        resize_task = asyncio.to_thread(resize_cover, metadata.cover) if metadata.cover else None
+        write_result, resized_cover = await asyncio.gather(
+            self.storage.write(temp_file, storage_path),
+            resize_task or asyncio.sleep(0),
+            return_exceptions=True
+        )
+        if isinstance(write_result, BaseException):
+            self.logger.error("Failed to store book: %s", write_result)
+            raise ValueError(f"Failed to store book: {str(write_result)}")
         
-        # 处理封面
+        # 处理封面；存储实现可能共用同一个数据库会话，封面写入不与书籍文件写入并发
         cover_path = ""
-        if metadata.cover:
+        if isinstance(resized_cover, BaseException):
+            self.logger.error("Failed to process cover: %s", resized_cover)
+        elif resized_cover:
             try:
-                # 调整封面大小
-                resized_cover = resize_cover(metadata.cover)
-                
-                # 创建临时文件
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as cover_file:
-                    cover_file.write(resized_cover)
-                    cover_temp_path = cover_file.name
-                
-                # 存储封面
+                # 封面数据已在内存中，直接写入存储，无需经过临时文件
                 cover_path = f"covers/{book_id}.jpg"
-                await self.storage.write(cover_temp_path, cover_path)
-                
-                # 删除临时文件
-                os.unlink(cover_temp_path)
+                await self.storage.write_bytes(resized_cover, cover_path)
             except Exception as e:
-                self.logger.error(f"Failed to process cover: {str(e)}")
+                self.logger.error("Failed to process cover: %s", e)
+                cover_path = ""
                 # 继续处理，即使封面处理失败
         
         # 创建书籍对象
@@ -154,6 +156,73 @@ class BookShelf:
             total_count=total_count
         )
     
+    async def list_books_after(
+        self, 
+        ctx, 
+        sort_by: str = "created_at", 
+        sort_order: str = "desc", 
+        cursor: Optional[str] = None, 
+        per_page: int = 25
+    ) -> Tuple[List[Book], Optional[str], int]:
+        """
+        按游标列出书籍（键集分页），不统计总数
+        
+        Args:
+            ctx: 上下文
+            sort_by: 排序字段，不支持键集分页的字段按created_at处理
+            sort_order: 排序顺序 ("asc" 或 "desc")
+            cursor: 上一页返回的游标，为空时从第一页开始
+            per_page: 每页数量，超出1~100时使用默认值25
+            
+        Returns:
+            Tuple[List[Book], Optional[str], int]: 书籍列表、下一页游标（没有下一页时为None）和实际使用的每页数量
+            
+        Raises:
+            ValueError: 游标无效或与排序字段不匹配时抛出
+        """
+        if sort_by not in KEYSET_SORT_FIELDS:
+            sort_by = "created_at"
+        # 按存储库相同的规则校正，判断本页是否已满时与实际返回的数量比较
+        per_page = normalize_per_page(per_page)
+        
+        after = None
+        if cursor:
+            cursor_sort_by, value, book_id = decode_cursor(cursor)
+            if cursor_sort_by != sort_by:
+                raise ValueError(f"Cursor does not match sort field: {sort_by}")
+            if sort_by != "title":
+                try:
+                    value = datetime.datetime.fromisoformat(value)
+                except TypeError as e:
+                    raise ValueError(f"Invalid cursor: {cursor}") from e
+            after = (value, book_id)
+        
+        books = await self.repo.list_after(ctx, sort_by, sort_order, after, per_page)
+        
+        # 本页已满时才可能还有下一页
+        next_cursor = None
+        if books and len(books) == per_page:
+            last = books[-1]
+            next_cursor = encode_cursor(sort_by, getattr(last, sort_by), last.id)
+        
+        return books, next_cursor, per_page
+    
+    def next_cursor(self, books: PaginatedBookList, sort_by: str) -> Optional[str]:
+        """
+        为按页码分页的结果生成下一页游标，客户端可据此切换到键集分页
+        
+        Args:
+            books: 分页的书籍列表
+            sort_by: 排序字段
+            
+        Returns:
+            Optional[str]: 下一页游标，排序字段不支持键集分页或没有下一页时返回None
+        """
+        if sort_by not in KEYSET_SORT_FIELDS or not books.items or not books.has_next():
+            return None
+        last = books.items[-1]
+        return encode_cursor(sort_by, getattr(last, sort_by), last.id)
+    
     async def view_book(self, ctx, book_id: str) -> Book:
         """
         查看书籍详情
@@ -170,14 +239,14 @@ class BookShelf:
         """
         return await self.repo.get_by_id(ctx, book_id)
     
-    async def update_book_metadata(self, ctx, book_id: str, metadata: Book) -> Book:
+    async def update_book_metadata(self, ctx, book_id: str, metadata: BookUpdate) -> Book:
         """
         更新书籍元数据
         
         Args:
             ctx: 上下文
             book_id: 书籍ID
-            metadata: 包含要更新字段的书籍对象
+            metadata: 要更新的元数据，为空的字段保持不变
             
         Returns:
             Book: 更新后的书籍
@@ -188,20 +257,17 @@ class BookShelf:
         # 获取现有书籍
         book = await self.repo.get_by_id(ctx, book_id)
         
-        # 创建更新后的书籍对象
-        updated_book = Book(
-            id=book.id,
-            title=metadata.title if metadata.title else book.title,
-            author=metadata.author if metadata.author else book.author,
-            publisher=metadata.publisher if metadata.publisher else book.publisher,
-            year=metadata.year if metadata.year else book.year,
-            created_at=book.created_at,
+        # 创建更新后的书籍对象，只替换有值的元数据字段
+        changes = {
+            "title": metadata.title,
+            "author": metadata.author,
+            "publisher": metadata.publisher,
+            "year": metadata.year,
+            "isbn": metadata.isbn,
+        }
+        updated_book = book.replace(
             updated_at=datetime.datetime.now(),
-            isbn=metadata.isbn if metadata.isbn else book.isbn,
-            document_id=book.document_id,
-            file_path=book.file_path,
-            format=book.format,
-            cover_path=book.cover_path,
+            **{name: value for name, value in changes.items() if value}
         )
         
         # 更新书籍
@@ -226,12 +292,25 @@ class BookShelf:
         # 获取书籍
         book = await self.repo.get_by_id(ctx, book_id)
         
-        # 读取文件
+        return book, await self.read_book_file(book)
+    
+    async def read_book_file(self, book: Book) -> str:
+        """
+        从存储中读取书籍文件
+        
+        Args:
+            book: 书籍对象
+            
+        Returns:
+            str: 书籍文件路径
+            
+        Raises:
+            ValueError: 读取失败时抛出
+        """
         try:
-            file_path = await self.storage.read(book.file_path)
-            return book, file_path
+            return await self.storage.read(book.file_path)
         except Exception as e:
-            self.logger.error(f"Failed to read book file: {str(e)}")
+            self.logger.error("Failed to read book file: %s", e)
             raise ValueError(f"Failed to read book file: {str(e)}")
     
     async def view_cover(self, ctx, book_id: str) -> str:
@@ -251,14 +330,29 @@ class BookShelf:
         # 获取书籍
         book = await self.repo.get_by_id(ctx, book_id)
         
+        return await self.read_cover(book)
+    
+    async def read_cover(self, book: Book) -> str:
+        """
+        从存储中读取书籍封面
+        
+        Args:
+            book: 书籍对象
+            
+        Returns:
+            str: 封面文件的临时路径
+            
+        Raises:
+            ValueError: 没有封面或读取失败时抛出
+        """
         # 检查是否有封面
         if not book.cover_path:
-            raise ValueError(f"Book {book_id} has no cover")
+            raise ValueError(f"Book {book.id} has no cover")
         
         # 读取封面
         try:
             cover_path = await self.storage.read(book.cover_path)
             return cover_path
         except Exception as e:
-            self.logger.error(f"Failed to read cover file: {str(e)}")
+            self.logger.error("Failed to read cover file: %s", e)
             raise ValueError(f"Failed to read cover file: {str(e)}") 
\ No newline at end of file
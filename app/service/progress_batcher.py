@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from app.database import SessionLocal
+from app.entity.progress import Progress
+from app.repository.progress_repo import ProgressDatabaseRepo
+
+
+class ProgressBatcher:
+    """
+    进度写入合并队列。
+
+    KOReader翻页时会频繁推送进度，同一设备同一文档在一个刷新周期内的多次推送
+    只保留最新的一条，由后台任务定期批量写入数据库。
+    事件循环内单线程使用，不加锁。
+    """
+
+    def __init__(self, flush_interval: float = 0.5):
+        """
+        初始化合并队列
+
+        Args:
+            flush_interval: 刷新间隔（秒）
+        """
+        self.flush_interval = flush_interval
+        self.logger = logging.getLogger(__name__)
+        # (认证设备名称, 文档ID) -> 待写入的最新进度
+        self._pending: Dict[Tuple[str, str], Progress] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    def enqueue(self, progress: Progress) -> None:
+        """
+        加入待写入的进度，覆盖同一设备同一文档尚未写入的旧进度
+
+        Args:
+            progress: 进度数据
+        """
+        key = (progress.auth_device_name, progress.document)
+        pending = self._pending.get(key)
+        if pending is None or pending.timestamp <= progress.timestamp:
+            self._pending[key] = progress
+
+    def latest(self, document_id: str) -> Optional[Progress]:
+        """
+        获取文档尚未写入数据库的最新进度
+
+        Args:
+            document_id: 文档ID
+
+        Returns:
+            Optional[Progress]: 待写入的最新进度，不存在时返回None
+        """
+        latest = None
+        for (_, document), progress in self._pending.items():
+            if document == document_id and (latest is None or progress.timestamp > latest.timestamp):
+                latest = progress
+        return latest
+
+    def drain(self) -> List[Progress]:
+        """
+        取出所有待写入的进度
+
+        Returns:
+            List[Progress]: 待写入的进度列表
+        """
+        rows = list(self._pending.values())
+        self._pending.clear()
+        return rows
+
+    async def flush(self) -> None:
+        """将待写入的进度在一个事务中批量写入数据库，失败时放回队列等待下次重试"""
+        rows = self.drain()
+        if not rows:
+            return
+        try:
+            async with SessionLocal() as db:
+                await ProgressDatabaseRepo(db).store_many(None, rows)
+        except Exception as e:
+            self.logger.error("批量写入进度失败: %s", e)
+            # 放回队列，已有更新的进度时不覆盖
+            for progress in rows:
+                self.enqueue(progress)
+
+    async def _run(self) -> None:
+        """后台刷新循环，收到停止信号后写入剩余进度并退出"""
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def start(self) -> None:
+        """启动后台刷新任务"""
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台刷新任务，等待剩余的进度写入完成"""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+
+# 进程内共享的进度合并队列
+progress_batcher = ProgressBatcher()
@@ -4,6 +4,7 @@ from typing import Optional, List
 
 from app.entity.progress import Progress
 from app.repository.progress_repo import ProgressRepo
+from app.service.progress_batcher import ProgressBatcher
 
 
 class ProgressSync:
@@ -11,15 +12,18 @@ class ProgressSync:
     进度同步服务，处理KOReader的阅读进度同步。
     """
     
-    def __init__(self, progress_repo: ProgressRepo):
+    logger = logging.getLogger(__name__)
+    
+    def __init__(self, progress_repo: ProgressRepo, batcher: Optional[ProgressBatcher] = None):
         """
         初始化进度同步服务
         
         Args:
             progress_repo: 进度存储库
+            batcher: 进度合并队列，为空时每次同步直接写入存储库
         """
         self.progress_repo = progress_repo
-        self.logger = logging.getLogger(__name__)
+        self.batcher = batcher
     
     async def sync(self, ctx, progress_data: Progress) -> Progress:
         """
@@ -32,18 +36,31 @@ class ProgressSync:
         Returns:
             Progress: 同步后的进度数据
         """
-        self.logger.info(f"同步进度: {progress_data.document}")
+        self.logger.info("同步进度: %s", progress_data.document)
         
         # 获取最新的进度记录
-        history = await self.progress_repo.get_book_history(ctx, progress_data.document, 1)
+        latest = await self.fetch(ctx, progress_data.document)
         
         # 检查是否有更新的进度
-        if history and history[0].timestamp > progress_data.timestamp:
-            self.logger.info(f"服务器有更新的进度: {history[0].timestamp} > {progress_data.timestamp}")
-            return history[0]
+        if latest and latest.timestamp > progress_data.timestamp:
+            self.logger.info("服务器有更新的进度: %s > %s", latest.timestamp, progress_data.timestamp)
+            return latest
+        
+        # 同一设备的位置没有变化时（KOReader会反复推送相同进度）不再写入
+        if (
+            latest
+            and latest.device_id == progress_data.device_id
+            and latest.progress == progress_data.progress
+            and latest.percentage == progress_data.percentage
+        ):
+            self.logger.debug("进度未变化，跳过写入: %s", progress_data.document)
+            return latest
         
-        # 存储新的进度
-        await self.progress_repo.store(ctx, progress_data)
+        # 存储新的进度；有合并队列时入队后立即返回，由后台任务批量写入
+        if self.batcher:
+            self.batcher.enqueue(progress_data)
+        else:
+            await self.progress_repo.store(ctx, progress_data)
         
         # 确保有一个非空的时间戳
         if not progress_data.timestamp:
@@ -62,18 +79,28 @@ class ProgressSync:
         Returns:
             Optional[Progress]: 进度数据，如果不存在则返回None
         """
-        self.logger.info(f"获取进度: {document_id}")
+        self.logger.info("获取进度: %s", document_id)
         
-        # 获取最新的进度记录
+        # 获取最新的进度记录，尚未写入数据库的进度也需要考虑
         history = await self.progress_repo.get_book_history(ctx, document_id, 1)
+        pending = self.batcher.latest(document_id) if self.batcher else None
+        
+        if pending and (not history or pending.timestamp >= history[0].timestamp):
+            return pending
         
         if not history:
-            self.logger.info(f"未找到进度: {document_id}")
+            self.logger.info("未找到进度: %s", document_id)
             return None
         
         return history[0]
     
-    async def get_history(self, ctx, document_id: str, limit: int = 10) -> List[Progress]:
+    async def get_history(
+        self, 
+        ctx, 
+        document_id: str, 
+        limit: int = 10, 
+        before: Optional[int] = None
+    ) -> List[Progress]:
         """
         获取阅读历史
         
@@ -81,10 +108,11 @@ class ProgressSync:
             ctx: 上下文
             document_id: 文档ID
             limit: 返回的历史记录数量
+            before: 只返回时间戳早于该值的记录，用于继续翻页
             
         Returns:
             List[Progress]: 进度历史列表
         """
-        self.logger.info(f"获取历史: {document_id}, limit={limit}")
+        self.logger.info("获取历史: %s, limit=%s, before=%s", document_id, limit, before)
         
-        return await self.progress_repo.get_book_history(ctx, document_id, limit) 
\ No newline at end of file
+        return await self.progress_repo.get_book_history(ctx, document_id, limit, before) 
\ No newline at end of file
@@ -1,13 +1,21 @@
+import asyncio
 import logging
-import os
-import tempfile
 import sqlite3
-from typing import Optional, Dict, Any, List, IO
+from pathlib import Path
+from typing import Optional, Dict, Any, List, AsyncIterator
 import aiofiles
-import json
+import aiofiles.os
+import aiofiles.tempfile
+import orjson
 from datetime import datetime
 
 from app.storage import Storage
+from app.utils.cache import TTLCache, single_process
+
+
+# 设备名称 -> 统计摘要缓存，摘要只在上传新的统计数据库时变化；
+# 上传时只能更新本进程的缓存，未明确声明单进程运行时不缓存
+_summary_cache: TTLCache[Dict[str, Any]] = TTLCache(maxsize=1000 if single_process() else 0, ttl=300)
 
 
 class ReadingStats:
@@ -17,6 +25,8 @@ class ReadingStats:
     KOReader使用SQLite数据库存储阅读统计数据，该服务负责处理这些数据。
     """
     
+    logger = logging.getLogger(__name__)
+    
     def __init__(self, storage: Storage):
         """
         初始化阅读统计服务
@@ -25,56 +35,53 @@ class ReadingStats:
             storage: 存储接口，用于保存统计数据文件
         """
         self.storage = storage
-        self.logger = logging.getLogger(__name__)
     
-    async def write(self, ctx, data: IO, device_name: str) -> None:
+    async def write(self, ctx, data: AsyncIterator[bytes], device_name: str) -> None:
         """
         写入阅读统计数据
         
         Args:
             ctx: 上下文
-            data: 统计数据（SQLite数据库）
+            data: 统计数据（SQLite数据库）的字节块流
             device_name: 设备名称
             
         Raises:
+            ValueError: 统计数据为空时抛出
             IOError: 写入失败时抛出
         """
-        self.logger.info(f"写入统计数据: 设备={device_name}")
+        self.logger.info("写入统计数据: 设备=%s", device_name)
         
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".sqlite3") as temp_file:
-            # 保存上传的数据到临时文件
-            temp_file.write(data.read())
+        # 分块保存上传的数据到临时文件
+        size = 0
+        async with aiofiles.tempfile.NamedTemporaryFile("wb", delete=False, suffix=".sqlite3") as temp_file:
+            async for chunk in data:
+                size += len(chunk)
+                await temp_file.write(chunk)
             temp_path = temp_file.name
         
         try:
+            if not size:
+                raise ValueError("统计数据为空")
+            
             # 构建存储路径
             storage_path = f"stats/{device_name}/statistics.sqlite3"
             
             # 存储文件
             await self.storage.write(temp_path, storage_path)
             
-            # 提取并存储统计摘要
-            summary = self._extract_stats_summary(temp_path)
+            # 提取并存储统计摘要；查询SQLite是阻塞操作，在线程中执行以免阻塞事件循环
+            summary = await asyncio.to_thread(self._extract_stats_summary, temp_path)
             if summary:
-                # 将摘要转换为JSON
-                json_summary = json.dumps(summary)
-                
-                # 创建摘要临时文件
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".json") as summary_file:
-                    summary_file.write(json_summary.encode('utf-8'))
-                    summary_path = summary_file.name
-                
-                # 存储摘要文件
+                # 将摘要转换为JSON后直接写入存储，无需经过临时文件
                 summary_storage_path = f"stats/{device_name}/summary.json"
-                await self.storage.write(summary_path, summary_storage_path)
-                
-                # 删除临时文件
-                os.unlink(summary_path)
+                await self.storage.write_bytes(orjson.dumps(summary), summary_storage_path)
+                _summary_cache.set(device_name, summary)
         finally:
             # 删除临时文件
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+            try:
+                await aiofiles.os.remove(temp_path)
+            except FileNotFoundError:
+                pass
     
     async def read(self, ctx, device_name: str) -> Optional[str]:
         """
@@ -90,7 +97,7 @@ class ReadingStats:
         Raises:
             FileNotFoundError: 文件不存在时抛出
         """
-        self.logger.info(f"读取统计数据: 设备={device_name}")
+        self.logger.info("读取统计数据: 设备=%s", device_name)
         
         try:
             # 构建存储路径
@@ -99,7 +106,7 @@ class ReadingStats:
             # 读取文件
             return await self.storage.read(storage_path)
         except FileNotFoundError:
-            self.logger.warning(f"未找到统计数据: 设备={device_name}")
+            self.logger.warning("未找到统计数据: 设备=%s", device_name)
             return None
     
     async def get_summary(self, ctx, device_name: str) -> Dict[str, Any]:
@@ -113,7 +120,11 @@ class ReadingStats:
         Returns:
             Dict[str, Any]: 统计摘要，如果不存在则返回空字典
         """
-        self.logger.info(f"获取统计摘要: 设备={device_name}")
+        self.logger.info("获取统计摘要: 设备=%s", device_name)
+        
+        cached = _summary_cache.get(device_name)
+        if cached is not None:
+            return cached
         
         try:
             # 构建存储路径
@@ -123,11 +134,13 @@ class ReadingStats:
             temp_path = await self.storage.read(storage_path)
             
             # 读取JSON数据
-            async with aiofiles.open(temp_path, 'r') as f:
+            async with aiofiles.open(temp_path, 'rb') as f:
                 data = await f.read()
-                return json.loads(data)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            self.logger.warning(f"获取统计摘要失败: {str(e)}")
+            summary = orjson.loads(data)
+            _summary_cache.set(device_name, summary)
+            return summary
+        except (FileNotFoundError, orjson.JSONDecodeError) as e:
+            self.logger.warning("获取统计摘要失败: %s", e)
             return {}
     
     async def list_devices(self, ctx) -> List[str]:
@@ -165,28 +178,33 @@ class ReadingStats:
         }
         
         try:
-            # 连接数据库
-            conn = sqlite3.connect(db_path)
+            # 以只读、不可变方式打开上传的数据库：SQLite不创建日志文件、不加锁，
+            # 排序用的临时数据放在内存中，查询过程不产生任何写操作
+            conn = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro&immutable=1", uri=True)
             conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA temp_store=MEMORY")
             cursor = conn.cursor()
             
-            # 获取总统计数据
-            cursor.execute("SELECT COUNT(*) as total_books, SUM(pages) as total_pages, SUM(duration) as total_time FROM book")
-            row = cursor.fetchone()
-            if row:
-                summary["total_books"] = row["total_books"] or 0
-                summary["total_pages"] = row["total_pages"] or 0
-                summary["total_time"] = row["total_time"] or 0
-            
-            # 获取最近阅读的书籍
+            # 一次查询同时取得总统计数据和最近阅读的书籍：
+            # 窗口函数在LIMIT之前对整张表求和，每一行都带有相同的总计
             cursor.execute("""
-                SELECT title, authors, pages, duration, last_open
+                SELECT title, authors, pages, duration, last_open,
+                       COUNT(*) OVER () AS total_books,
+                       SUM(pages) OVER () AS total_pages,
+                       SUM(duration) OVER () AS total_time
                 FROM book
                 ORDER BY last_open DESC
                 LIMIT 10
             """)
             
-            for row in cursor.fetchall():
+            rows = cursor.fetchall()
+            if rows:
+                # 没有书籍时不返回任何行，总计保持为0
+                summary["total_books"] = rows[0]["total_books"] or 0
+                summary["total_pages"] = rows[0]["total_pages"] or 0
+                summary["total_time"] = rows[0]["total_time"] or 0
+            
+            for row in rows:
                 book = {
                     "title": row["title"],
                     "authors": row["authors"],
@@ -199,5 +217,5 @@ class ReadingStats:
             conn.close()
             return summary
         except sqlite3.Error as e:
-            self.logger.error(f"提取统计摘要失败: {str(e)}")
+            self.logger.error("提取统计摘要失败: %s", e)
             return summary 
\ No newline at end of file
@@ -1,7 +1,9 @@
+import asyncio
 import os
 import tempfile
+import aiofiles.os
 from abc import ABC, abstractmethod
-from typing import Optional, BinaryIO
+from typing import List, Optional, BinaryIO, Tuple
 
 
 class Storage(ABC):
@@ -24,6 +26,40 @@ class Storage(ABC):
         """
         pass
     
+    async def write_bytes(self, data: bytes, destination_path: str) -> None:
+        """
+        将内存中的数据直接写入到存储中。
+        
+        默认实现先写入临时文件再调用write，支持直接写入数据的实现应覆盖此方法。
+        
+        Args:
+            data: 文件内容
+            destination_path: 目标存储路径
+            
+        Raises:
+            IOError: 写入失败时抛出
+        """
+        temp_path = await create_temp_file(data)
+        try:
+            await self.write(temp_path, destination_path)
+        finally:
+            await aiofiles.os.remove(temp_path)
+    
+    async def write_many(self, files: List[Tuple[str, str]]) -> None:
+        """
+        批量将文件写入到存储中。
+        
+        默认实现逐个调用write，支持批量提交的实现应覆盖此方法。
+        
+        Args:
+            files: (源文件路径, 目标存储路径)列表
+            
+        Raises:
+            IOError: 写入失败时抛出
+        """
+        for source_path, destination_path in files:
+            await self.write(source_path, destination_path)
+    
     @abstractmethod
     async def read(self, filepath: str) -> Optional[os.PathLike]:
         """
@@ -42,21 +78,53 @@ class Storage(ABC):
         pass
 
 
+def _read_all(path: str) -> bytes:
+    """同步读取整个文件"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+async def read_file(path: str) -> bytes:
+    """
+    读取整个文件的内容。
+    
+    打开和读取在同一次线程切换中完成，比aiofiles分别派发open和read少一次线程池往返。
+    
+    Args:
+        path: 文件路径
+        
+    Returns:
+        文件内容
+    """
+    return await asyncio.to_thread(_read_all, path)
+
+
+def _dump(content: bytes) -> str:
+    """同步创建临时文件并写入全部内容"""
+    fd, path = tempfile.mkstemp()
+    try:
+        view = memoryview(content)
+        # os.write可能只写入部分数据，循环直到全部写完
+        while view:
+            view = view[os.write(fd, view):]
+    except BaseException:
+        os.close(fd)
+        os.remove(path)
+        raise
+    os.close(fd)
+    return path
+
+
 async def create_temp_file(content: bytes) -> str:
     """
     创建一个包含指定内容的临时文件。
     
+    创建、写入和关闭在同一次线程切换中完成，直接写入文件描述符，不经过Python的文件缓冲。
+    
     Args:
         content: 要写入临时文件的字节内容
         
     Returns:
         临时文件路径
     """
-    fd, path = tempfile.mkstemp()
-    try:
-        with os.fdopen(fd, 'wb') as f:
-            f.write(content)
-        return path
-    except:
-        os.unlink(path)
-        raise 
\ No newline at end of file
+    return await asyncio.to_thread(_dump, content)
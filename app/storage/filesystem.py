@@ -1,7 +1,9 @@
+import asyncio
 import os
 import shutil
 import aiofiles
-from typing import Optional
+import aiofiles.os
+from typing import Optional, Set
 from pathlib import Path
 
 from app.storage.base import Storage
@@ -22,6 +24,15 @@ class FilesystemStorage(Storage):
         self.base_dir = Path(base_dir)
         # 确保基础目录存在
         os.makedirs(self.base_dir, exist_ok=True)
+        # 已确认存在的目录，避免每次写入都调用makedirs
+        self._known_dirs: Set[str] = set()
+    
+    async def _ensure_parent(self, full_path: Path) -> None:
+        """确保文件所在目录存在"""
+        parent = os.path.dirname(full_path)
+        if parent not in self._known_dirs:
+            await aiofiles.os.makedirs(parent, exist_ok=True)
+            self._known_dirs.add(parent)
     
     async def write(self, source_path: str, destination_path: str) -> None:
         """
@@ -39,10 +50,31 @@ class FilesystemStorage(Storage):
             full_dest_path = self.base_dir / destination_path
             
             # 确保目标目录存在
-            os.makedirs(os.path.dirname(full_dest_path), exist_ok=True)
+            await self._ensure_parent(full_dest_path)
+            
+            # 在线程中复制文件，避免阻塞事件循环；
+            # copyfile在Linux上使用sendfile在内核中复制，不复制权限和时间戳等元数据。
+            # 源文件在写入后仍会被调用方使用（如提取统计摘要），不能直接rename
+            await asyncio.to_thread(shutil.copyfile, source_path, full_dest_path)
+        except Exception as e:
+            raise IOError(f"Failed to write file to filesystem: {str(e)}") from e
+    
+    async def write_bytes(self, data: bytes, destination_path: str) -> None:
+        """
+        将数据直接写入到文件系统存储中。
+        
+        Args:
+            data: 文件内容
+            destination_path: 目标存储路径（相对于基础目录）
             
-            # 复制文件
-            shutil.copy2(source_path, full_dest_path)
+        Raises:
+            IOError: 写入失败时抛出
+        """
+        try:
+            full_dest_path = self.base_dir / destination_path
+            await self._ensure_parent(full_dest_path)
+            async with aiofiles.open(full_dest_path, 'wb') as f:
+                await f.write(data)
         except Exception as e:
             raise IOError(f"Failed to write file to filesystem: {str(e)}") from e
     
@@ -62,7 +94,7 @@ class FilesystemStorage(Storage):
         """
         full_path = self.base_dir / filepath
         
-        if not os.path.exists(full_path):
+        if not await aiofiles.os.path.exists(full_path):
             raise FileNotFoundError(f"File not found in filesystem: {filepath}")
         
         return full_path 
\ No newline at end of file
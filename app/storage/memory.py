@@ -1,9 +1,8 @@
 import os
-import aiofiles
 from typing import Dict, Optional
 from pathlib import Path
 
-from app.storage.base import Storage, create_temp_file
+from app.storage.base import Storage, create_temp_file, read_file
 
 
 class MemoryStorage(Storage):
@@ -16,6 +15,8 @@ class MemoryStorage(Storage):
         """初始化内存存储。"""
         # 使用字典存储文件内容，键是文件路径，值是文件内容
         self._files: Dict[str, bytes] = {}
+        # 已导出的临时文件：存储路径 -> 临时文件路径，内容不变时重复读取直接复用
+        self._temp_paths: Dict[str, str] = {}
     
     async def write(self, source_path: str, destination_path: str) -> None:
         """
@@ -29,13 +30,25 @@ class MemoryStorage(Storage):
             IOError: 写入失败时抛出
         """
         try:
-            async with aiofiles.open(source_path, 'rb') as f:
-                content = await f.read()
+            content = await read_file(source_path)
             
             self._files[destination_path] = content
+            self._temp_paths.pop(destination_path, None)
         except Exception as e:
             raise IOError(f"Failed to write file to memory: {str(e)}") from e
     
+    async def write_bytes(self, data: bytes, destination_path: str) -> None:
+        """
+        将数据直接写入到内存存储中。
+        
+        Args:
+            data: 文件内容
+            destination_path: 目标存储路径
+        """
+        self._files[destination_path] = data
+        # 旧的临时文件可能仍在被响应读取，只解除关联，不删除
+        self._temp_paths.pop(destination_path, None)
+    
     async def read(self, filepath: str) -> Optional[os.PathLike]:
         """
         从内存存储中读取文件并返回临时文件路径。
@@ -53,14 +66,26 @@ class MemoryStorage(Storage):
         if filepath not in self._files:
             raise FileNotFoundError(f"File not found in memory: {filepath}")
         
+        temp_path = self._temp_paths.get(filepath)
+        if temp_path is not None and os.path.exists(temp_path):
+            return temp_path
+        
         try:
-            return await create_temp_file(self._files[filepath])
+            temp_path = await create_temp_file(self._files[filepath])
+            self._temp_paths[filepath] = temp_path
+            return temp_path
         except Exception as e:
             raise IOError(f"Failed to create temporary file: {str(e)}") from e
     
     def clear(self) -> None:
-        """清除所有存储的文件。"""
+        """清除所有存储的文件，并删除已导出的临时文件。"""
         self._files.clear()
+        for temp_path in self._temp_paths.values():
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        self._temp_paths.clear()
     
     def get_file_content(self, filepath: str) -> Optional[bytes]:
         """
@@ -1,22 +1,51 @@
+import asyncio
+import datetime
 import os
-import aiofiles
-from typing import Optional
-from sqlalchemy import Column, String, LargeBinary, DateTime, func
+import tempfile
+from typing import BinaryIO, Dict, List, Optional, Tuple
+from sqlalchemy import String, LargeBinary, DateTime, bindparam, func
+from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.future import select
 
 from app.database import Base
-from app.storage.base import Storage, create_temp_file
+from app.storage.base import Storage, read_file
 
 
 class FileModel(Base):
     """存储在PostgreSQL中的文件的SQLAlchemy ORM模型"""
     __tablename__ = "files"
     
-    filepath = Column(String, primary_key=True)
-    content = Column(LargeBinary, nullable=False)
-    created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    filepath: Mapped[str] = mapped_column(String, primary_key=True)
+    content: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    created_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, server_default=func.now())
+    updated_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+# 分块读取的块大小，读取大文件时内存占用限制在一个块以内
+_CHUNK_SIZE = 1024 * 1024
+
+# 写入文件内容，已存在时直接覆盖，无需先查询
+_UPSERT_FILE = pg_insert(FileModel).values(
+    filepath=bindparam("filepath"),
+    content=bindparam("content", type_=LargeBinary)
+)
+_UPSERT_FILE = _UPSERT_FILE.on_conflict_do_update(
+    index_elements=[FileModel.filepath],
+    set_={"content": _UPSERT_FILE.excluded.content, "updated_at": func.now()}
+)
+
+# 读取文件总长度和第一个块，小文件一次查询即可读完
+_FIRST_CHUNK = select(
+    func.length(FileModel.content),
+    func.substring(FileModel.content, 1, _CHUNK_SIZE)
+).where(FileModel.filepath == bindparam("filepath"))
+
+# 读取从指定位置（从1开始）开始的一个块
+_NEXT_CHUNK = select(
+    func.substring(FileModel.content, bindparam("start"), _CHUNK_SIZE)
+).where(FileModel.filepath == bindparam("filepath"))
 
 
 class PostgresStorage(Storage):
@@ -32,6 +61,8 @@ class PostgresStorage(Storage):
             db: SQLAlchemy异步会话
         """
         self.db = db
+        # 本会话内已读取过的文件：存储路径 -> 临时文件路径
+        self._read_cache: Dict[str, str] = {}
     
     async def write(self, source_path: str, destination_path: str) -> None:
         """
@@ -44,25 +75,58 @@ class PostgresStorage(Storage):
         Raises:
             IOError: 写入失败时抛出
         """
+        # 整个文件作为一个值写入：逐块追加（content || chunk）每次都会重写整个TOAST值，
+        # 代价随文件大小平方增长，比一次写入更慢
         try:
-            async with aiofiles.open(source_path, 'rb') as f:
-                content = await f.read()
-            
-            file_obj = FileModel(
-                filepath=destination_path,
-                content=content
-            )
-            
-            # 检查文件是否已存在
-            stmt = select(FileModel).where(FileModel.filepath == destination_path)
-            result = await self.db.execute(stmt)
-            existing_file = result.scalar_one_or_none()
+            content = await read_file(source_path)
+        except Exception as e:
+            raise IOError(f"Failed to write file to PostgreSQL: {str(e)}") from e
+        
+        await self.write_bytes(content, destination_path)
+    
+    async def write_many(self, files: List[Tuple[str, str]]) -> None:
+        """
+        批量将文件写入到PostgreSQL存储中，所有文件在一个事务中提交。
+        
+        每个文件整体读入内存，适合导入大量较小的文件。
+        
+        Args:
+            files: (源文件路径, 目标存储路径)列表
             
-            if existing_file:
-                existing_file.content = content
-            else:
-                self.db.add(file_obj)
+        Raises:
+            IOError: 写入失败时抛出
+        """
+        if not files:
+            return
+        try:
+            rows = []
+            for source_path, destination_path in files:
+                rows.append({"filepath": destination_path, "content": await read_file(source_path)})
+                self._read_cache.pop(destination_path, None)
+            await self.db.execute(_UPSERT_FILE, rows)
+            await self.db.commit()
+        except Exception as e:
+            await self.db.rollback()
+            raise IOError(f"Failed to write files to PostgreSQL: {str(e)}") from e
+    
+    async def _put(self, data: bytes, destination_path: str) -> None:
+        """写入文件内容，不提交事务"""
+        self._read_cache.pop(destination_path, None)
+        await self.db.execute(_UPSERT_FILE, {"filepath": destination_path, "content": data})
+    
+    async def write_bytes(self, data: bytes, destination_path: str) -> None:
+        """
+        将数据直接写入到PostgreSQL存储中。
+        
+        Args:
+            data: 文件内容
+            destination_path: 目标存储路径
             
+        Raises:
+            IOError: 写入失败时抛出
+        """
+        try:
+            await self._put(data, destination_path)
             await self.db.commit()
             
         except Exception as e:
@@ -83,14 +147,36 @@ class PostgresStorage(Storage):
             FileNotFoundError: 文件不存在时抛出
             IOError: 读取失败时抛出
         """
-        stmt = select(FileModel).where(FileModel.filepath == filepath)
-        result = await self.db.execute(stmt)
-        file_obj = result.scalar_one_or_none()
+        cached = self._read_cache.get(filepath)
+        if cached is not None:
+            return cached
+        
+        result = await self.db.execute(_FIRST_CHUNK, {"filepath": filepath})
+        row = result.first()
         
-        if not file_obj:
+        if not row:
             raise FileNotFoundError(f"File not found in PostgreSQL: {filepath}")
         
+        size, chunk = row
         try:
-            return await create_temp_file(file_obj.content)
+            fd, path = await asyncio.to_thread(tempfile.mkstemp)
+            target: BinaryIO = os.fdopen(fd, 'wb')
+            try:
+                # 逐块读取并写入临时文件，不在内存中保留整个文件
+                written = 0
+                while True:
+                    await asyncio.to_thread(target.write, chunk)
+                    written += len(chunk)
+                    if written >= size or len(chunk) < _CHUNK_SIZE:
+                        break
+                    result = await self.db.execute(_NEXT_CHUNK, {"filepath": filepath, "start": written + 1})
+                    chunk = result.scalar_one()
+            except BaseException:
+                await asyncio.to_thread(target.close)
+                await asyncio.to_thread(os.remove, path)
+                raise
+            await asyncio.to_thread(target.close)
+            self._read_cache[filepath] = path
+            return path
         except Exception as e:
-            raise IOError(f"Failed to read file from PostgreSQL: {str(e)}") from e 
\ No newline at end of file
+            raise IOError(f"Failed to read file from PostgreSQL: {str(e)}") from e
@@ -0,0 +1,104 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Generic, Hashable, Optional, TypeVar
+
+# 类型变量，用于缓存值
+V = TypeVar('V')
+
+
+def single_process() -> bool:
+    """
+    是否只有一个工作进程
+
+    写入时主动失效的进程内缓存只能清除本进程的条目，多进程部署时应当禁用。
+    工作进程数按uvicorn和gunicorn共用的WEB_CONCURRENCY环境变量判断，run.py会按--workers设置它。
+    直接执行uvicorn --workers不会设置该变量，因此未设置时按多进程处理，
+    只有明确声明单进程时才启用这类缓存。
+
+    Returns:
+        bool: WEB_CONCURRENCY已设置且其值不大于1时返回True
+    """
+    try:
+        return int(os.environ.get("WEB_CONCURRENCY", "0")) == 1
+    except ValueError:
+        return False
+
+
+class TTLCache(Generic[V]):
+    """
+    带过期时间的LRU缓存，用于进程内缓存认证结果等短期数据。
+
+    超过容量时淘汰最久未使用的条目；条目在写入ttl秒后过期。
+    事件循环内单线程使用，不加锁。
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        初始化缓存
+
+        Args:
+            maxsize: 最大条目数，为0时不缓存任何条目
+            ttl: 条目有效期（秒）
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Optional[V] = None) -> Optional[V]:
+        """
+        获取未过期的缓存值
+
+        Args:
+            key: 缓存键
+            default: 未命中时返回的默认值
+
+        Returns:
+            缓存值，未命中或已过期时返回default
+        """
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: V, ttl: Optional[float] = None) -> None:
+        """
+        写入缓存值
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 本条目的有效期（秒），为空时使用缓存默认值
+        """
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        删除并返回缓存值
+
+        Args:
+            key: 缓存键
+            default: 不存在时返回的默认值
+
+        Returns:
+            被删除的缓存值（可能已过期），不存在时返回default
+        """
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self) -> None:
+        """清除所有缓存条目"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
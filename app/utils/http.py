@@ -0,0 +1,74 @@
+import base64
+import hashlib
+from typing import Optional, Tuple
+
+from fastapi import Request, Response, status
+
+
+# 书籍文件和封面写入后不再改变，客户端可长期缓存；需要认证，因此不允许共享缓存
+IMMUTABLE_CACHE_CONTROL = "private, max-age=86400, immutable"
+
+
+def parse_basic_auth(auth_header: Optional[str]) -> Optional[Tuple[str, str]]:
+    """
+    解析Basic认证头
+
+    只做一次base64解码，在字节串上按第一个冒号切分后再分别解码。
+
+    Args:
+        auth_header: Authorization请求头的值
+
+    Returns:
+        Optional[Tuple[str, str]]: (用户名, 密码)，请求头缺失或格式无效时返回None
+    """
+    if not auth_header or len(auth_header) < 7 or auth_header[:6] != "Basic ":
+        return None
+    try:
+        raw = base64.b64decode(auth_header[6:], validate=True)
+        identifier, sep, password = raw.partition(b":")
+        if not sep:
+            return None
+        return identifier.decode("utf-8"), password.decode("utf-8")
+    except ValueError:
+        # binascii.Error和UnicodeDecodeError均为ValueError的子类
+        return None
+
+
+def content_etag(*parts: str) -> str:
+    """
+    根据标识内容的字符串计算强ETag
+
+    Args:
+        parts: 能唯一标识内容版本的字符串，如书籍ID和文件哈希
+
+    Returns:
+        str: 带引号的ETag
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        digest.update(f"{part}:".encode("utf-8"))
+    return f'"{digest.hexdigest()}"'
+
+
+def not_modified(request: Request, etag: str, headers: Optional[dict] = None) -> Optional[Response]:
+    """
+    如果客户端缓存的ETag仍然有效，返回304响应，否则返回None
+
+    Args:
+        request: 请求对象
+        etag: 当前内容的ETag
+        headers: 304响应需要附带的其他响应头，如Cache-Control
+
+    Returns:
+        Optional[Response]: 304响应，ETag不匹配时返回None
+    """
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return None
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    if etag in tags or "*" in tags:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={**(headers or {}), "ETag": etag}
+        )
+    return None
@@ -0,0 +1,44 @@
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Optional
+
+
+class QueueStreamHandler(logging.handlers.QueueHandler):
+    """
+    经由队列写入stdout的日志处理器
+
+    记录日志时只把记录放入队列，格式化和write()由本进程的后台QueueListener线程完成，
+    处理请求时记录日志不会阻塞在stdout上。监听线程随处理器创建，
+    通过uvicorn的log_config配置时每个工作进程和热重载子进程都有各自的监听线程。
+    """
+
+    def __init__(self) -> None:
+        # 先创建目标处理器：logging.shutdown按创建的逆序关闭处理器，
+        # 本处理器关闭时写出剩余记录，目标处理器此时仍然可用
+        target = logging.StreamHandler(sys.stdout)
+        super().__init__(queue.SimpleQueue())
+        self._target = target
+        self._listener: Optional[logging.handlers.QueueListener] = (
+            logging.handlers.QueueListener(self.queue, target)
+        )
+        self._listener.start()
+
+    def setFormatter(self, fmt: Optional[logging.Formatter]) -> None:
+        """
+        设置日志格式
+
+        格式只用于目标处理器；入队前的记录只合并消息参数，不再套用一遍格式。
+
+        Args:
+            fmt: 日志格式
+        """
+        self._target.setFormatter(fmt)
+
+    def close(self) -> None:
+        """停止监听线程并写出队列中剩余的日志，可重复调用"""
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+        super().close()
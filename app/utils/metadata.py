@@ -1,3 +1,4 @@
+import base64
 import os
 import io
 import logging
@@ -6,11 +7,11 @@ from PIL import Image
 from io import BytesIO
 
 # 导入支持不同电子书格式的库
-import ebooklib
-from ebooklib import epub
-import PyPDF2
+import pikepdf
+import posixpath
 import zipfile
 import xml.etree.ElementTree as ET
+from urllib.parse import unquote
 
 logger = logging.getLogger(__name__)
 
@@ -55,11 +56,11 @@ def extract_book_metadata(file_path: str) -> BookMetadata:
         elif ext == ".fb2":
             metadata = extract_fb2_metadata(file_path)
         else:
-            logger.warning(f"Unsupported book format: {ext}")
+            logger.warning("Unsupported book format: %s", ext)
             # 保存格式信息，即使无法提取其他元数据
             metadata.format = ext.lstrip(".")
     except Exception as e:
-        logger.error(f"Error extracting metadata from {file_path}: {str(e)}")
+        logger.error("Error extracting metadata from %s: %s", file_path, e)
     
     # 如果标题为空，使用文件名作为标题
     if not metadata.title:
@@ -68,39 +69,88 @@ def extract_book_metadata(file_path: str) -> BookMetadata:
     return metadata
 
 
+# EPUB中用到的XML命名空间
+_CONTAINER_NS = '{urn:oasis:names:tc:opendocument:xmlns:container}'
+_OPF_NS = '{http://www.idpf.org/2007/opf}'
+_DC_NS = '{http://purl.org/dc/elements/1.1/}'
+
+
+def _dc_text(opf_metadata: ET.Element, name: str) -> str:
+    """获取OPF元数据中第一个指定Dublin Core元素的文本"""
+    elem = opf_metadata.find(_DC_NS + name)
+    return (elem.text or '').strip() if elem is not None else ''
+
+
+def _epub_cover_href(opf_metadata: ET.Element, manifest: ET.Element) -> Optional[str]:
+    """在OPF清单中查找封面图像的路径（相对于OPF文件）"""
+    items = manifest.findall(_OPF_NS + 'item')
+    
+    # EPUB 2：<meta name="cover" content="封面条目ID"/>
+    for meta in opf_metadata.iter(_OPF_NS + 'meta'):
+        if meta.get('name') == 'cover':
+            cover_id = meta.get('content')
+            for item in items:
+                if item.get('id') == cover_id:
+                    return item.get('href')
+    
+    # EPUB 3：properties中带有cover-image的条目
+    for item in items:
+        if 'cover-image' in (item.get('properties') or '').split():
+            return item.get('href')
+    
+    # 没有声明封面时，取ID或文件名中带有cover的图像
+    for item in items:
+        if (item.get('media-type') or '').startswith('image/'):
+            if 'cover' in (item.get('id') or '').lower() or 'cover' in (item.get('href') or '').lower():
+                return item.get('href')
+    return None
+
+
 def extract_epub_metadata(file_path: str) -> BookMetadata:
-    """从EPUB文件中提取元数据"""
+    """
+    从EPUB文件中提取元数据
+    
+    直接从ZIP中读取container.xml和OPF文件，只解析元数据和清单，
+    不加载章节内容；封面只读取对应的一个条目。
+    """
     metadata = BookMetadata()
     metadata.format = "epub"
     
     try:
-        book = epub.read_epub(file_path)
-        
-        # 提取标题和作者
-        if book.get_metadata('DC', 'title'):
-            metadata.title = book.get_metadata('DC', 'title')[0][0]
-        
-        if book.get_metadata('DC', 'creator'):
-            metadata.author = book.get_metadata('DC', 'creator')[0][0]
-        
-        # 提取出版商
-        if book.get_metadata('DC', 'publisher'):
-            metadata.publisher = book.get_metadata('DC', 'publisher')[0][0]
-        
-        # 提取ISBN
-        for identifier in book.get_metadata('DC', 'identifier'):
-            if 'isbn' in str(identifier).lower():
-                metadata.isbn = identifier[0]
-                break
-        
-        # 提取封面
-        for item in book.get_items_of_type(ebooklib.ITEM_IMAGE):
-            if 'cover' in item.id.lower() or 'cover' in item.file_name.lower():
-                metadata.cover = item.content
-                break
+        with zipfile.ZipFile(file_path) as z:
+            container = ET.fromstring(z.read('META-INF/container.xml'))
+            rootfile = container.find(f'.//{_CONTAINER_NS}rootfile')
+            opf_path = rootfile.get('full-path')
+            package = ET.fromstring(z.read(opf_path))
+            
+            opf_metadata = package.find(_OPF_NS + 'metadata')
+            if opf_metadata is None:
+                return metadata
+            
+            # 提取标题、作者和出版商
+            metadata.title = _dc_text(opf_metadata, 'title')
+            metadata.author = _dc_text(opf_metadata, 'creator')
+            metadata.publisher = _dc_text(opf_metadata, 'publisher')
+            
+            # 提取ISBN
+            for identifier in opf_metadata.findall(_DC_NS + 'identifier'):
+                text = (identifier.text or '').strip()
+                if 'isbn' in text.lower() or any('isbn' in str(v).lower() for v in identifier.attrib.values()):
+                    metadata.isbn = text
+                    break
+            
+            # 提取封面
+            manifest = package.find(_OPF_NS + 'manifest')
+            href = _epub_cover_href(opf_metadata, manifest) if manifest is not None else None
+            if href:
+                cover_path = posixpath.normpath(posixpath.join(posixpath.dirname(opf_path), unquote(href)))
+                try:
+                    metadata.cover = z.read(cover_path)
+                except KeyError:
+                    logger.warning("EPUB cover not found in archive: %s", cover_path)
         
     except Exception as e:
-        logger.error(f"Error extracting EPUB metadata: {str(e)}")
+        logger.error("Error extracting EPUB metadata: %s", e)
     
     return metadata
 
@@ -111,26 +161,26 @@ def extract_pdf_metadata(file_path: str) -> BookMetadata:
     metadata.format = "pdf"
     
     try:
-        with open(file_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            info = reader.metadata
+        # pikepdf（qpdf）只读取交叉引用表和Info字典，对象按需解析，不会加载页面内容
+        with pikepdf.open(file_path) as pdf:
+            info = pdf.trailer.get('/Info')
             
-            if info:
+            if info is not None:
                 if info.get('/Title'):
-                    metadata.title = info.get('/Title')
+                    metadata.title = str(info.get('/Title'))
                 
                 if info.get('/Author'):
-                    metadata.author = info.get('/Author')
+                    metadata.author = str(info.get('/Author'))
                 
                 if info.get('/Publisher'):
-                    metadata.publisher = info.get('/Publisher')
+                    metadata.publisher = str(info.get('/Publisher'))
                 
                 # PDF文件通常没有存储封面图像的标准方式
                 # 一种方法是使用第一页作为封面
                 # 但这需要额外的PDF渲染库，如Pillow或MuPDF
     
     except Exception as e:
-        logger.error(f"Error extracting PDF metadata: {str(e)}")
+        logger.error("Error extracting PDF metadata: %s", e)
     
     return metadata
 
@@ -154,11 +204,76 @@ def extract_mobi_metadata(file_path: str) -> BookMetadata:
             metadata.author = author_part
     
     except Exception as e:
-        logger.error(f"Error extracting MOBI metadata: {str(e)}")
+        logger.error("Error extracting MOBI metadata: %s", e)
     
     return metadata
 
 
+# FB2中用到的XML命名空间
+_FB2_NS = '{http://www.gribuser.ru/xml/fictionbook/2.0}'
+_XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+
+
+def _fb2_text(parent: ET.Element, tag: str) -> str:
+    """获取FB2元素下第一个指定子元素的文本"""
+    elem = parent.find(_FB2_NS + tag)
+    return elem.text.strip() if elem is not None and elem.text else ''
+
+
+def _parse_fb2(source, metadata: BookMetadata) -> None:
+    """
+    流式解析FB2文档，填充元数据
+    
+    元数据位于文档开头的<description>中，正文和图像在其后。
+    正文元素解析完即清空，找到封面图像后立即停止，不构建整棵树。
+    """
+    cover_id = None
+    in_description = False
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        tag = elem.tag
+        if event == 'start':
+            if tag == _FB2_NS + 'description':
+                in_description = True
+            continue
+        
+        if tag == _FB2_NS + 'title-info':
+            metadata.title = _fb2_text(elem, 'book-title')
+            
+            # 提取作者
+            author_elem = elem.find(_FB2_NS + 'author')
+            if author_elem is not None:
+                author_parts = [_fb2_text(author_elem, 'first-name'), _fb2_text(author_elem, 'last-name')]
+                metadata.author = ' '.join(part for part in author_parts if part)
+            
+            # 封面图像的ID由<coverpage><image l:href="#ID"/>声明
+            image = elem.find(f'{_FB2_NS}coverpage/{_FB2_NS}image')
+            if image is not None:
+                cover_id = (image.get(_XLINK_HREF) or image.get('href') or '').lstrip('#') or None
+        elif tag == _FB2_NS + 'publish-info':
+            metadata.publisher = _fb2_text(elem, 'publisher')
+            metadata.isbn = _fb2_text(elem, 'isbn')
+        elif tag == _FB2_NS + 'description':
+            in_description = False
+        elif tag == _FB2_NS + 'binary':
+            binary_id = elem.get('id', '')
+            if cover_id is not None:
+                is_cover = binary_id == cover_id
+            else:
+                # 没有声明封面时，取ID以cover开头的图像
+                is_cover = (elem.get('content-type', '').startswith('image/')
+                            and binary_id.lower().startswith('cover'))
+            if is_cover and elem.text:
+                try:
+                    metadata.cover = base64.b64decode(elem.text)
+                    return
+                except Exception as e:
+                    logger.error("Error decoding cover image: %s", e)
+        
+        # <description>之外的元素处理完后立即清空，释放正文内容
+        if not in_description:
+            elem.clear()
+
+
 def extract_fb2_metadata(file_path: str) -> BookMetadata:
     """从FB2文件中提取元数据"""
     metadata = BookMetadata()
@@ -173,65 +288,15 @@ def extract_fb2_metadata(file_path: str) -> BookMetadata:
                 fb2_files = [f for f in z.namelist() if f.endswith('.fb2')]
                 if fb2_files:
                     with z.open(fb2_files[0]) as f:
-                        tree = ET.parse(f)
-                        root = tree.getroot()
+                        _parse_fb2(f, metadata)
                 else:
-                    logger.warning(f"No FB2 file found in ZIP: {file_path}")
-                    return metadata
+                    logger.warning("No FB2 file found in ZIP: %s", file_path)
         except zipfile.BadZipFile:
             # 不是ZIP文件，直接解析
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-        
-        # 提取元数据
-        ns = {'fb': 'http://www.gribuser.ru/xml/fictionbook/2.0'}
-        
-        # 提取标题
-        title_elem = root.find('.//fb:book-title', ns)
-        if title_elem is not None and title_elem.text:
-            metadata.title = title_elem.text
-        
-        # 提取作者
-        author_elem = root.find('.//fb:author', ns)
-        if author_elem is not None:
-            first_name = author_elem.find('./fb:first-name', ns)
-            last_name = author_elem.find('./fb:last-name', ns)
-            
-            author_parts = []
-            if first_name is not None and first_name.text:
-                author_parts.append(first_name.text)
-            if last_name is not None and last_name.text:
-                author_parts.append(last_name.text)
-            
-            metadata.author = ' '.join(author_parts)
-        
-        # 提取出版商
-        publisher_elem = root.find('.//fb:publisher', ns)
-        if publisher_elem is not None and publisher_elem.text:
-            metadata.publisher = publisher_elem.text
-        
-        # 提取ISBN
-        isbn_elem = root.find('.//fb:isbn', ns)
-        if isbn_elem is not None and isbn_elem.text:
-            metadata.isbn = isbn_elem.text
-        
-        # 提取封面
-        binary_elems = root.findall('.//fb:binary', ns)
-        for binary in binary_elems:
-            if binary.get('content-type', '').startswith('image/'):
-                # 检查是否是封面
-                if binary.get('id', '').lower().startswith('cover'):
-                    try:
-                        image_data = binary.text
-                        if image_data:
-                            import base64
-                            metadata.cover = base64.b64decode(image_data)
-                            break
-                    except Exception as e:
-                        logger.error(f"Error decoding cover image: {str(e)}")
+            _parse_fb2(file_path, metadata)
     
     except Exception as e:
-        logger.error(f"Error extracting FB2 metadata: {str(e)}")
+        logger.error("Error extracting FB2 metadata: %s", e)
     
     return metadata
 
@@ -249,18 +314,15 @@ def resize_cover(cover_data: bytes, max_size: int = 800) -> bytes:
     """
     try:
         with Image.open(BytesIO(cover_data)) as img:
-            # 计算新尺寸
-            width, height = img.size
-            if width > max_size or height > max_size:
-                if width > height:
-                    new_width = max_size
-                    new_height = int(height * (max_size / width))
-                else:
-                    new_height = max_size
-                    new_width = int(width * (max_size / height))
-                
-                # 调整大小
-                img = img.resize((new_width, new_height), Image.LANCZOS)
+            # 已经是尺寸不超限的JPEG时无需重新编码，直接返回原始数据
+            if img.format == 'JPEG' and max(img.size) <= max_size:
+                return cover_data
+            
+            # JPEG解码时直接按1/2、1/4、1/8缩小，大图无需完整解码
+            img.draft('RGB', (max_size, max_size))
+            
+            # 按比例缩小到不超过最大尺寸，本来就小的图像保持不变
+            img.thumbnail((max_size, max_size), Image.LANCZOS)
             
             # 保存为JPEG
             output = BytesIO()
@@ -270,5 +332,5 @@ def resize_cover(cover_data: bytes, max_size: int = 800) -> bytes:
             return output.getvalue()
     
     except Exception as e:
-        logger.error(f"Error resizing cover: {str(e)}")
+        logger.error("Error resizing cover: %s", e)
         return cover_data  # 如果调整大小失败，返回原始数据 
\ No newline at end of file
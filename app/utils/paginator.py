@@ -1,4 +1,7 @@
-from typing import List, Generic, TypeVar, Dict, Any
+import base64
+import datetime
+import orjson
+from typing import List, Generic, TypeVar, Dict, Any, Tuple
 
 # 定义类型变量，用于泛型
 T = TypeVar('T')
@@ -32,6 +35,8 @@ class PaginatedList(Generic[T]):
         self.per_page = per_page
         self.current_page = current_page
         self.total_count = total_count
+        # 分页信息在构造后不再变化，总页数只计算一次（向上取整）
+        self._total_pages = (total_count + per_page - 1) // per_page if total_count else 0
     
     def total_pages(self) -> int:
         """
@@ -40,10 +45,7 @@ class PaginatedList(Generic[T]):
         Returns:
             int: 总页数
         """
-        if self.total_count == 0:
-            return 0
-        # 向上取整
-        return (self.total_count + self.per_page - 1) // self.per_page
+        return self._total_pages
     
     def has_next(self) -> bool:
         """
@@ -52,7 +54,7 @@ class PaginatedList(Generic[T]):
         Returns:
             bool: 如果有下一页则返回True，否则返回False
         """
-        return self.current_page < self.total_pages()
+        return self.current_page < self._total_pages
     
     def has_prev(self) -> bool:
         """
@@ -79,7 +81,7 @@ class PaginatedList(Generic[T]):
         Returns:
             int: 最后一页的页码
         """
-        return self.total_pages()
+        return self._total_pages
     
     def next_page(self) -> int:
         """
@@ -110,17 +112,20 @@ class PaginatedList(Generic[T]):
         Returns:
             Dict[str, Any]: 包含分页信息的字典
         """
+        current_page = self.current_page
+        has_next = current_page < self._total_pages
+        has_prev = current_page > 1
         return {
             "items": self.items,
             "pagination": {
-                "current_page": self.current_page,
+                "current_page": current_page,
                 "per_page": self.per_page,
                 "total_count": self.total_count,
-                "total_pages": self.total_pages(),
-                "has_next": self.has_next(),
-                "has_prev": self.has_prev(),
-                "next_page": self.next_page(),
-                "prev_page": self.prev_page()
+                "total_pages": self._total_pages,
+                "has_next": has_next,
+                "has_prev": has_prev,
+                "next_page": current_page + 1 if has_next else current_page,
+                "prev_page": current_page - 1 if has_prev else current_page
             }
         }
 
@@ -131,4 +136,42 @@ class PaginatedBookList(PaginatedList):
     书籍列表的分页类型
     这是一个类型别名，用于类型提示
     """
-    pass 
\ No newline at end of file
+    pass
+
+
+def encode_cursor(sort_by: str, value: Any, item_id: str) -> str:
+    """
+    将键集分页的位置编码为不透明的游标字符串
+    
+    Args:
+        sort_by: 排序字段
+        value: 最后一项的排序字段值
+        item_id: 最后一项的ID，用于排序值相同时区分先后
+        
+    Returns:
+        str: URL安全的游标字符串
+    """
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    raw = orjson.dumps([sort_by, value, item_id])
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, Any, str]:
+    """
+    解码游标字符串
+    
+    Args:
+        cursor: encode_cursor生成的游标字符串
+        
+    Returns:
+        Tuple[str, Any, str]: 排序字段、排序字段值（时间为ISO格式字符串）和ID
+        
+    Raises:
+        ValueError: 游标格式无效时抛出
+    """
+    try:
+        sort_by, value, item_id = orjson.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    return sort_by, value, item_id
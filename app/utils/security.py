@@ -1,23 +1,36 @@
+import asyncio
 import hashlib
+import hmac
 import os
-import base64
-from datetime import datetime, timedelta
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from typing import Union, Any, Optional
-from passlib.context import CryptContext
-from jose import jwt, JWTError
+import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+import jwt
 
 from app.config import get_settings
 
-# 密码哈希上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# 新密码使用argon2（argon2-cffi的C实现）；已有的bcrypt哈希按前缀识别，直接调用bcrypt验证。
+# 只有这两种格式，直接调用底层实现，省去passlib按哈希识别方案的分发开销
+_argon2 = PasswordHasher()
+_BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+
+# 密码哈希专用线程池，哈希计算是CPU密集操作，不占用事件循环和默认线程池
+_hash_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="password-hash")
 
 # 配置
 settings = get_settings()
 
+# 默认令牌有效期，配置在进程内不变
+_ACCESS_TOKEN_EXPIRE = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+
 
 def get_password_hash(password: str) -> str:
     """
-    使用bcrypt对密码进行哈希处理
+    对密码进行哈希处理
     
     Args:
         password: 明文密码
@@ -25,7 +38,7 @@ def get_password_hash(password: str) -> str:
     Returns:
         str: 哈希后的密码
     """
-    return pwd_context.hash(password)
+    return _argon2.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -39,7 +52,60 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         bool: 密码是否匹配
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    if hashed_password.startswith(_BCRYPT_PREFIXES):
+        return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+    try:
+        return _argon2.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError):
+        # 密码不匹配或哈希格式无效
+        return False
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    判断密码哈希是否需要用当前方案重新生成
+    
+    Args:
+        hashed_password: 已存储的密码哈希
+        
+    Returns:
+        bool: 旧的bcrypt哈希或参数低于当前设置的argon2哈希返回True
+    """
+    if hashed_password.startswith(_BCRYPT_PREFIXES):
+        return True
+    try:
+        return _argon2.check_needs_rehash(hashed_password)
+    except InvalidHashError:
+        return False
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    在密码哈希线程池中对密码进行哈希处理
+    
+    Args:
+        password: 明文密码
+        
+    Returns:
+        str: 哈希后的密码
+    """
+    return await asyncio.get_running_loop().run_in_executor(_hash_executor, get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    在密码哈希线程池中验证明文密码与哈希密码是否匹配
+    
+    Args:
+        plain_password: 明文密码
+        hashed_password: 哈希后的密码
+        
+    Returns:
+        bool: 密码是否匹配
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        _hash_executor, verify_password, plain_password, hashed_password
+    )
 
 
 def get_md5_hash(text: str) -> str:
@@ -52,9 +118,64 @@ def get_md5_hash(text: str) -> str:
     Returns:
         str: MD5哈希值
     """
-    m = hashlib.md5()
-    m.update(text.encode('utf-8'))
-    return m.hexdigest()
+    return hashlib.md5(text.encode('utf-8'), usedforsecurity=False).hexdigest()
+
+
+# 设备密码哈希格式前缀："b2$盐$摘要"，没有前缀的是旧版直接保存的MD5
+_DEVICE_HASH_PREFIX = "b2$"
+
+
+def hash_device_key(md5_key: str, salt: Optional[bytes] = None) -> str:
+    """
+    对KOReader发送的设备密钥（密码的MD5）做加盐BLAKE2b哈希后保存
+    
+    KOReader同步协议规定客户端发送密码的MD5，协议层无法更改；
+    服务端不再直接保存该MD5，数据库泄露后无法直接用于认证。
+    
+    Args:
+        md5_key: 设备密码的MD5十六进制摘要
+        salt: 16字节盐值，为空时随机生成
+        
+    Returns:
+        str: "b2$盐$摘要"格式的设备密码哈希
+    """
+    salt = salt or os.urandom(16)
+    digest = hashlib.blake2b(md5_key.encode("ascii"), digest_size=16, salt=salt).hexdigest()
+    return f"{_DEVICE_HASH_PREFIX}{salt.hex()}${digest}"
+
+
+def verify_device_key(md5_key: str, stored_hash: str) -> bool:
+    """
+    常量时间校验设备密钥，兼容旧版直接保存的MD5
+    
+    Args:
+        md5_key: 设备密码的MD5十六进制摘要
+        stored_hash: 保存的设备密码哈希
+        
+    Returns:
+        bool: 是否匹配
+    """
+    if not stored_hash.startswith(_DEVICE_HASH_PREFIX):
+        return hmac.compare_digest(stored_hash.encode(), md5_key.encode())
+    salt_hex, _, digest = stored_hash[len(_DEVICE_HASH_PREFIX):].partition("$")
+    try:
+        expected = hash_device_key(md5_key, bytes.fromhex(salt_hex))
+    except (ValueError, UnicodeEncodeError):
+        return False
+    return hmac.compare_digest(stored_hash.encode(), expected.encode())
+
+
+def device_key_needs_rehash(stored_hash: str) -> bool:
+    """
+    判断设备密码哈希是否为旧版直接保存的MD5
+    
+    Args:
+        stored_hash: 保存的设备密码哈希
+        
+    Returns:
+        bool: 需要升级时返回True
+    """
+    return not stored_hash.startswith(_DEVICE_HASH_PREFIX)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -71,10 +192,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode = data.copy()
     
     # 设置过期时间
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.now(timezone.utc) + (expires_delta or _ACCESS_TOKEN_EXPIRE)
     
     # 添加过期时间声明
     to_encode.update({"exp": expire})
@@ -98,7 +216,7 @@ def decode_access_token(token: str) -> Union[dict, None]:
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         return payload
-    except JWTError:
+    except jwt.PyJWTError:
         return None
 
 
@@ -110,6 +228,6 @@ def generate_random_token(length: int = 32) -> str:
         length: 令牌长度（字节）
         
     Returns:
-        str: Base64编码的随机令牌
+        str: URL安全Base64编码的随机令牌（不含填充）
     """
-    return base64.urlsafe_b64encode(os.urandom(length)).decode('utf-8') 
\ No newline at end of file
+    return secrets.token_urlsafe(length)
\ No newline at end of file
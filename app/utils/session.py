@@ -0,0 +1,133 @@
+import base64
+import hashlib
+import hmac
+import time
+from typing import Literal, Optional
+
+import orjson
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class SessionMiddleware:
+    """
+    基于签名Cookie的会话中间件，可直接替换Starlette的SessionMiddleware。
+
+    会话数据用orjson编码，签名使用以密钥为key的BLAKE2b MAC（CPython内置C实现），
+    每个请求都要校验签名、每个响应都要重新签名，比itsdangerous的HMAC-SHA1和json模块更快。
+    Cookie格式为"base64(数据).签发时间戳.base64(MAC)"。
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        secret_key: str,
+        session_cookie: str = "session",
+        max_age: Optional[int] = 14 * 24 * 60 * 60,
+        path: str = "/",
+        same_site: Literal["lax", "strict", "none"] = "lax",
+        https_only: bool = False,
+    ):
+        """
+        初始化会话中间件
+
+        Args:
+            app: 下游ASGI应用
+            secret_key: 签名密钥
+            session_cookie: Cookie名称
+            max_age: 会话有效期（秒），为None时为浏览器会话Cookie
+            path: Cookie路径
+            same_site: Cookie的SameSite属性
+            https_only: 是否只通过HTTPS发送Cookie
+        """
+        self.app = app
+        # BLAKE2b的key最长64字节，先将任意长度的密钥摘要为64字节
+        self._key = hashlib.blake2b(secret_key.encode("utf-8")).digest()
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+        self.path = path
+        self.security_flags = "httponly; samesite=" + same_site
+        if https_only:
+            self.security_flags += "; secure"
+
+    def _mac(self, signed: bytes) -> bytes:
+        """计算签名内容的MAC"""
+        digest = hashlib.blake2b(signed, key=self._key, digest_size=16).digest()
+        return base64.urlsafe_b64encode(digest)
+
+    def encode(self, session: dict) -> str:
+        """
+        将会话数据编码为签名后的Cookie值
+
+        Args:
+            session: 会话数据
+
+        Returns:
+            str: Cookie值
+        """
+        signed = base64.urlsafe_b64encode(orjson.dumps(session)) + b"." + str(int(time.time())).encode()
+        return (signed + b"." + self._mac(signed)).decode("ascii")
+
+    def decode(self, value: str) -> Optional[dict]:
+        """
+        校验Cookie值的签名和有效期并解码会话数据
+
+        Args:
+            value: Cookie值
+
+        Returns:
+            Optional[dict]: 会话数据，签名无效、已过期或格式错误时返回None
+        """
+        try:
+            raw = value.encode("ascii")
+        except UnicodeEncodeError:
+            return None
+        signed, sep, mac = raw.rpartition(b".")
+        if not sep or not hmac.compare_digest(mac, self._mac(signed)):
+            return None
+        payload, _, issued_at = signed.rpartition(b".")
+        try:
+            if self.max_age is not None and int(issued_at) + self.max_age < time.time():
+                return None
+            session = orjson.loads(base64.urlsafe_b64decode(payload))
+        except ValueError:
+            # binascii.Error和orjson.JSONDecodeError均为ValueError的子类
+            return None
+        return session if isinstance(session, dict) else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        connection = HTTPConnection(scope)
+        initial_session_was_empty = True
+        cookie = connection.cookies.get(self.session_cookie)
+        session = self.decode(cookie) if cookie else None
+        if session is not None:
+            initial_session_was_empty = False
+        scope["session"] = session or {}
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                if scope["session"]:
+                    # 每次响应重新签发，滑动延长有效期
+                    max_age = f"Max-Age={self.max_age}; " if self.max_age else ""
+                    headers = MutableHeaders(scope=message)
+                    headers.append(
+                        "Set-Cookie",
+                        f"{self.session_cookie}={self.encode(scope['session'])}; "
+                        f"path={self.path}; {max_age}{self.security_flags}"
+                    )
+                elif not initial_session_was_empty:
+                    # 会话被清空，删除Cookie
+                    headers = MutableHeaders(scope=message)
+                    headers.append(
+                        "Set-Cookie",
+                        f"{self.session_cookie}=null; path={self.path}; "
+                        f"expires=Thu, 01 Jan 1970 00:00:00 GMT; {self.security_flags}"
+                    )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
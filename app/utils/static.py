@@ -0,0 +1,63 @@
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+
+# 文件名中带内容哈希的资源（如app.3f2a9c1d.js）内容不会变化，可永久缓存
+_HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.\w+$")
+
+HASHED_CACHE_CONTROL = "public, max-age=31536000, immutable"
+STATIC_CACHE_CONTROL = "public, max-age=3600"
+
+# 查找结果缓存的最大条目数，避免随意构造的路径使缓存无限增长
+_MAX_LOOKUP_CACHE = 1024
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    缓存路径查找结果的静态文件服务。
+
+    StaticFiles每次请求都要在线程池中stat文件；静态文件在部署后不会变化，
+    缓存查找结果（包括不存在的路径）后，重复请求无需系统调用。
+    同时为响应添加Cache-Control头，文件名带内容哈希的资源允许永久缓存。
+    """
+
+    def __init__(self, *, directory: str, cache_lookups: bool = True, **kwargs):
+        """
+        初始化静态文件服务
+
+        Args:
+            directory: 静态文件目录
+            cache_lookups: 是否缓存路径查找结果，开发时关闭以便修改文件后立即生效
+            kwargs: 传给StaticFiles的其他参数
+        """
+        super().__init__(directory=directory, **kwargs)
+        self.cache_lookups = cache_lookups
+        self._lookup_cache: Dict[str, Tuple[str, Optional[os.stat_result]]] = {}
+        if cache_lookups:
+            # 启动时遍历目录预热缓存，首次请求也无需stat
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    self.lookup_path(os.path.relpath(os.path.join(root, name), directory))
+
+    def lookup_path(self, path: str) -> Tuple[str, Optional[os.stat_result]]:
+        if not self.cache_lookups:
+            return super().lookup_path(path)
+        result = self._lookup_cache.get(path)
+        if result is None:
+            result = super().lookup_path(path)
+            if len(self._lookup_cache) < _MAX_LOOKUP_CACHE:
+                self._lookup_cache[path] = result
+        return result
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers.setdefault(
+            "Cache-Control",
+            HASHED_CACHE_CONTROL if _HASHED_NAME.search(str(full_path)) else STATIC_CACHE_CONTROL
+        )
+        return response
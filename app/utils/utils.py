@@ -8,8 +8,11 @@ logger = logging.getLogger(__name__)
 # 类型变量，用于泛型函数
 T = TypeVar('T')
 
+# 部分MD5哈希覆盖的文件前缀长度（字节）
+PARTIAL_MD5_SIZE = 5*1024*1024
 
-def partial_md5(file_path: str, chunk_size: int = 5*1024*1024) -> str:
+
+def partial_md5(file_path: str, chunk_size: int = PARTIAL_MD5_SIZE) -> str:
     """
     计算文件的部分MD5哈希值，与KOReader兼容
     KOReader使用文件的前5MB计算MD5
@@ -22,16 +25,59 @@ def partial_md5(file_path: str, chunk_size: int = 5*1024*1024) -> str:
         str: MD5哈希值（16进制字符串）
     """
     try:
-        md5 = hashlib.md5()
         with open(file_path, 'rb') as f:
             data = f.read(chunk_size)
-            md5.update(data)
-        return md5.hexdigest()
+        # MD5只用作文档标识而非安全用途，FIPS构建下也不会被禁用
+        return hashlib.md5(data, usedforsecurity=False).hexdigest()
     except Exception as e:
-        logger.error(f"Error calculating partial MD5 for {file_path}: {str(e)}")
+        logger.error("Error calculating partial MD5 for %s: %s", file_path, e)
         return ""
 
 
+class PartialMD5:
+    """
+    增量计算部分MD5哈希，结果与partial_md5一致
+    
+    用于在流式写入文件的同时计算哈希，避免写完后再读一遍文件。
+    """
+    
+    def __init__(self, size: int = PARTIAL_MD5_SIZE):
+        """
+        初始化哈希计算器
+        
+        Args:
+            size: 参与哈希的文件前缀长度（字节）
+        """
+        self._md5 = hashlib.md5(usedforsecurity=False)
+        self._remaining = size
+    
+    def update(self, data: bytes) -> None:
+        """
+        追加数据，超出前缀长度的部分被忽略
+        
+        Args:
+            data: 按顺序写入文件的数据块
+        """
+        if self._remaining > 0:
+            chunk = data[:self._remaining]
+            self._md5.update(chunk)
+            self._remaining -= len(chunk)
+    
+    def hexdigest(self) -> str:
+        """
+        获取哈希值
+        
+        Returns:
+            str: MD5哈希值（16进制字符串）
+        """
+        return self._md5.hexdigest()
+
+
+def _md5():
+    """创建非安全用途的MD5哈希对象"""
+    return hashlib.md5(usedforsecurity=False)
+
+
 def full_md5(file_path: str) -> str:
     """
     计算文件的完整MD5哈希值
@@ -43,13 +89,11 @@ def full_md5(file_path: str) -> str:
         str: MD5哈希值（16进制字符串）
     """
     try:
-        md5 = hashlib.md5()
+        # file_digest在C中循环读取并更新哈希，不必逐块回到解释器
         with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                md5.update(chunk)
-        return md5.hexdigest()
+            return hashlib.file_digest(f, _md5).hexdigest()
     except Exception as e:
-        logger.error(f"Error calculating full MD5 for {file_path}: {str(e)}")
+        logger.error("Error calculating full MD5 for %s: %s", file_path, e)
         return ""
 
 
@@ -68,10 +112,14 @@ def ensure_dir(dir_path: str) -> bool:
             os.makedirs(dir_path)
         return True
     except Exception as e:
-        logger.error(f"Error creating directory {dir_path}: {str(e)}")
+        logger.error("Error creating directory %s: %s", dir_path, e)
         return False
 
 
+# 文件名中的常见不安全字符，一次translate全部替换为下划线
+_UNSAFE_FILENAME_CHARS = str.maketrans(dict.fromkeys('/\\:*?"<>|', '_'))
+
+
 def safe_filename(filename: str) -> str:
     """
     创建安全的文件名，移除或替换不安全字符
@@ -82,12 +130,7 @@ def safe_filename(filename: str) -> str:
     Returns:
         str: 安全的文件名
     """
-    # 替换常见的不安全字符
-    unsafe_chars = ['/', '\\', ':', '*', '?', '"', '<', '>', '|']
-    safe_name = filename
-    for char in unsafe_chars:
-        safe_name = safe_name.replace(char, '_')
-    return safe_name
+    return filename.translate(_UNSAFE_FILENAME_CHARS)
 
 
 def if_null(value: T, default: T) -> T:
@@ -117,6 +160,10 @@ def get_file_extension(file_path: str) -> str:
     return os.path.splitext(file_path)[1].lower().lstrip('.')
 
 
+# 文件大小单位
+_SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
+
+
 def format_file_size(size_bytes: int) -> str:
     """
     格式化文件大小，转换为人类可读格式
@@ -127,18 +174,9 @@ def format_file_size(size_bytes: int) -> str:
     Returns:
         str: 格式化后的文件大小
     """
-    # 定义单位
-    units = ['B', 'KB', 'MB', 'GB', 'TB']
-    size = float(size_bytes)
-    unit_index = 0
-    
-    # 转换单位
-    while size >= 1024 and unit_index < len(units) - 1:
-        size /= 1024
-        unit_index += 1
+    if size_bytes < 1024:
+        return f"{int(size_bytes)} B"
     
-    # 格式化输出
-    if unit_index == 0:
-        return f"{int(size)} {units[unit_index]}"
-    else:
-        return f"{size:.2f} {units[unit_index]}" 
\ No newline at end of file
+    # 每个单位相差2^10，由二进制位数直接得到单位，无需循环除法
+    unit_index = min(len(_SIZE_UNITS) - 1, (int(size_bytes).bit_length() - 1) // 10)
+    return f"{size_bytes / (1 << (10 * unit_index)):.2f} {_SIZE_UNITS[unit_index]}" 
\ No newline at end of file
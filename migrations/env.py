@@ -8,8 +8,7 @@ from alembic import context
 # 导入我们的模型以便Alembic能够检测变更
 import os
 import sys
-from app.database import Base
-from app.config import get_settings
+from app.database import Base, ASYNC_PG_DSN
 import asyncio
 from sqlalchemy.ext.asyncio import AsyncEngine
 
@@ -24,8 +23,7 @@ from app.storage.postgres import FileModel
 config = context.config
 
 # 从我们的配置中获取数据库URL
-settings = get_settings()
-config.set_main_option("sqlalchemy.url", str(settings.PG_URL).replace("postgresql://", "postgresql+asyncpg://"))
+config.set_main_option("sqlalchemy.url", ASYNC_PG_DSN)
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
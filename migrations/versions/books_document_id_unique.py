@@ -0,0 +1,43 @@
+"""books document_id unique index
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-15 15:00:00.000000
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 之前的索引允许重复的document_id，先检查已有数据，存在重复时给出明确的错误，
+    # 不自动删除书籍（存储中的文件和阅读进度仍引用它们），由管理员确认后处理
+    if not context.is_offline_mode():
+        duplicates = op.get_bind().execute(sa.text(
+            "SELECT document_id, count(*) FROM books "
+            "WHERE document_id IS NOT NULL "
+            "GROUP BY document_id HAVING count(*) > 1 "
+            "ORDER BY document_id LIMIT 20"
+        )).fetchall()
+        if duplicates:
+            listed = ", ".join(f"{document_id} ({count})" for document_id, count in duplicates)
+            raise RuntimeError(
+                "Cannot make books.document_id unique: duplicate document_id values exist. "
+                f"Remove the duplicate books and run the migration again: {listed}"
+            )
+    
+    # 书架在入库前已按文件哈希去重，改为唯一索引后由数据库保证，按哈希查询最多命中一行
+    op.drop_index('ix_books_document_id', table_name='books')
+    op.create_index('ix_books_document_id', 'books', ['document_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_books_document_id', table_name='books')
+    op.create_index('ix_books_document_id', 'books', ['document_id'], unique=False)
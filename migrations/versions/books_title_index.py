@@ -0,0 +1,26 @@
+"""books title index
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-15 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 按标题排序的书籍列表使用(title, id)键集分页，需要索引支持；
+    # 该索引曾在003中随进度表索引一起创建，已执行过旧版003的数据库中已经存在
+    op.create_index('ix_books_title_id', 'books', ['title', 'id'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_books_title_id', table_name='books')
@@ -0,0 +1,27 @@
+"""progress document/timestamp index
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-15 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # (document, timestamp)复合索引覆盖按文档查询最新进度，原document单列索引成为其前缀，可以删除
+    op.create_index('ix_progress_document_timestamp', 'progress', ['document', 'timestamp'], unique=False)
+    op.drop_index('ix_progress_document', table_name='progress')
+
+
+def downgrade() -> None:
+    op.create_index('ix_progress_document', 'progress', ['document'], unique=False)
+    op.drop_index('ix_progress_document_timestamp', table_name='progress')
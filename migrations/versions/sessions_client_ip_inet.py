@@ -0,0 +1,38 @@
+"""sessions client_ip inet
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-15 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 使用原生INET类型保存客户端IP，读取时由asyncpg直接解码
+    op.alter_column(
+        'sessions', 'client_ip',
+        type_=postgresql.INET(),
+        existing_type=sa.String(),
+        existing_nullable=True,
+        postgresql_using='client_ip::inet'
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        'sessions', 'client_ip',
+        type_=sa.String(),
+        existing_type=postgresql.INET(),
+        existing_nullable=True,
+        postgresql_using='client_ip::text'
+    )
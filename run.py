@@ -7,17 +7,9 @@ KOmpanion 启动脚本
 import os
 import sys
 import argparse
-import uvicorn
+import copy
 import logging
-
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+import logging.config
 
 logger = logging.getLogger("kompanion")
 
@@ -41,35 +33,106 @@ def parse_args():
         action="store_true", 
         help="启用热重载模式 (开发环境适用)"
     )
+    parser.add_argument(
+        "--workers", 
+        type=int, 
+        default=os.environ.get("WEB_CONCURRENCY", "1"), 
+        help="工作进程数 (默认: 环境变量WEB_CONCURRENCY或1)；"
+             "内存存储的数据不在进程间共享，多进程只适用于PostgreSQL存储"
+    )
     parser.add_argument(
         "--no-log", 
         action="store_true", 
         help="禁用日志输出"
     )
+    parser.add_argument(
+        "--access-log", 
+        action="store_true", 
+        help="启用访问日志 (默认关闭，每个请求都写日志会明显降低吞吐量)"
+    )
+    parser.add_argument(
+        "--proxy-headers", 
+        action="store_true", 
+        help="信任反向代理的X-Forwarded-*头 (部署在HTTPS反向代理之后时启用)"
+    )
     return parser.parse_args()
 
+def build_log_config(no_log: bool) -> dict:
+    """
+    构建传给uvicorn的日志配置
+    
+    uvicorn在每个工作进程和热重载子进程中都会应用log_config，
+    只在本进程中添加的处理器不会出现在子进程里。
+    
+    Args:
+        no_log: 是否禁用应用日志输出
+        
+    Returns:
+        dict: logging.config.dictConfig格式的配置
+    """
+    from uvicorn.config import LOGGING_CONFIG
+    
+    config = copy.deepcopy(LOGGING_CONFIG)
+    if not no_log:
+        config["formatters"]["app"] = {
+            "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+        }
+        # 日志记录先放入队列，由每个进程自己的后台线程写入stdout
+        config["handlers"]["app"] = {
+            "()": "app.utils.log.QueueStreamHandler",
+            "formatter": "app",
+        }
+        config["root"] = {"handlers": ["app"], "level": "INFO"}
+    return config
+
 def main():
     """主函数"""
     args = parse_args()
     
-    if args.no_log:
-        import logging
-        logging.getLogger("uvicorn").setLevel(logging.WARNING)
-        logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
+    # 解析参数后再配置日志，--help和参数错误时不初始化日志处理器；
+    # uvicorn在解析参数后才导入，--help和参数错误时无需加载整个服务器栈
+    import uvicorn
+    
+    # 同一份配置在本进程中先应用一次，启动前的日志也能输出
+    log_config = build_log_config(args.no_log)
+    logging.config.dictConfig(log_config)
     
-    logger.info(f"启动 KOmpanion 应用程序于 {args.host}:{args.port}")
+    logger.info("启动 KOmpanion 应用程序于 %s:%s", args.host, args.port)
     
     # 检查环境变量
-    if not os.path.exists(".env"):
+    try:
+        os.stat(".env")
+    except FileNotFoundError:
         logger.warning("没有找到 .env 文件，将使用默认配置")
     
-    # 启动服务器
+    # 热重载模式只能使用单个进程
+    workers = 1 if args.reload else args.workers
+    # 工作进程据此判断是否启用只能在本进程内失效的缓存，须在导入应用之前设置
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    
+    # 热重载和多进程时由uvicorn在子进程中按字符串导入应用；
+    # 单进程时在启动服务器前导入，导入失败立即退出并给出错误
+    target = "app.main:app"
+    if workers == 1 and not args.reload:
+        try:
+            from app.main import app as target
+        except Exception:
+            logger.exception("加载应用失败")
+            sys.exit(1)
+    
     uvicorn.run(
-        "app.main:app",
+        target,
         host=args.host,
         port=args.port,
         reload=args.reload,
-        log_level="info" if not args.no_log else "warning"
+        workers=workers,
+        log_config=log_config,
+        log_level="info" if not args.no_log else "warning",
+        access_log=args.access_log,
+        proxy_headers=args.proxy_headers,
+        # 客户端不依赖Server和Date响应头，省去每个响应的格式化
+        server_header=False,
+        date_header=False
     )
 
 if __name__ == "__main__":